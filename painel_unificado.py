@@ -5,18 +5,31 @@ import os
 import sys
 import re
 import json
+import queue
 import uuid
 import time
-import queue
 import shutil
 import hashlib
+import atexit
+import codecs
+import contextlib
+import csv
+import io
 import logging
+import selectors
+import signal
 import threading
 import subprocess
+import tempfile
 import sqlite3
+import zlib
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, UTC
-from urllib.parse import urlparse
+from html import escape
+from urllib.parse import urlencode, urlparse
 from pathlib import Path
+from jinja2 import meta as jinja_meta
 from werkzeug.utils import secure_filename
 from flask import (
     Flask, render_template, request, jsonify, Response,
@@ -24,21 +37,43 @@ from flask import (
 )
 from flask_cors import CORS
 
+from tools import holehe_runner, leak_pipeline, report_store, sherlock_engine
+from tools.metaweb import doc_triage, hashing, metaweb, yara_scan
+
 # ----------------------
 # Config / paths
 # ----------------------
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_DIR = os.path.join(BASE_DIR, "uploads")
+RELATORIOS_DIR = os.path.join(BASE_DIR, "static", "relatorios")
 RUNS_DIR = os.path.join(BASE_DIR, "runs")
-DB_PATH = os.path.join(BASE_DIR, "painel.db")
+# uploads endereçados por conteúdo: uploads/cas/<2 primeiros hex>/<sha256><ext>
+CAS_DIR = os.path.join(UPLOAD_DIR, "cas")
+DB_PATH = os.environ.get("PAINEL_DB_PATH", os.path.join(BASE_DIR, "painel.db"))
 
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+os.makedirs(CAS_DIR, exist_ok=True)
 os.makedirs(RUNS_DIR, exist_ok=True)
 
-# max chars of raw output to keep in DB (prevents DB blowup)
+# max chars of raw output kept inline in history.raw_output (prevents DB blowup);
+# the full task output goes to history_chunks, compressed
 MAX_OUTPUT_CHARS = 16000
 
+# resultado do MetaWeb para um arquivo depende só do conteúdo: cache longo por sha256
+METAWEB_DIGEST_TTL_SECS = int(os.environ.get("METAWEB_DIGEST_TTL_SECS", str(30 * 24 * 3600)))
+# varreduras em lote (YARA, triagem de documentos) sem seleção explícita pegam
+# os uploads das últimas METAWEB_RECENT_SECS; nunca mais de METAWEB_SELECT_MAX arquivos
+METAWEB_RECENT_SECS = int(os.environ.get("METAWEB_RECENT_SECS", str(24 * 3600)))
+METAWEB_SELECT_MAX = int(os.environ.get("METAWEB_SELECT_MAX", "500"))
+
+# "native" = motor assíncrono em processo (tools/sherlock_engine.py); "cli" = sherlock CLI
+SHERLOCK_ENGINE = os.environ.get("SHERLOCK_ENGINE", "native")
+# "native" = módulos do Holehe em processo (tools/holehe_runner.py); "cli" = holehe CLI
+HOLEHE_ENGINE = os.environ.get("HOLEHE_ENGINE", "native")
+# máximo de e-mails aceitos por /vazamento/batch/start
+HOLEHE_BATCH_MAX = int(os.environ.get("HOLEHE_BATCH_MAX", "200"))
+
 
 # ----------------------
 # Flask app
@@ -71,104 +106,300 @@ def detect_phoneinfoga():
     # se não achar em lugar nenhum
     return None, "not_found"
 
-# =====================================================
-# 📱 PhoneInfoga
-# =====================================================
-@app.route("/phoneinfoga", methods=["GET", "POST"])
-def phoneinfoga():
-    if request.method == "POST":
-        numero = request.form.get("numero")
-        if not numero:
-            return render_template("phoneinfoga.html", erro="Digite um número de telefone.")
 
-        pasta_relatorios = "static/relatorios/"
-        os.makedirs(pasta_relatorios, exist_ok=True)
-        json_path = os.path.join(pasta_relatorios, f"phoneinfoga_{numero}.json")
-
-        try:
-            # Detecta o comando, como feito nas outras funções
-            cmd_prefix, how = detect_phoneinfoga()
-            if not cmd_prefix:
-                return render_template("phoneinfoga.html", erro="PhoneInfoga não encontrado.")
-
-            cmd = cmd_prefix + ["scan", "-n", numero, "-o", json_path, "-f", "json"]
-
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=120
-            )
-            if result.returncode != 0:
-                return render_template("phoneinfoga.html", erro=f"Erro ao executar PhoneInfoga: {result.stderr}")
+# código do país para números sem DDI (o painel é usado com números do Brasil)
+PHONE_DEFAULT_COUNTRY_CODE = os.environ.get("PHONE_DEFAULT_COUNTRY_CODE", "55")
+# tamanhos de um número nacional (DDD + número) no país padrão
+PHONE_NATIONAL_LENGTHS = (10, 11)
 
-            with open(json_path, "r") as f:
-                dados = json.load(f)
 
-            # ... o resto da sua lógica de salvar o histórico em arquivo
-
-            historico_entry = {
-                "tipo": "phoneinfoga",
-                "alvo": numero,
-                "arquivo": json_path,
-                "data": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-
-            historico_file = os.path.join(pasta_relatorios, "historico.json")
-            if os.path.exists(historico_file):
-                with open(historico_file, "r") as f:
-                    historico = json.load(f)
-            else:
-                historico = []
-
-            historico.append(historico_entry)
-
-            with open(historico_file, "w") as f:
-                json.dump(historico, f, indent=2)
+def normalize_phone(raw):
+    """
+    Número em E.164 (+5511999999999) ou None se não der para interpretar.
+    "+55 (11) 99999-9999", "5511999999999", "0055 11..." e "(11) 99999-9999"
+    viram a mesma chave de cache.
+    """
+    text = str(raw or "").strip()
+    digits = re.sub(r"\D", "", text)
+    if text.startswith("+"):
+        number = digits
+    elif digits.startswith("00"):
+        number = digits[2:]
+    else:
+        national = digits.lstrip("0")  # prefixo de tronco (011...)
+        number = PHONE_DEFAULT_COUNTRY_CODE + national if len(national) in PHONE_NATIONAL_LENGTHS else digits
+    if not 8 <= len(number) <= 15 or number.startswith("0"):
+        return None
+    return "+" + number
 
 
-            return render_template("relatorio_phoneinfoga.html", numero=numero, dados=dados)
+# -------------------
+# SQLite (history)
+# -------------------
+#
+# Uma conexão por thread (WAL, autocommit) e o schema criado uma vez. As
+# escritas vão para uma fila e uma thread de fundo grava em lotes: inserts
+# e updates de muitas tarefas simultâneas viram uma transação só. As
+# leituras chamam history_writer.flush() antes, para enxergar o que acabou
+# de ser enfileirado.
+
+# até quantas operações entram numa mesma transação
+HISTORY_BATCH_MAX = int(os.environ.get("HISTORY_BATCH_MAX", "500"))
+# tempo máximo que uma leitura espera a fila de escrita esvaziar
+HISTORY_FLUSH_TIMEOUT = float(os.environ.get("HISTORY_FLUSH_TIMEOUT", "5"))
+# novas tentativas de um lote quando o banco está ocupado (outro worker escrevendo)
+HISTORY_BUSY_RETRIES = int(os.environ.get("HISTORY_BUSY_RETRIES", "5"))
+# tamanho de página do admin (limit) e o máximo aceito
+HISTORY_PAGE_DEFAULT = int(os.environ.get("HISTORY_PAGE_DEFAULT", "100"))
+HISTORY_PAGE_MAX = int(os.environ.get("HISTORY_PAGE_MAX", "500"))
+# tamanho (antes de comprimir) de cada pedaço da saída gravado em history_chunks
+HISTORY_CHUNK_BYTES = int(os.environ.get("HISTORY_CHUNK_BYTES", str(64 * 1024)))
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT,
+    tool TEXT,
+    params TEXT,
+    result TEXT,
+    raw_output TEXT,
+    status TEXT,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_history_task ON history (task_id);
+-- filtros do admin com paginação por id (keyset)
+DROP INDEX IF EXISTS idx_history_tool_created;
+CREATE INDEX IF NOT EXISTS idx_history_tool_id ON history (tool, id);
+CREATE INDEX IF NOT EXISTS idx_history_status_id ON history (status, id);
+CREATE INDEX IF NOT EXISTS idx_history_created ON history (created_at);
+CREATE TABLE IF NOT EXISTS history_chunks (
+    task_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    raw_bytes INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (task_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+def sqlite_connect(path):
+    """Conexão em autocommit com WAL, para tabelas compartilhadas entre processos."""
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+_db_local = threading.local()
+_db_init_lock = threading.Lock()
+_db_ready = set()
+
+
+def db_conn(path=None):
+    """Conexão da thread atual com o banco de histórico."""
+    path = path or DB_PATH
+    conns = getattr(_db_local, "conns", None)
+    if conns is None:
+        conns = _db_local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = conns[path] = sqlite_connect(path)
+    return conn
+
+
+# índice de busca textual: parâmetros, perfis encontrados e a saída das tarefas;
+# kind = "params" | "found" | "output" (um chunk de saída por linha do índice)
+HISTORY_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+    task_id UNINDEXED,
+    kind UNINDEXED,
+    content,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+_db_fts = set()
+
+
+def init_db(path=None):
+    path = path or DB_PATH
+    with _db_init_lock:
+        if path in _db_ready:
+            return
+        conn = db_conn(path)
+        conn.executescript(HISTORY_SCHEMA)
+        _db_ready.add(path)
+        # checagem e criação na mesma transação: com vários workers subindo
+        # juntos, só quem cria a tabela dispara o backfill
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                created = not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'history_fts'").fetchone()
+                if created:
+                    # o que entra depois deste ponto é indexado pelas próprias escritas;
+                    # o backfill fica limitado ao que já existia
+                    max_id = conn.execute("SELECT coalesce(max(id), 0) FROM history").fetchone()[0]
+                    chunk_bounds = dict(conn.execute("SELECT task_id, max(seq) FROM history_chunks GROUP BY task_id"))
+                    conn.execute(HISTORY_FTS_SCHEMA)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            _db_fts.add(path)
+        except sqlite3.OperationalError:
+            app.logger.warning("SQLite sem FTS5: busca no histórico desativada")
+            return
+    if created and (max_id or chunk_bounds):
+        threading.Thread(
+            target=backfill_search_index, args=(path, max_id, chunk_bounds), name="history-fts-backfill", daemon=True
+        ).start()
+
+
+def search_enabled(path=None):
+    init_db(path)
+    return (path or DB_PATH) in _db_fts
+
+
+def params_search_text(params):
+    """Valores dos parâmetros (aninhados ou não) como texto para o índice."""
+    if isinstance(params, dict):
+        return " ".join(params_search_text(v) for v in params.values())
+    if isinstance(params, (list, tuple)):
+        return " ".join(params_search_text(v) for v in params)
+    return "" if params is None else str(params)
+
+
+def index_search_text(task_id, kind, content):
+    if content and search_enabled():
+        history_writer.submit(
+            "INSERT INTO history_fts (task_id, kind, content) VALUES (?, ?, ?)", (task_id, kind, content)
+        )
 
-        except Exception as e:
-            return render_template("phoneinfoga.html", erro=f"Ocorreu um erro: {str(e)}")
 
-    return render_template("phoneinfoga.html")
+def backfill_search_index(path=None, max_id=0, chunk_bounds=None):
+    """
+    Indexa o que já estava no histórico quando o índice foi criado: linhas com
+    id <= max_id e, por tarefa, chunks de saída até o seq de chunk_bounds.
+    """
+    conn = sqlite_connect(path or DB_PATH)
+    chunk_bounds = chunk_bounds or {}
+    start = time.time()
+    rows = 0
+    try:
+        sources = (
+            ("params", "SELECT task_id, params, NULL FROM history "
+                       "WHERE id <= ? AND params IS NOT NULL AND params != '{}'", (max_id,)),
+            ("output", "SELECT task_id, data, seq FROM history_chunks", ()),
+        )
+        for kind, sql, args in sources:
+            for task_id, value, seq in conn.execute(sql, args):
+                if kind == "output" and seq > chunk_bounds.get(task_id, -1):
+                    continue  # chunk gravado depois da criação: já indexado ao ser escrito
+                if kind == "params":
+                    try:
+                        value = params_search_text(json.loads(value))
+                    except ValueError:
+                        pass
+                else:
+                    value = zlib.decompress(value).decode("utf-8", errors="replace")
+                index_search_text(task_id, kind, value)
+                rows += 1
+                if rows % 500 == 0:
+                    # não deixa a fila do writer crescer sem limite
+                    history_writer.flush(timeout=None)
+        app.logger.info("history search index backfilled: %d rows in %.1fs", rows, time.time() - start)
+    except Exception:
+        app.logger.exception("history search backfill failed")
+    finally:
+        conn.close()
 
 
-# -------------------
-# SQLite (history)
-# -------------------
+class HistoryWriter:
+    """Thread de fundo que aplica as escritas do histórico em lotes."""
+
+    def __init__(self, path=None, batch_max=HISTORY_BATCH_MAX):
+        self.path = path
+        self.batch_max = batch_max
+        self._queue = queue.Queue()
+        self._cond = threading.Condition()
+        self._submitted = 0
+        self._written = 0
+        self._thread = None
+
+    def submit(self, sql, params):
+        with self._cond:
+            self._submitted += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                self._thread.start()
+        self._queue.put((sql, params))
+
+    def flush(self, timeout=HISTORY_FLUSH_TIMEOUT):
+        """Espera até tudo o que foi enfileirado antes desta chamada estar gravado."""
+        with self._cond:
+            target = self._submitted
+            return self._cond.wait_for(lambda: self._written >= target, timeout=timeout)
+
+    def _run(self):
+        init_db(self.path)
+        conn = db_conn(self.path)
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_max:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(conn, batch)
+            with self._cond:
+                self._written += len(batch)
+                self._cond.notify_all()
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute(
+    def _write(self, conn, batch):
         """
-        CREATE TABLE IF NOT EXISTS history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            task_id TEXT,
-            tool TEXT,
-            params TEXT,
-            result TEXT,
-            raw_output TEXT,
-            status TEXT,
-            created_at TEXT
-        )
+        Aplica o lote numa transação. Banco ocupado/travado: tenta de novo com
+        espera crescente. Outro erro (ou ocupado demais): reaplica um comando
+        por vez, para que só o comando com problema se perca.
         """
-    )
-    conn.commit()
-    conn.close()
+        for attempt in range(HISTORY_BUSY_RETRIES + 1):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for sql, params in batch:
+                    conn.execute(sql, params)
+                conn.execute("COMMIT")
+                return
+            except Exception as e:
+                try:
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+                busy = isinstance(e, sqlite3.OperationalError) and any(
+                    word in str(e).lower() for word in ("locked", "busy")
+                )
+                if not busy:
+                    app.logger.warning("history batch of %d writes failed (%s); replaying one by one", len(batch), e)
+                    break
+                if attempt < HISTORY_BUSY_RETRIES:
+                    time.sleep(min(0.1 * 2 ** attempt, 2.0))
+        else:
+            app.logger.warning("history batch of %d writes: database busy; replaying one by one", len(batch))
+        for sql, params in batch:
+            try:
+                conn.execute(sql, params)
+            except Exception:
+                app.logger.exception("history write dropped: %s", sql.split("(", 1)[0].strip())
+
+
+history_writer = HistoryWriter()
+atexit.register(history_writer.flush)
 
 
 def record_history(task_id, tool, params_dict, result_dict, raw_output, status="ok"):
     try:
-        init_db()
         ro = raw_output or ""
         if len(ro) > MAX_OUTPUT_CHARS:
             ro = ro[:MAX_OUTPUT_CHARS] + "\n\n...[truncated]..."
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute(
+        history_writer.submit(
             "INSERT INTO history (task_id, tool, params, result, raw_output, status, created_at) "
             "VALUES (?, ?, ?, ?, ?, ?, ?)",
             (
@@ -181,13 +412,60 @@ def record_history(task_id, tool, params_dict, result_dict, raw_output, status="
                 datetime.now(UTC).isoformat(),
             ),
         )
-        conn.commit()
-        conn.close()
+        index_search_text(task_id, "params", params_search_text(params_dict))
         app.logger.info("history recorded: tool=%s task=%s status=%s", tool, task_id, status)
     except Exception:
         app.logger.exception("failed to record history")
 
 
+class OutputSpool:
+    """
+    Saída das tarefas gravada inteira, em pedaços zlib: as linhas publicadas
+    pelo sse_put se acumulam por tarefa e viram um chunk a cada
+    HISTORY_CHUNK_BYTES (o resto é gravado no fim da tarefa).
+    """
+
+    def __init__(self, chunk_bytes=HISTORY_CHUNK_BYTES):
+        self.chunk_bytes = chunk_bytes
+        self._lock = threading.Lock()
+        self._buffers = {}  # task_id -> [bytearray, próximo seq]
+
+    def append(self, task_id, text):
+        with self._lock:
+            buf = self._buffers.setdefault(task_id, [bytearray(), 0])
+            buf[0] += (text + "\n").encode("utf-8", errors="replace")
+            if len(buf[0]) < self.chunk_bytes:
+                return
+            chunk, seq = bytes(buf[0]), buf[1]
+            buf[0].clear()
+            buf[1] += 1
+        self._write(task_id, seq, chunk)
+
+    def close(self, task_id):
+        with self._lock:
+            buf = self._buffers.pop(task_id, None)
+        if buf and buf[0]:
+            self._write(task_id, buf[1], bytes(buf[0]))
+
+    @staticmethod
+    def _write(task_id, seq, chunk):
+        history_writer.submit(
+            "INSERT OR REPLACE INTO history_chunks (task_id, seq, raw_bytes, data) VALUES (?, ?, ?, ?)",
+            (task_id, seq, len(chunk), zlib.compress(chunk)),
+        )
+        index_search_text(task_id, "output", chunk.decode("utf-8", errors="replace"))
+
+
+output_spool = OutputSpool()
+
+
+def update_history_status(task_id, status):
+    try:
+        history_writer.submit("UPDATE history SET status = ? WHERE task_id = ?", (status, task_id))
+    except Exception:
+        app.logger.exception("failed to update history status")
+
+
 def save_history(tool, params=None, result=None, raw_output=None, status="started", task_id=None):
     if task_id is None:
         task_id = str(uuid.uuid4())
@@ -202,19 +480,149 @@ def save_history(tool, params=None, result=None, raw_output=None, status="starte
     return task_id
 
 
-def fetch_history(limit=200):
+HISTORY_COLUMNS = "id, task_id, tool, params, result, status, created_at"
+
+
+def history_filters(args):
+    """
+    Filtros do admin a partir da query string: tool, status, since, until
+    (datas ISO, em UTC quando sem fuso) e after_id. ValueError se um valor
+    é inválido.
+    """
+    filters = {}
+    if args.get("after_id"):
+        filters["after_id"] = int(args["after_id"])
+    for name in ("tool", "status"):
+        value = (args.get(name) or "").strip()
+        if value:
+            filters[name] = value
+    for name in ("since", "until"):
+        value = (args.get(name) or "").strip()
+        if value:
+            ts = datetime.fromisoformat(value)
+            if ts.tzinfo is not None:
+                ts = ts.astimezone(UTC).replace(tzinfo=None)
+            filters[name] = ts.isoformat()
+    return filters
+
+
+def history_where(filters, cursor=None, ascending=False):
+    clauses, params = [], []
+    if "after_id" in filters:
+        clauses.append("id > ?")
+        params.append(filters["after_id"])
+    if "tool" in filters:
+        clauses.append("tool = ?")
+        params.append(filters["tool"])
+    if "status" in filters:
+        clauses.append("status = ?")
+        params.append(filters["status"])
+    # created_at é ISO em UTC, então comparação de texto basta
+    if "since" in filters:
+        clauses.append("created_at >= ?")
+        params.append(filters["since"])
+    if "until" in filters:
+        clauses.append("created_at < ?")
+        params.append(filters["until"])
+    if cursor:
+        clauses.append("id > ?" if ascending else "id < ?")
+        params.append(cursor)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def iter_history(filters=None, cursor=None, limit=HISTORY_PAGE_DEFAULT, batch=100, ascending=False):
+    """
+    Linhas do histórico (id decrescente) abaixo do cursor, em lotes pelo
+    índice de id, sem carregar a página inteira. Tuplas na ordem de
+    HISTORY_COLUMNS; params/result ficam como texto JSON. ascending=True
+    anda no sentido contrário (acima do cursor), para exportação;
+    limit=None percorre tudo.
+    """
     init_db()
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute(
-        "SELECT id, task_id, tool, params, result, status, created_at "
-        "FROM history ORDER BY id DESC LIMIT ?",
-        (limit,),
+    history_writer.flush()
+    filters = filters or {}
+    remaining = limit
+    while remaining is None or remaining > 0:
+        n = batch if remaining is None else min(batch, remaining)
+        where, params = history_where(filters, cursor, ascending)
+        rows = db_conn().execute(
+            f"SELECT {HISTORY_COLUMNS} FROM history{where} ORDER BY id {'ASC' if ascending else 'DESC'} LIMIT ?",
+            params + [n],
+        ).fetchall()
+        yield from rows
+        if len(rows) < n:
+            return
+        cursor = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+def history_next_cursor(filters, cursor, limit):
+    """Cursor da página seguinte (id da última linha desta) ou None se ela é a última."""
+    init_db()
+    history_writer.flush()
+    where, params = history_where(filters, cursor)
+    row = db_conn().execute(
+        f"SELECT id FROM history{where} ORDER BY id DESC LIMIT 1 OFFSET ?", params + [limit - 1]
+    ).fetchone()
+    if row is None:
+        return None
+    where, params = history_where(filters, row[0])
+    more = db_conn().execute(f"SELECT 1 FROM history{where} LIMIT 1", params).fetchone()
+    return row[0] if more else None
+
+
+def history_row_json(row):
+    """Serializa uma linha reaproveitando o JSON já gravado de params/result."""
+    hid, task_id, tool, params, result, status, created_at = row
+    return (
+        f'{{"id": {hid}, "task_id": {json.dumps(task_id)}, "tool": {json.dumps(tool)}, '
+        f'"params": {params or "{}"}, "result": {result or "{}"}, '
+        f'"status": {json.dumps(status)}, "created_at": {json.dumps(created_at)}}}'
     )
-    rows = c.fetchall()
-    conn.close()
+
+
+def fts_query(text):
+    """Texto livre -> consulta FTS5: cada termo vira uma frase entre aspas (todos obrigatórios)."""
+    terms = [t.replace('"', '""') for t in text.split()]
+    return " ".join(f'"{t}"' for t in terms if t)
+
+
+def search_history(q, kind=None, tool=None, limit=20, offset=0, raw=False):
+    """
+    Busca no índice (bm25). Devolve (resultados, há_mais). Com raw=True, q
+    vai direto para o MATCH (sintaxe FTS5: OR, NEAR, prefixo*...).
+    """
+    init_db()
+    history_writer.flush()
+    where, params = ["history_fts MATCH ?"], [q if raw else fts_query(q)]
+    if kind:
+        where.append("f.kind = ?")
+        params.append(kind)
+    if tool:
+        where.append("h.tool = ?")
+        params.append(tool)
+    rows = db_conn().execute(
+        "SELECT f.task_id, f.kind, snippet(history_fts, 2, '<mark>', '</mark>', '…', 16), f.rank, "
+        "h.id, h.tool, h.params, h.status, h.created_at "
+        "FROM history_fts f LEFT JOIN history h ON h.id = (SELECT min(id) FROM history WHERE task_id = f.task_id) "
+        f"WHERE {' AND '.join(where)} ORDER BY f.rank LIMIT ? OFFSET ?",
+        params + [limit + 1, offset],
+    ).fetchall()
+    results = [
+        {
+            "task_id": task_id, "kind": k, "snippet": snippet, "score": -rank,
+            "history_id": hid, "tool": t, "params": json.loads(p) if p else {},
+            "status": status, "created_at": created_at,
+        }
+        for task_id, k, snippet, rank, hid, t, p, status, created_at in rows[:limit]
+    ]
+    return results, len(rows) > limit
+
+
+def fetch_history(limit=200, filters=None, cursor=None):
     out = []
-    for r in rows:
+    for r in iter_history(filters, cursor=cursor, limit=limit):
         out.append(
             {
                 "id": r[0],
@@ -229,73 +637,1017 @@ def fetch_history(limit=200):
     return out
 
 
-def fetch_history_raw(hid):
+def iter_history_output(hid):
+    """
+    Saída completa de um registro, como gerador de bytes que descompacta um
+    chunk por vez (memória constante). None se o registro não existe.
+    """
     init_db()
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT raw_output FROM history WHERE id = ?", (hid,))
-    r = c.fetchone()
-    conn.close()
-    if not r:
+    history_writer.flush()
+    conn = db_conn()
+    row = conn.execute("SELECT task_id, result, raw_output FROM history WHERE id = ?", (hid,)).fetchone()
+    if not row:
         return None
-    return r[0]
+    task_id, result, raw_output = row
+    has_chunks = conn.execute("SELECT 1 FROM history_chunks WHERE task_id = ? LIMIT 1", (task_id,)).fetchone()
+    if not has_chunks:
+        # resultado servido do cache: a saída é a da execução original
+        try:
+            source = (json.loads(result) if result else {}).get("source_task")
+        except (ValueError, AttributeError):
+            source = None
+        if source and conn.execute(
+            "SELECT 1 FROM history_chunks WHERE task_id = ? LIMIT 1", (source,)
+        ).fetchone():
+            task_id, has_chunks = source, True
+
+    def generate():
+        if not has_chunks:
+            if raw_output:
+                yield raw_output.encode("utf-8")
+            return
+        seq = -1
+        while True:
+            rows = db_conn().execute(
+                "SELECT seq, data FROM history_chunks WHERE task_id = ? AND seq > ? ORDER BY seq LIMIT 16",
+                (task_id, seq),
+            ).fetchall()
+            if not rows:
+                return
+            for seq, data in rows:
+                yield zlib.decompress(data)
+
+    return generate()
 
 
 # -------------------
-# SSE infra
+# SSE infra (task bus)
 # -------------------
+#
+# O bus desacopla quem publica eventos (workers) de quem consome (/sse).
+# Cada tarefa tem um log append-only de eventos numerados (seq 1, 2, 3...):
+# qualquer número de assinantes recebe o stream completo e uma reconexão
+# retoma a partir do Last-Event-ID. "memory" só enxerga tarefas do próprio
+# processo; "sqlite" deixa qualquer worker do gunicorn publicar ou assinar.
+
+TASK_BUS_BACKEND = os.environ.get("TASK_BUS", "sqlite")
+TASK_BUS_DB_PATH = os.environ.get("TASK_BUS_DB_PATH", os.path.join(RUNS_DIR, "tasks.db"))
+TASK_BUS_POLL_SECS = float(os.environ.get("TASK_BUS_POLL_SECS", "0.25"))
+# quanto tempo o log fica disponível para replay depois do fim da tarefa
+TASK_LOG_TTL_SECS = int(os.environ.get("TASK_LOG_TTL_SECS", str(6 * 3600)))
+# tarefas que nunca terminaram (worker morto) são descartadas depois disso
+TASK_LOG_MAX_AGE_SECS = int(os.environ.get("TASK_LOG_MAX_AGE_SECS", str(24 * 3600)))
+
+TERMINAL_EVENTS = ("done", "error")
+
+
+class MemoryTaskBus:
+    """Log de eventos em memória por tarefa (um único processo)."""
+
+    def __init__(self):
+        self._tasks = {}  # task_id -> {"events": [...], "created": t, "finished": t|None}
+        self._cond = threading.Condition()
+
+    def create(self, task_id):
+        with self._cond:
+            self._tasks[task_id] = {
+                "events": [], "created": time.time(), "finished": None,
+                "state": "created", "tool": None, "cancel": False,
+            }
 
-streams = {}  # task_id -> queue.Queue()
+    def exists(self, task_id):
+        return task_id in self._tasks
+
+    def publish(self, task_id, event, data):
+        with self._cond:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return None
+            seq = len(task["events"]) + 1
+            task["events"].append((seq, event, data))
+            if event in TERMINAL_EVENTS:
+                task["finished"] = time.time()
+            self._cond.notify_all()
+            return seq
+
+    def publish_many(self, task_id, items):
+        seq = None
+        for event, data in items:
+            seq = self.publish(task_id, event, data)
+            if seq is None:
+                break
+        return seq
 
+    def events(self, task_id):
+        task = self._tasks.get(task_id)
+        return list(task["events"]) if task else []
 
-def start_task():
-    task_id = str(uuid.uuid4())
-    streams[task_id] = queue.Queue()
+    def subscribe(self, task_id, after_seq=0):
+        """Gera (seq, event, data) a partir de after_seq; None quando nada chegou."""
+        while True:
+            with self._cond:
+                task = self._tasks.get(task_id)
+                if task is None:
+                    return
+                pending = task["events"][after_seq:]
+                if not pending:
+                    self._cond.wait(timeout=TASK_BUS_POLL_SECS)
+                    pending = task["events"][after_seq:]
+            if not pending:
+                yield None
+                continue
+            for item in pending:
+                after_seq = item[0]
+                yield item
+
+    def set_state(self, task_id, state, tool=None):
+        task = self._tasks.get(task_id)
+        if task is not None:
+            task["state"] = state
+            task["tool"] = tool or task["tool"]
+
+    def get_state(self, task_id):
+        task = self._tasks.get(task_id)
+        if task is None:
+            return None
+        return {
+            "task_id": task_id, "tool": task["tool"], "state": task["state"],
+            "events": len(task["events"]), "created_at": task["created"],
+            "finished_at": task["finished"], "cancel_requested": task["cancel"],
+        }
+
+    def request_cancel(self, task_id):
+        task = self._tasks.get(task_id)
+        if task is None:
+            return False
+        task["cancel"] = True
+        return True
+
+    def cancel_requested(self, task_ids):
+        return [t for t in task_ids if self._tasks.get(t, {}).get("cancel")]
+
+    def state_counts(self):
+        counts = {}
+        for task in list(self._tasks.values()):
+            counts[task["state"]] = counts.get(task["state"], 0) + 1
+        return counts
+
+    def purge(self, now=None):
+        now = now or time.time()
+        with self._cond:
+            for task_id, task in list(self._tasks.items()):
+                done_at = task["finished"]
+                if (done_at and now - done_at > TASK_LOG_TTL_SECS) or now - task["created"] > TASK_LOG_MAX_AGE_SECS:
+                    del self._tasks[task_id]
+
+
+class SQLiteTaskBus:
+    """Log de eventos em SQLite (WAL), visível para todos os processos."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                tool TEXT,
+                state TEXT NOT NULL DEFAULT 'created',
+                last_seq INTEGER NOT NULL DEFAULT 0,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                created_at REAL,
+                finished_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS task_events (
+                task_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                event TEXT NOT NULL,
+                data TEXT,
+                created_at REAL,
+                PRIMARY KEY (task_id, seq)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_tasks_finished ON tasks (finished_at);
+            CREATE INDEX IF NOT EXISTS idx_tasks_state ON tasks (state);
+            """
+        )
+
+    def _conn(self):
+        # uma conexão por thread; autocommit, transações explícitas só no publish
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite_connect(self.path)
+        return conn
+
+    def create(self, task_id):
+        self._conn().execute(
+            "INSERT OR IGNORE INTO tasks (task_id, created_at) VALUES (?, ?)", (task_id, time.time())
+        )
+
+    def exists(self, task_id):
+        row = self._conn().execute("SELECT 1 FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return row is not None
+
+    def publish(self, task_id, event, data):
+        return self.publish_many(task_id, [(event, data)])
+
+    def publish_many(self, task_id, items):
+        """Grava vários eventos numa única transação; devolve o último seq."""
+        conn = self._conn()
+        now = time.time()
+        seq = None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for event, data in items:
+                row = conn.execute(
+                    "UPDATE tasks SET last_seq = last_seq + 1, finished_at = COALESCE(finished_at, ?) "
+                    "WHERE task_id = ? RETURNING last_seq",
+                    (now if event in TERMINAL_EVENTS else None, task_id),
+                ).fetchone()
+                if row is None:
+                    break
+                seq = row[0]
+                conn.execute(
+                    "INSERT INTO task_events (task_id, seq, event, data, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (task_id, seq, event, json.dumps(data, ensure_ascii=False), now),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return seq
+
+    def events(self, task_id):
+        rows = self._conn().execute(
+            "SELECT seq, event, data FROM task_events WHERE task_id = ? ORDER BY seq", (task_id,)
+        ).fetchall()
+        return [(seq, event, (json.loads(data) if data else {})) for seq, event, data in rows]
+
+    def subscribe(self, task_id, after_seq=0):
+        """Gera (seq, event, data) a partir de after_seq; None quando nada chegou."""
+        conn = self._conn()
+        while True:
+            rows = conn.execute(
+                "SELECT seq, event, data FROM task_events WHERE task_id = ? AND seq > ? ORDER BY seq",
+                (task_id, after_seq),
+            ).fetchall()
+            if not rows:
+                if not self.exists(task_id):
+                    return
+                yield None
+                time.sleep(TASK_BUS_POLL_SECS)
+                continue
+            for seq, event, data in rows:
+                after_seq = seq
+                yield seq, event, (json.loads(data) if data else {})
+
+    def set_state(self, task_id, state, tool=None):
+        self._conn().execute(
+            "UPDATE tasks SET state = ?, tool = COALESCE(?, tool) WHERE task_id = ?", (state, tool, task_id)
+        )
+
+    def get_state(self, task_id):
+        row = self._conn().execute(
+            "SELECT tool, state, last_seq, created_at, finished_at, cancel_requested "
+            "FROM tasks WHERE task_id = ?",
+            (task_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "task_id": task_id, "tool": row[0], "state": row[1], "events": row[2],
+            "created_at": row[3], "finished_at": row[4], "cancel_requested": bool(row[5]),
+        }
+
+    def request_cancel(self, task_id):
+        cur = self._conn().execute("UPDATE tasks SET cancel_requested = 1 WHERE task_id = ?", (task_id,))
+        return cur.rowcount > 0
+
+    def cancel_requested(self, task_ids):
+        if not task_ids:
+            return []
+        marks = ",".join("?" * len(task_ids))
+        rows = self._conn().execute(
+            f"SELECT task_id FROM tasks WHERE cancel_requested = 1 AND task_id IN ({marks})", list(task_ids)
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    def state_counts(self):
+        rows = self._conn().execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall()
+        return dict(rows)
+
+    def purge(self, now=None):
+        now = now or time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM task_events WHERE task_id IN ("
+                "SELECT task_id FROM tasks WHERE finished_at < ? OR created_at < ?)",
+                (now - TASK_LOG_TTL_SECS, now - TASK_LOG_MAX_AGE_SECS),
+            )
+            conn.execute(
+                "DELETE FROM tasks WHERE finished_at < ? OR created_at < ?",
+                (now - TASK_LOG_TTL_SECS, now - TASK_LOG_MAX_AGE_SECS),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def make_task_bus(backend=TASK_BUS_BACKEND):
+    if backend == "memory":
+        return MemoryTaskBus()
+    if backend == "sqlite":
+        return SQLiteTaskBus(TASK_BUS_DB_PATH)
+    raise ValueError(f"TASK_BUS desconhecido: {backend}")
+
+
+task_bus = make_task_bus()
+_last_purge = 0.0
+
+
+def start_task(task_id=None):
+    global _last_purge
+    task_id = task_id or str(uuid.uuid4())
+    task_bus.create(task_id)
+    # limpeza oportunista dos logs expirados (no máximo uma vez por minuto)
+    if time.time() - _last_purge > 60:
+        _last_purge = time.time()
+        try:
+            task_bus.purge()
+        except Exception:
+            app.logger.exception("task bus purge failed")
     app.logger.info("start_task %s", task_id)
     return task_id
 
 
-def end_task(task_id):
-    time.sleep(0.2)
-    app.logger.info("end_task %s", task_id)
+def end_task(task_id, ok=True):
+    state = "finished" if ok else ("cancelled" if scheduler.is_cancelled(task_id) else "failed")
+    task_bus.set_state(task_id, state)
+    output_spool.close(task_id)
+    update_history_status(task_id, state)
+    sse_put(task_id, "done", {"ok": ok, "state": state})
+    try:
+        result_cache.complete(task_id, ok)
+    except Exception:
+        app.logger.exception("result cache update failed")
+    app.logger.info("end_task %s (%s)", task_id, state)
+
+
+def sse_format(event, data, seq=None):
+    head = f"id: {seq}\n" if seq is not None else ""
+    return head + f"event: {event}\n" + "data: " + json.dumps(data, ensure_ascii=False) + "\n\n"
+
+
+# eventos que entram no índice de busca como "found" (perfil/conta encontrados)
+SEARCH_FOUND_TEXT = {
+    "found": lambda d: " ".join(str(d[k]) for k in ("site", "url") if d.get(k)),
+    "module": lambda d: d.get("domain") if d.get("exists") else None,
+    "item": lambda d: " ".join(
+        [f.get("url", "") for f in (d.get("result") or {}).get("found", [])] + (d.get("result") or {}).get("used", [])
+    ),
+}
 
 
 def sse_put(task_id, event, data):
-    q = streams.get(task_id)
-    if not q:
+    if isinstance(data, dict):
+        if event in ("output", "log") and data.get("line"):
+            output_spool.append(task_id, data["line"])
+        elif event in SEARCH_FOUND_TEXT:
+            index_search_text(task_id, "found", SEARCH_FOUND_TEXT[event](data))
+    if not task_bus.publish(task_id, event, data):
         app.logger.debug("sse_put: no stream %s", task_id)
-        return
-    payload = f"event: {event}\n" + "data: " + json.dumps(data, ensure_ascii=False) + "\n\n"
-    q.put(payload)
 
 
-def sse_stream(task_id):
-    q = streams.get(task_id)
-    if q is None:
-        yield "event: error\n" + "data: " + json.dumps({"msg": "task_not_found"}) + "\n\n"
+def sse_stream(task_id, last_event_id=0):
+    if not task_bus.exists(task_id):
+        yield sse_format("error", {"msg": "task_not_found"})
         return
     try:
+        # o navegador reconecta sozinho e manda Last-Event-ID
+        yield "retry: 3000\n\n"
         last_ping = 0
-        while True:
-            try:
-                chunk = q.get(timeout=0.25)
-                yield chunk
-                if chunk.startswith("event: done") or chunk.startswith("event: error"):
-                    break
-            except queue.Empty:
+        for item in task_bus.subscribe(task_id, after_seq=last_event_id):
+            if item is None:
                 now = time.time()
                 if now - last_ping > 15:
-                    yield "event: ping\n" + "data: " + json.dumps({"t": now}) + "\n\n"
+                    yield sse_format("ping", {"t": now})
                     last_ping = now
+                continue
+            seq, event, data = item
+            yield sse_format(event, data, seq=seq)
+            if event in TERMINAL_EVENTS:
+                break
     except GeneratorExit:
         app.logger.debug("SSE client disconnected")
     except Exception:
         app.logger.exception("sse_stream exception")
     finally:
-        streams.pop(task_id, None)
         app.logger.debug("sse_stream finished for %s", task_id)
 
 
+# -------------------
+# Scheduler (fila de execução das ferramentas)
+# -------------------
+#
+# Todos os /.../start passam por aqui em vez de abrir uma thread por pedido.
+# Cada ferramenta tem um limite de execuções simultâneas somando todos os
+# workers do gunicorn; o excedente espera numa fila por prioridade (menor
+# primeiro) e, dentro da mesma prioridade, por ordem de chegada. A posição
+# na fila vai pro SSE.
+#
+# A função de cada job só existe no processo que recebeu o pedido, então cada
+# worker guarda a sua fila local; a contagem global fica na tabela task_slots
+# (mesmo SQLite do task bus). Um job só começa depois de pegar uma vaga nela
+# sob BEGIN IMMEDIATE, e a posição na fila é calculada a partir dela. Vagas
+# de um worker que morreu expiram quando o heartbeat dele para.
+
+def env_tool_map(name, defaults):
+    """Lê "tool=valor,tool2=valor" de uma variável de ambiente sobre os defaults."""
+    out = dict(defaults)
+    for item in os.environ.get(name, "").split(","):
+        if "=" in item:
+            tool, value = item.split("=", 1)
+            out[tool.strip()] = int(value)
+    return out
+
+
+TOOL_CONCURRENCY_DEFAULT = int(os.environ.get("TOOL_CONCURRENCY_DEFAULT", "2"))
+# ex.: TOOL_CONCURRENCY="sherlock=2,metaweb=4"
+TOOL_CONCURRENCY = env_tool_map(
+    "TOOL_CONCURRENCY",
+    {"sherlock": 1, "vazamento": 2, "vazamento_batch": 1, "leak_search": 1, "bulk": 1, "metaweb": 2, "phoneinfoga": 2},
+)
+
+# intervalo em que o scheduler procura pedidos de cancelamento vindos de outros workers
+CANCEL_POLL_SECS = float(os.environ.get("CANCEL_POLL_SECS", "1.0"))
+# tempo entre SIGTERM e SIGKILL ao cancelar um processo
+CANCEL_GRACE_SECS = float(os.environ.get("CANCEL_GRACE_SECS", "5"))
+SLOTS_DB_PATH = os.environ.get("SLOTS_DB_PATH", TASK_BUS_DB_PATH)
+# vagas sem heartbeat há mais que isso são de um worker que morreu
+SLOT_STALE_SECS = float(os.environ.get("SLOT_STALE_SECS", "30"))
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, task_id, tool, fn, args, kwargs, priority, seq):
+        self.task_id = task_id
+        self.tool = tool
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.seq = seq
+        self.state = "queued"
+        self.position = None
+        self.cancel_event = threading.Event()
+        self.procs = []
+        self.enqueued_at = time.time()
+        self.started_at = None
+
+
+class SlotTable:
+    """Vagas das ferramentas (queued/running) compartilhadas entre os workers."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS task_slots (
+                slot_id TEXT PRIMARY KEY,
+                tool TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                enqueued_at REAL NOT NULL,
+                heartbeat REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_task_slots_tool ON task_slots (tool, state);
+            """
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite_connect(self.path)
+        return conn
+
+    def enqueue(self, slot_id, tool, priority=0):
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO task_slots (slot_id, tool, pid, state, priority, enqueued_at, heartbeat) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+            (slot_id, tool, os.getpid(), priority, now, now),
+        )
+
+    def try_acquire(self, slot_id, tool, limit):
+        """Passa a vaga para running se há lugar e ninguém na frente dela; True se conseguiu."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM task_slots WHERE heartbeat < ?", (now - SLOT_STALE_SECS,))
+            row = conn.execute(
+                "SELECT priority, enqueued_at FROM task_slots WHERE slot_id = ? AND state = 'queued'", (slot_id,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return False
+            running, ahead = conn.execute(
+                "SELECT count(*) FILTER (WHERE state = 'running'), "
+                "count(*) FILTER (WHERE state = 'queued' AND (priority, enqueued_at, slot_id) < (?, ?, ?)) "
+                "FROM task_slots WHERE tool = ?",
+                (row[0], row[1], slot_id, tool),
+            ).fetchone()
+            acquired = running + ahead < limit
+            if acquired:
+                conn.execute(
+                    "UPDATE task_slots SET state = 'running', heartbeat = ? WHERE slot_id = ?", (now, slot_id)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return acquired
+
+    def release(self, slot_id):
+        self._conn().execute("DELETE FROM task_slots WHERE slot_id = ?", (slot_id,))
+
+    def heartbeat(self):
+        self._conn().execute("UPDATE task_slots SET heartbeat = ? WHERE pid = ?", (time.time(), os.getpid()))
+
+    def positions(self, slot_ids=None):
+        """slot_id -> posição na fila da ferramenta (1 = próximo), contando todos os workers."""
+        rows = self._conn().execute(
+            "SELECT slot_id, ROW_NUMBER() OVER (PARTITION BY tool ORDER BY priority, enqueued_at, slot_id) "
+            "FROM task_slots WHERE state = 'queued' AND heartbeat >= ?",
+            (time.time() - SLOT_STALE_SECS,),
+        ).fetchall()
+        out = dict(rows)
+        return out if slot_ids is None else {k: out[k] for k in slot_ids if k in out}
+
+    def counts(self):
+        """{tool: {"running": n, "queued": n}} e os pids com vagas, de todos os workers."""
+        rows = self._conn().execute(
+            "SELECT tool, state, count(*), group_concat(DISTINCT pid) FROM task_slots "
+            "WHERE heartbeat >= ? GROUP BY tool, state",
+            (time.time() - SLOT_STALE_SECS,),
+        ).fetchall()
+        tools, pids = {}, set()
+        for tool, state, n, pid_list in rows:
+            tools.setdefault(tool, {"running": 0, "queued": 0})[state] = n
+            pids.update(int(p) for p in pid_list.split(","))
+        return tools, sorted(pids)
+
+
+class TaskScheduler:
+    def __init__(self, limits, default_limit, slots):
+        self.limits = limits
+        self.default_limit = default_limit
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._queued = []   # jobs em ordem (priority, seq)
+        self._running = {}  # task_id -> Job
+        self._seq = 0
+        self._watcher = None
+
+    def limit_for(self, tool):
+        return self.limits.get(tool, self.default_limit)
+
+    def submit(self, task_id, tool, fn, args=(), kwargs=None, priority=0):
+        with self._lock:
+            self._seq += 1
+            job = Job(task_id, tool, fn, args, kwargs or {}, priority, self._seq)
+            self.slots.enqueue(task_id, tool, priority)
+            self._queued.append(job)
+            self._queued.sort(key=lambda j: (j.priority, j.seq))
+            task_bus.set_state(task_id, "queued", tool=tool)
+            self._ensure_watcher()
+        self._dispatch()
+        return job
+
+    def _dispatch(self):
+        to_start = []
+        with self._lock:
+            blocked = set()  # ferramenta cujo primeiro da fila local não conseguiu vaga
+            for job in list(self._queued):
+                if job.tool in blocked:
+                    continue
+                try:
+                    acquired = self.slots.try_acquire(job.task_id, job.tool, self.limit_for(job.tool))
+                except sqlite3.Error:
+                    app.logger.exception("slot acquire failed for %s", job.task_id)
+                    acquired = False
+                if not acquired:
+                    blocked.add(job.tool)
+                    continue
+                self._queued.remove(job)
+                job.state = "running"
+                job.started_at = time.time()
+                self._running[job.task_id] = job
+                to_start.append(job)
+            notify = self._update_positions() if self._queued else []
+        if notify:
+            counts, _ = self.slots.counts()
+            for job in notify:
+                sse_put(job.task_id, "queue", {
+                    "position": job.position, "tool": job.tool,
+                    "running": counts.get(job.tool, {}).get("running", 0), "limit": self.limit_for(job.tool),
+                })
+        for job in to_start:
+            task_bus.set_state(job.task_id, "running")
+            update_history_status(job.task_id, "running")
+            threading.Thread(target=self._run, args=(job,), daemon=True).start()
+
+    def _update_positions(self):
+        # posição = quantos jobs da mesma ferramenta estão à frente em todos os workers (+1)
+        positions = self.slots.positions([j.task_id for j in self._queued])
+        changed = []
+        for job in self._queued:
+            position = positions.get(job.task_id)
+            if position is not None and job.position != position:
+                job.position = position
+                changed.append(job)
+        return changed
+
+    def _run(self, job):
+        try:
+            job.fn(*job.args, **job.kwargs)
+        except Exception:
+            app.logger.exception("job %s (%s) crashed", job.task_id, job.tool)
+        finally:
+            with self._lock:
+                self._running.pop(job.task_id, None)
+            try:
+                self.slots.release(job.task_id)
+            except sqlite3.Error:
+                app.logger.exception("slot release failed for %s", job.task_id)
+            self._dispatch()
+
+    def attach_process(self, task_id, proc):
+        job = self._running.get(task_id)
+        if job is not None:
+            job.procs.append(proc)
+
+    def detach_process(self, task_id, proc):
+        job = self._running.get(task_id)
+        if job is not None and proc in job.procs:
+            job.procs.remove(proc)
+
+    def is_cancelled(self, task_id):
+        job = self._running.get(task_id)
+        return job is not None and job.cancel_event.is_set()
+
+    def cancel(self, task_id):
+        """Cancela um job deste processo; False se ele não está aqui."""
+        with self._lock:
+            job = next((j for j in self._queued if j.task_id == task_id), None)
+            if job is not None:
+                self._queued.remove(job)
+            else:
+                job = self._running.get(task_id)
+        if job is None:
+            return False
+        job.cancel_event.set()
+        if job.state == "queued":
+            # nunca rodou: o próprio scheduler fecha o stream
+            job.state = "cancelled"
+            self.slots.release(task_id)
+            sse_put(task_id, "status", {"phase": "cancelled", "msg": "Tarefa cancelada antes de iniciar"})
+            task_bus.set_state(task_id, "cancelled")
+            update_history_status(task_id, "cancelled")
+            sse_put(task_id, "done", {"ok": False, "state": "cancelled"})
+            self._dispatch()
+        else:
+            for proc in list(job.procs):
+                kill_process_tree(proc)
+        return True
+
+    def _ensure_watcher(self):
+        if self._watcher is None or not self._watcher.is_alive():
+            self._watcher = threading.Thread(target=self._watch_cancellations, daemon=True)
+            self._watcher.start()
+
+    def _watch_cancellations(self):
+        # cancelamentos pedidos em outro worker chegam pelo task bus; a mesma
+        # volta mantém o heartbeat das vagas e tenta de novo a fila local
+        # (vagas liberadas em outro worker não avisam este)
+        while True:
+            time.sleep(CANCEL_POLL_SECS)
+            with self._lock:
+                ids = [j.task_id for j in self._queued] + list(self._running)
+                has_queued = bool(self._queued)
+            try:
+                self.slots.heartbeat()
+                for task_id in task_bus.cancel_requested(ids):
+                    if not self.is_cancelled(task_id):
+                        self.cancel(task_id)
+                if has_queued:
+                    self._dispatch()
+            except Exception:
+                app.logger.exception("cancel watcher failed")
+
+    @contextlib.contextmanager
+    def hold_slot(self, slot_id, tool, task_id, priority=0):
+        """
+        Ocupa uma vaga de `tool` (fila global, como um job) enquanto o bloco
+        roda; usado pelos itens de um lote, que rodam dentro da tarefa task_id.
+        Cancelar a tarefa enquanto espera levanta TaskCancelled.
+        """
+        self.slots.enqueue(slot_id, tool, priority)
+        self._ensure_watcher()
+        try:
+            while not self.slots.try_acquire(slot_id, tool, self.limit_for(tool)):
+                if self.is_cancelled(task_id):
+                    raise TaskCancelled(task_id)
+                time.sleep(min(CANCEL_POLL_SECS, 0.5))
+            yield
+        finally:
+            self.slots.release(slot_id)
+
+    def position(self, task_id):
+        """Posição na fila global (vale para tarefas de qualquer worker); None se não está na fila."""
+        return self.slots.positions([task_id]).get(task_id)
+
+    def stats(self):
+        counts, pids = self.slots.counts()
+        tools = sorted(set(self.limits) | set(counts))
+        return {
+            "pid": os.getpid(),
+            "workers": pids,
+            "queue_depth": sum(c["queued"] for c in counts.values()),
+            "running": sum(c["running"] for c in counts.values()),
+            "tools": {
+                t: {**counts.get(t, {"running": 0, "queued": 0}), "limit": self.limit_for(t)}
+                for t in tools
+            },
+        }
+
+
+def kill_process_tree(proc):
+    """SIGTERM no grupo do processo e, se não sair a tempo, SIGKILL."""
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        return
+
+    def _force():
+        if proc.poll() is None:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+    timer = threading.Timer(CANCEL_GRACE_SECS, _force)
+    timer.daemon = True
+    timer.start()
+
+
+scheduler = TaskScheduler(TOOL_CONCURRENCY, TOOL_CONCURRENCY_DEFAULT, SlotTable(SLOTS_DB_PATH))
+
+
+def request_priority(request_obj):
+    try:
+        return max(-10, min(10, int(get_param_any(request_obj, "priority") or 0)))
+    except (TypeError, ValueError):
+        return 0
+
+
+# -------------------
+# Cache de resultados (single-flight + TTL)
+# -------------------
+#
+# Chave = ferramenta + parâmetros normalizados. Enquanto uma execução está
+# em andamento, pedidos idênticos se juntam à mesma tarefa (o log de eventos
+# é fan-out); depois que ela termina bem, o log fica em cache por TTL e é
+# reproduzido numa nova tarefa com os eventos marcados como cached=true.
+
+RESULT_CACHE_DB_PATH = os.environ.get("RESULT_CACHE_DB_PATH", TASK_BUS_DB_PATH)
+RESULT_CACHE_TTL_SECS = int(os.environ.get("RESULT_CACHE_TTL_SECS", "3600"))
+# TTL por ferramenta, ex.: RESULT_CACHE_TTL="sherlock=7200,phoneinfoga=86400"
+RESULT_CACHE_TTL = env_tool_map("RESULT_CACHE_TTL", {"phoneinfoga": 24 * 3600})
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "500"))
+
+# eventos que não fazem sentido num replay
+_UNCACHED_EVENTS = ("queue", "ping") + TERMINAL_EVENTS
+_LIVE_STATES = ("created", "queued", "running")
+
+
+class ResultCache:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS result_cache (
+                key TEXT PRIMARY KEY,
+                tool TEXT NOT NULL,
+                params TEXT,
+                task_id TEXT NOT NULL,
+                state TEXT NOT NULL,
+                events BLOB,
+                created_at REAL,
+                last_used REAL,
+                hits INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_result_cache_task ON result_cache (task_id);
+            CREATE INDEX IF NOT EXISTS idx_result_cache_used ON result_cache (last_used);
+            """
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite_connect(self.path)
+        return conn
+
+    @staticmethod
+    def key(tool, params):
+        raw = tool + "\0" + json.dumps(params, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def ttl_for(tool):
+        return RESULT_CACHE_TTL.get(tool, RESULT_CACHE_TTL_SECS)
+
+    def claim(self, tool, params, task_id, refresh=False, ttl=None):
+        """
+        Decide o destino de um pedido:
+          ("cached", info)    -> resultado pronto dentro do TTL
+          ("attached", tid)   -> execução idêntica em andamento
+          ("new", task_id)    -> este pedido executa (e fica registrado)
+        ttl sobrepõe o TTL da ferramenta (ex.: resultados por conteúdo).
+        """
+        key = self.key(tool, params)
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT task_id, state, events, created_at FROM result_cache WHERE key = ?", (key,)
+            ).fetchone()
+            ttl = self.ttl_for(tool) if ttl is None else ttl
+            if row and row[1] == "ready" and not refresh and now - row[3] < ttl:
+                conn.execute(
+                    "UPDATE result_cache SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key)
+                )
+                conn.execute("COMMIT")
+                return "cached", {
+                    "task_id": row[0],
+                    "created_at": row[3],
+                    "events": json.loads(zlib.decompress(row[2]).decode("utf-8")),
+                }
+            if row and row[1] == "running":
+                info = task_bus.get_state(row[0])
+                if info and info["state"] in _LIVE_STATES:
+                    conn.execute("COMMIT")
+                    return "attached", row[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO result_cache (key, tool, params, task_id, state, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, 'running', ?, ?)",
+                (key, tool, json.dumps(params, ensure_ascii=False), task_id, now, now),
+            )
+            conn.execute("COMMIT")
+            return "new", task_id
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def peek(self, tool, params, ttl=None):
+        """Resultado pronto dentro do TTL (mesmo formato de claim) ou None; não registra execução."""
+        key = self.key(tool, params)
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT task_id, events, created_at FROM result_cache WHERE key = ? AND state = 'ready'", (key,)
+        ).fetchone()
+        ttl = self.ttl_for(tool) if ttl is None else ttl
+        if row is None or now - row[2] >= ttl:
+            return None
+        conn.execute("UPDATE result_cache SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        return {
+            "task_id": row[0],
+            "created_at": row[2],
+            "events": json.loads(zlib.decompress(row[1]).decode("utf-8")),
+        }
+
+    def complete(self, task_id, ok):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT key FROM result_cache WHERE task_id = ? AND state = 'running'", (task_id,)
+        ).fetchone()
+        if row is None:
+            return
+        if not ok:
+            conn.execute("DELETE FROM result_cache WHERE key = ?", (row[0],))
+            return
+        events = [(e, d) for _, e, d in task_bus.events(task_id) if e not in _UNCACHED_EVENTS]
+        blob = zlib.compress(json.dumps(events, ensure_ascii=False).encode("utf-8"))
+        now = time.time()
+        conn.execute(
+            "UPDATE result_cache SET state = 'ready', events = ?, created_at = ?, last_used = ? WHERE key = ?",
+            (blob, now, now, row[0]),
+        )
+        self.evict()
+
+    def store(self, tool, params, task_id, events):
+        """Grava um resultado pronto produzido fora de uma tarefa própria (ex.: item de lote)."""
+        blob = zlib.compress(json.dumps(events, ensure_ascii=False).encode("utf-8"))
+        now = time.time()
+        # não passa por cima de uma execução idêntica em andamento (single-flight)
+        self._conn().execute(
+            "INSERT INTO result_cache (key, tool, params, task_id, state, events, created_at, last_used) "
+            "VALUES (?, ?, ?, ?, 'ready', ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET task_id = excluded.task_id, state = 'ready', events = excluded.events, "
+            "created_at = excluded.created_at, last_used = excluded.last_used WHERE state != 'running'",
+            (self.key(tool, params), tool, json.dumps(params, ensure_ascii=False), task_id, blob, now, now),
+        )
+        self.evict()
+
+    def evict(self):
+        # remove as entradas prontas menos usadas recentemente além do limite
+        self._conn().execute(
+            "DELETE FROM result_cache WHERE key IN ("
+            "SELECT key FROM result_cache WHERE state = 'ready' ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (RESULT_CACHE_MAX_ENTRIES,),
+        )
+
+
+result_cache = ResultCache(RESULT_CACHE_DB_PATH)
+
+
+def replay_cached(task_id, cached):
+    """Reproduz o log em cache numa tarefa nova, marcando cada evento."""
+    cached_at = datetime.fromtimestamp(cached["created_at"], UTC).isoformat()
+    items = [("status", {
+        "phase": "cached", "cached": True, "cached_at": cached_at, "source_task": cached["task_id"],
+        "msg": f"Resultado em cache de {cached_at} (use refresh=1 para executar de novo)",
+    })]
+    for event, data in cached["events"]:
+        items.append((event, dict(data, cached=True) if isinstance(data, dict) else data))
+    task_bus.publish_many(task_id, items)
+    task_bus.set_state(task_id, "finished")
+    sse_put(task_id, "done", {"ok": True, "state": "finished", "cached": True})
+
+
+def request_flag(request_obj, name):
+    return str(get_param_any(request_obj, name) or "").lower() in ("1", "true", "yes", "on")
+
+
+def request_refresh(request_obj):
+    return request_flag(request_obj, "refresh")
+
+
+def launch_tool(tool, fn, args=(), kwargs=None, history_tool=None, history_params=None, cache_params=None,
+                cache_ttl=None, extra=None):
+    """
+    Dispara uma execução de `tool` via scheduler e devolve a resposta JSON.
+
+    fn é chamado como fn(task_id, *args, **kwargs). Com cache_params
+    (parâmetros já normalizados), pedidos idênticos são servidos do cache
+    ou se juntam à execução em andamento; refresh=1 força uma nova.
+    cache_ttl sobrepõe o TTL da ferramenta. extra é acrescentado à resposta de uma execução nova.
+    """
+    history_tool = history_tool or tool
+    history_params = history_params or {}
+    task_id = str(uuid.uuid4())
+    if cache_params is not None:
+        outcome, info = result_cache.claim(
+            tool, cache_params, task_id, refresh=request_refresh(request), ttl=cache_ttl
+        )
+        if outcome == "attached":
+            app.logger.info("single-flight: %s attached to %s", tool, info)
+            state = task_bus.get_state(info) or {}
+            return jsonify({
+                "task_id": info, "state": state.get("state"),
+                "position": scheduler.position(info), "attached": True,
+            })
+        if outcome == "cached":
+            start_task(task_id)
+            task_bus.set_state(task_id, "running", tool=tool)
+            save_history(
+                tool=history_tool, params=history_params,
+                result={"note": "cache", "source_task": info["task_id"]},
+                status="cached", task_id=task_id,
+            )
+            replay_cached(task_id, info)
+            return jsonify({"task_id": task_id, "state": "finished", "position": None, "cached": True})
+
+    start_task(task_id)
+    save_history(
+        tool=history_tool, params=history_params, result={"note": "start"}, status="started", task_id=task_id,
+    )
+    job = scheduler.submit(
+        task_id, tool, fn, args=(task_id,) + tuple(args), kwargs=kwargs, priority=request_priority(request)
+    )
+    return jsonify(dict(extra or {}, task_id=task_id, state=job.state, position=job.position, cached=False))
+
+
 # -------------------
 # Helpers
 # -------------------
@@ -306,38 +1658,112 @@ def safe_domain(input_str):
     return host
 
 
-def run_command_stream(cmd, cwd=None, env=None):
+class CommandFailed(Exception):
+    """Comando externo ausente ou com código de saída diferente de zero."""
+
+    def __init__(self, msg, returncode=None):
+        super().__init__(msg)
+        self.returncode = returncode
+
+
+# tempo máximo que uma linha incompleta (sem \n) fica retida antes de ir pro SSE
+STREAM_FLUSH_SECS = float(os.environ.get("STREAM_FLUSH_SECS", "0.5"))
+
+
+def run_command_stream(cmd, cwd=None, env=None, task_id=None):
     """
     Executa um comando externo e streama stdout e stderr em tempo real.
+
+    Os dois pipes são drenados ao mesmo tempo com selectors, então um pipe
+    quieto não trava o outro e nenhum buffer enche. Gera tuplas
+    (stream, linha) com stream "stdout" ou "stderr"; linhas sem quebra
+    são liberadas depois de STREAM_FLUSH_SECS.
+
+    Com task_id, o processo roda num grupo próprio registrado no scheduler,
+    para que /tasks/<task_id>/cancel mate a árvore inteira; nesse caso
+    TaskCancelled é levantada ao final.
+
+    Se o comando não existe ou sai com código diferente de zero, a linha de
+    erro vai para o stream e CommandFailed é levantada em seguida, para que
+    a tarefa termine como falha (e não entre no cache de resultados).
     """
     try:
         proc = subprocess.Popen(
             cmd,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True
+            cwd=cwd,
+            env=env,
+            start_new_session=True,
         )
+    except FileNotFoundError:
+        app.logger.error(f"Command not found: {cmd[0]}")
+        yield "stderr", f"[error] Command not found: {cmd[0]}"
+        raise CommandFailed(f"Command not found: {cmd[0]}")
+    except Exception as e:
+        app.logger.exception(f"Exception in run_command_stream: {e}")
+        yield "stderr", f"[exception] {str(e)}"
+        raise CommandFailed(str(e)) from e
+
+    if task_id:
+        scheduler.attach_process(task_id, proc)
+    sel = selectors.DefaultSelector()
+    pending = {}  # stream -> [decoder, buffer, instante do 1º byte pendente]
+    for name, pipe in (("stdout", proc.stdout), ("stderr", proc.stderr)):
+        sel.register(pipe, selectors.EVENT_READ, name)
+        pending[name] = [codecs.getincrementaldecoder("utf-8")(errors="replace"), "", None]
+
+    def emit(name, text):
+        line = text.strip()
+        if line:
+            app.logger.info(f"[CMD OUT] {line}")
+            return [(name, line)]
+        return []
 
-        # Lê stdout e stderr em tempo real, combinando a saída
-        for line in iter(lambda: proc.stdout.readline() + proc.stderr.readline(), ""):
-            if line:
-                app.logger.info(f"[CMD OUT] {line.strip()}")
-                yield line.strip()
+    try:
+        while sel.get_map():
+            for key, _ in sel.select(timeout=STREAM_FLUSH_SECS):
+                name = key.data
+                state = pending[name]
+                chunk = os.read(key.fd, 65536)
+                if not chunk:
+                    sel.unregister(key.fileobj)
+                    key.fileobj.close()
+                    yield from emit(name, state[1] + state[0].decode(b"", final=True))
+                    state[1], state[2] = "", None
+                    continue
+                *lines, state[1] = (state[1] + state[0].decode(chunk)).split("\n")
+                state[2] = time.monotonic() if state[1] else None
+                for line in lines:
+                    yield from emit(name, line)
+
+            now = time.monotonic()
+            for name, state in pending.items():
+                if state[2] is not None and now - state[2] >= STREAM_FLUSH_SECS:
+                    yield from emit(name, state[1])
+                    state[1], state[2] = "", None
 
-        proc.stdout.close()
-        proc.stderr.close()
         ret = proc.wait()
-
+        if task_id and scheduler.is_cancelled(task_id):
+            raise TaskCancelled(task_id)
         if ret != 0:
             app.logger.error(f"Command {' '.join(cmd)} failed with exit code {ret}")
-            yield f"[error] Command failed with exit code {ret}"
+            yield "stderr", f"[error] Command failed with exit code {ret}"
+            raise CommandFailed(f"{os.path.basename(cmd[0])} saiu com código {ret}", returncode=ret)
 
-    except FileNotFoundError:
-        app.logger.error(f"Command not found: {cmd[0]}")
-        yield f"[error] Command not found: {cmd[0]}"
+    except (TaskCancelled, CommandFailed):
+        raise
     except Exception as e:
         app.logger.exception(f"Exception in run_command_stream: {e}")
-        yield f"[exception] {str(e)}"
+        yield "stderr", f"[exception] {str(e)}"
+        raise CommandFailed(str(e)) from e
+    finally:
+        sel.close()
+        if task_id:
+            scheduler.detach_process(task_id, proc)
+        if proc.poll() is None:
+            kill_process_tree(proc)
+            proc.wait()
 
 
 def detect_executable(module_name, script_name=None):
@@ -351,97 +1777,863 @@ def detect_executable(module_name, script_name=None):
     return [sys.executable, "-m", module_name], "module"
 
 
-def file_hashes(path):
+def file_hashes(path, on_progress=None):
+    return hashing.hash_file(path, ("sha256", "md5"), on_progress=on_progress)
+
+
+def save_upload(file_storage, chunk_size=1024 * 1024):
+    """
+    Grava um upload no armazenamento por conteúdo, calculando o SHA-256
+    enquanto os bytes chegam. Um arquivo já conhecido não é gravado de novo.
+    Devolve (caminho, sha256, tamanho, já_existia).
+    """
+    ext = os.path.splitext(secure_filename(file_storage.filename or ""))[1].lower()[:10]
     sha256 = hashlib.sha256()
-    md5 = hashlib.md5()
     size = 0
-    with open(path, "rb") as f:
-        while True:
-            chunk = f.read(8192)
-            if not chunk:
-                break
-            sha256.update(chunk)
-            md5.update(chunk)
-            size += len(chunk)
-    return {"size": size, "sha256": sha256.hexdigest(), "md5": md5.hexdigest()}
+    fd, tmp_path = tempfile.mkstemp(prefix=".upload_", dir=CAS_DIR)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = file_storage.stream.read(chunk_size)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        digest = sha256.hexdigest()
+        shard = os.path.join(CAS_DIR, digest[:2])
+        os.makedirs(shard, exist_ok=True)
+        path = os.path.join(shard, digest + ext)
+        existed = os.path.exists(path)
+        if existed:
+            os.unlink(tmp_path)
+            os.utime(path)  # reenviado: volta a contar como upload recente
+        else:
+            os.replace(tmp_path, path)
+        return path, digest, size, existed
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def stored_uploads():
+    """Todos os arquivos de uploads/ (armazenamento por conteúdo e arquivos antigos), sem temporários."""
+    paths = []
+    for root, _, names in os.walk(UPLOAD_DIR):
+        paths += [os.path.join(root, n) for n in names if not n.startswith(".")]
+    return paths
+
+
+SHA256_RE = re.compile(r"[0-9a-f]{64}")
+
+
+def cas_digest(path):
+    """sha256 de um arquivo do armazenamento por conteúdo (vem no nome), ou None."""
+    digest = os.path.basename(path)[:64]
+    if os.path.dirname(path) == os.path.join(CAS_DIR, digest[:2]) and SHA256_RE.fullmatch(digest):
+        return digest
+    return None
+
+
+def cas_path(digest):
+    """Upload com este sha256 (com qualquer extensão), ou None."""
+    shard = os.path.join(CAS_DIR, digest[:2])
+    try:
+        names = os.listdir(shard)
+    except OSError:
+        return None
+    for name in names:
+        if name.startswith(digest):
+            return os.path.join(shard, name)
+    return None
+
+
+def recent_uploads(max_age=METAWEB_RECENT_SECS):
+    """Uploads do armazenamento por conteúdo mais novos que max_age segundos, do mais recente ao mais antigo."""
+    cutoff = time.time() - max_age
+    found = []
+    for root, _, names in os.walk(CAS_DIR):
+        for name in names:
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            if mtime >= cutoff:
+                found.append((mtime, path))
+    return [path for _, path in sorted(found, reverse=True)]
+
+
+def request_list(request_obj, name):
+    """Parâmetro de lista: array JSON ou texto separado por espaço, vírgula ou ponto e vírgula."""
+    raw = get_param_any(request_obj, name) or []
+    if isinstance(raw, str):
+        raw = re.split(r"[\s,;]+", raw)
+    values = []
+    for v in raw:
+        v = str(v).strip()
+        if v and v not in values:
+            values.append(v)
+    return values
+
+
+def select_uploads(request_obj):
+    """
+    Arquivos de uma varredura em lote: `sha256` (digests de uploads), `files`
+    (caminhos relativos a uploads/) ou `all=1` (tudo, inclusive arquivos
+    antigos); sem nada disso, os uploads recentes. Devolve ({caminho: sha256
+    ou None}, itens não encontrados).
+    """
+    selected = {}
+    missing = []
+    digests = [d.lower() for d in request_list(request_obj, "sha256")]
+    files = request_list(request_obj, "files")
+    for digest in digests:
+        path = cas_path(digest) if SHA256_RE.fullmatch(digest) else None
+        if path:
+            selected[path] = digest
+        else:
+            missing.append(digest)
+    root = os.path.realpath(UPLOAD_DIR)
+    for name in files:
+        path = os.path.realpath(os.path.join(UPLOAD_DIR, name))
+        if (path.startswith(root + os.sep) and os.path.isfile(path)
+                and not os.path.basename(path).startswith(".")):
+            selected[path] = cas_digest(path)
+        else:
+            missing.append(name)
+    if not digests and not files:
+        paths = stored_uploads() if request_flag(request_obj, "all") else recent_uploads()
+        selected = {p: cas_digest(p) for p in paths}
+    return selected, missing
+
+
+def selection_error(selected, missing):
+    """Resposta de erro para select_uploads(), ou None se a seleção serve."""
+    if missing:
+        return jsonify({"error": "unknown_uploads", "missing": missing}), 404
+    if not selected:
+        return jsonify({"error": "no_uploads"}), 404
+    if len(selected) > METAWEB_SELECT_MAX:
+        return jsonify({"error": "too_many_files", "max": METAWEB_SELECT_MAX}), 400
+    return None
+
 
 # -------------------
 # Workers
 # -------------------
 
+def _sherlock_native(task_id, username, emit):
+    """Roda o motor assíncrono em processo; devolve os perfis achados e quantos sites checou."""
+    found = []
+    checked = 0
+    total = len(sherlock_engine.load_sites())
+
+    def on_result(r):
+        nonlocal checked
+        checked += 1
+        if r["status"] == "found":
+            found.append({"site": r["site"], "url": r["url"]})
+            emit("output", {"line": f"[+] {r['site']}: {r['url']}", "stream": "stdout"})
+            emit("found", {"url": r["url"], "site": r["site"]})
+        else:
+            emit("not_found", {
+                "site": r["site"], "status": r["status"], "http_status": r["http_status"],
+            })
+        if checked % 25 == 0 or checked == total:
+            emit("progress", {"checked": checked, "total": total, "found": len(found)})
+
+    sherlock_engine.run_username(
+        username, on_result=on_result, should_stop=lambda: scheduler.is_cancelled(task_id)
+    )
+    if scheduler.is_cancelled(task_id):
+        raise TaskCancelled(task_id)
+    return found, checked
+
+
+def _sherlock_cli(task_id, username, emit):
+    # Tentativa de rodar de um venv ou global
+    cmd = ["/opt/render/project/src/.venv/bin/sherlock", username, "--print-found", "--timeout", "15"]
+
+    # Verifica se o executável existe
+    if not os.path.exists(cmd[0]):
+        cmd = ["sherlock", username, "--print-found", "--timeout", "15"]
+
+    # Usa a nova função de streaming
+    found = []
+    for stream, line in run_command_stream(cmd, task_id=task_id):
+        emit("output", {"line": line, "stream": stream})
+        if line.startswith("[+]"):
+            found.append({"url": line.split(" ")[-1]})
+            emit("found", {"url": found[-1]["url"]})
+    return found, None
+
+
+def sherlock_scan(task_id, username, emit=None):
+    """
+    Busca um username (motor nativo ou CLI do Sherlock) e registra a execução
+    no report_store; emit(evento, dados) recebe os eventos de cada site.
+    Devolve {"found": [{site?, url}], "checked": sites checados ou None}.
+    Cancelamento levanta TaskCancelled (o resultado parcial não é devolvido).
+    """
+    emit = emit or (lambda event, data: None)
+    if SHERLOCK_ENGINE == "native" and sherlock_engine.httpx and sherlock_engine.find_site_data():
+        found, checked = _sherlock_native(task_id, username, emit)
+    else:
+        found, checked = _sherlock_cli(task_id, username, emit)
+    report_store.get_store().add("sherlock", username, task_id=task_id, data={"found": len(found)})
+    return {"found": found, "checked": checked}
+
+
 def _sherlock_worker(task_id, username):
+    ok = False
     try:
         sse_put(task_id, "status", {"phase": "starting", "msg": f"Iniciando análise com Sherlock para {username}"})
+        result = sherlock_scan(task_id, username, emit=lambda event, data: sse_put(task_id, event, data))
+        found_count = len(result["found"])
+        sse_put(task_id, "status", {"phase": "finished", "msg": f"Análise concluída. {found_count} resultados encontrados."})
+        ok = True
+    except TaskCancelled:
+        sse_put(task_id, "status", {"phase": "cancelled", "msg": "Tarefa cancelada"})
+    except Exception as e:
+        sse_put(task_id, "status", {"phase": "error", "msg": str(e)})
+    finally:
+        end_task(task_id, ok)
+
+def _holehe_native(task_id, emails):
+    """Roda os módulos do Holehe em processo; devolve (checagens, sites usados)."""
+    total = len(emails) * len(holehe_runner.load_modules())
+    batch = len(emails) > 1
+    results = []
+    used = 0
+
+    def on_result(r):
+        nonlocal used
+        results.append(r)
+        if r["exists"]:
+            used += 1
+        line = holehe_runner.format_line(r)
+        sse_put(task_id, "output", {"line": f"{r['email']} {line}" if batch else line, "stream": "stdout"})
+        sse_put(task_id, "module", r)
+        if len(results) % 25 == 0 or len(results) == total:
+            sse_put(task_id, "progress", {"checked": len(results), "total": total, "used": used})
+
+    holehe_runner.run_emails(emails, on_result=on_result, should_stop=lambda: scheduler.is_cancelled(task_id))
+    if scheduler.is_cancelled(task_id):
+        raise TaskCancelled(task_id)
+    slowest = holehe_runner.timing_summary(results)
+    sse_put(task_id, "timing", {"slowest": slowest})
+    if slowest:
+        app.logger.info(
+            "holehe %s: %d checks, slowest %s",
+            task_id, len(results), ", ".join(f"{s['module']}={s['avg_ms']}ms" for s in slowest[:5]),
+        )
+    return len(results), used
 
-        # Tentativa de rodar de um venv ou global
-        cmd = ["/opt/render/project/src/.venv/bin/sherlock", username, "--print-found", "--timeout", "15"]
 
-        # Verifica se o executável existe
-        if not os.path.exists(cmd[0]):
-            cmd = ["sherlock", username, "--print-found", "--timeout", "15"]
+def _holehe_cli(task_id, email):
+    cmd = ["/opt/render/project/src/.venv/bin/holehe", email]
+    if not os.path.exists(cmd[0]):
+        cmd = ["holehe", email]
+    for stream, line in run_command_stream(cmd, task_id=task_id):
+        sse_put(task_id, "output", {"line": line, "stream": stream})
 
-        # Usa a nova função de streaming
-        found_count = 0
-        for line in run_command_stream(cmd):
-            sse_put(task_id, "output", {"line": line})
-            if "http" in line or "found" in line.lower():
-                found_count += 1
-            if line.startswith("[+]"):
-                sse_put(task_id, "found", {"url": line.split(" ")[-1]})
 
-        sse_put(task_id, "status", {"phase": "finished", "msg": f"Análise concluída. {found_count} resultados encontrados."})
+def _vazamento_worker(task_id, email, password=None):
+    ok = False
+    try:
+        sse_put(task_id, "status", {"phase": "starting", "msg": "Rodando Holehe (checagem de vazamentos)"})
 
+        if HOLEHE_ENGINE == "native" and holehe_runner.available():
+            checked, used = _holehe_native(task_id, [email])
+            sse_put(task_id, "status", {"phase": "finished", "msg": f"Holehe finalizado: {used} de {checked} sites"})
+        else:
+            _holehe_cli(task_id, email)
+            sse_put(task_id, "status", {"phase": "finished", "msg": "Holehe finalizado"})
+        ok = True
+    except TaskCancelled:
+        sse_put(task_id, "status", {"phase": "cancelled", "msg": "Tarefa cancelada"})
     except Exception as e:
         sse_put(task_id, "status", {"phase": "error", "msg": str(e)})
+    finally:
+        end_task(task_id, ok)
 
-def _vazamento_worker(task_id, email, password=None):
+def _vazamento_batch_worker(task_id, emails):
+    ok = False
     try:
-        sse_put(task_id, "status", {"phase": "starting", "msg": "Rodando Holehe (checagem de vazamentos)"})
-        cmd = ["/opt/render/project/src/.venv/bin/holehe", email]
-        
-        # Use a função de streaming
-        for line in run_command_stream(cmd):
-            sse_put(task_id, "output", {"line": line})
+        sse_put(task_id, "status", {"phase": "starting", "msg": f"Rodando Holehe para {len(emails)} e-mails"})
+        start = time.perf_counter()
+        checked, used = _holehe_native(task_id, emails)
+        elapsed = time.perf_counter() - start
+        sse_put(task_id, "status", {
+            "phase": "finished",
+            "msg": f"Lote concluído: {len(emails)} e-mails, {checked} checagens, {used} sites usados ({elapsed:.1f}s)",
+        })
+        ok = True
+    except TaskCancelled:
+        sse_put(task_id, "status", {"phase": "cancelled", "msg": "Tarefa cancelada"})
+    except Exception as e:
+        sse_put(task_id, "status", {"phase": "error", "msg": str(e)})
+    finally:
+        end_task(task_id, ok)
+
+def _leak_search_worker(task_id, email, use_tor=True):
+    ok = False
+    try:
+        sse_put(task_id, "status", {"phase": "starting", "msg": f"Buscando {email} em fontes abertas"})
+        total_links = 0
+
+        def on_source(r):
+            nonlocal total_links
+            total_links += len(r["links"])
+            sse_put(task_id, "source", r)
+            if r["error"]:
+                sse_put(task_id, "output", {"line": f"[x] {r['fonte']}: {r['error']}", "stream": "stdout"})
+            elif r.get("api"):
+                sse_put(task_id, "output", {"line": f"[*] {r['fonte']}: HTTP {r.get('http_status')}", "stream": "stdout"})
+            else:
+                sse_put(task_id, "output", {"line": f"[*] {r['fonte']}: {len(r['links'])} links", "stream": "stdout"})
+            for item in r["links"]:
+                sse_put(task_id, "output", {"line": f"[+] {item['link']} {item['resumo']}".rstrip(), "stream": "stdout"})
 
-        sse_put(task_id, "status", {"phase": "finished", "msg": "Holehe finalizado"})
+        results = leak_pipeline.run_search(
+            email, on_source=on_source, use_tor=use_tor, should_stop=lambda: scheduler.is_cancelled(task_id)
+        )
+        if scheduler.is_cancelled(task_id):
+            raise TaskCancelled(task_id)
+        content = {"sites": [
+            report_store.site_entry(
+                r["fonte"], f"Resultados para {email} em {r['fonte']}", r["links"], r.get("resposta") or r["error"] or "",
+            )
+            for r in results
+        ]}
+        report_id = report_store.get_store().add("leak_search", email, task_id=task_id, content=content,
+                                                 data={"fontes": len(results), "links": total_links})
+        sse_put(task_id, "result", {"relatorio": f"/relatorios/{report_id}"})
+        sse_put(task_id, "status", {
+            "phase": "finished", "msg": f"Busca concluída: {len(results)} fontes, {total_links} links",
+        })
+        ok = True
+    except TaskCancelled:
+        sse_put(task_id, "status", {"phase": "cancelled", "msg": "Tarefa cancelada"})
     except Exception as e:
         sse_put(task_id, "status", {"phase": "error", "msg": str(e)})
+    finally:
+        end_task(task_id, ok)
+
+def _metaweb_callbacks(task_id):
+    """on_result/on_progress do metaweb -> eventos 'result'/'progress' e linhas na saída."""
+    def on_result(result):
+        sse_put(task_id, "result", result)
+        for line in metaweb.format_lines(result):
+            sse_put(task_id, "output", {"line": line, "stream": "stdout"})
+
+    def on_progress(extractor, done, total):
+        data = {"extractor": extractor, "done": done, "total": total}
+        if total:
+            data["percent"] = round(done * 100 / total, 1)
+        sse_put(task_id, "progress", data)
+
+    return on_result, on_progress
 
-def _metaweb_worker(task_id, file_path=None, target=None):
+
+def _metaweb_file(task_id, path, deep=False):
+    """
+    Análise de um arquivo local no próprio processo: os extratores do
+    metaweb rodam em paralelo e cada um, ao terminar, vira um evento
+    'result' (JSON com tempo) mais as linhas de sempre na saída.
+    """
+    def out(line):
+        sse_put(task_id, "output", {"line": line, "stream": "stdout"})
+
+    on_result, on_progress = _metaweb_callbacks(task_id)
+    out(f"[INFO] Analisando arquivo: {os.path.basename(path)}")
+    out(f"[INFO] Tamanho: {os.path.getsize(path)} bytes")
+    report = metaweb.analyze(path, on_result=on_result, on_progress=on_progress, deep=deep)
+    out(f"[INFO] {len(report['results'])} extratores em {report['elapsed_ms']} ms")
+    return report
+
+
+def _metaweb_target(task_id, target, head_only=False, deep=False):
+    """
+    URL: download em streaming (com limite de tamanho e hashes calculados no
+    caminho) para um temporário, depois os mesmos extratores de um arquivo.
+    """
+    on_result, on_progress = _metaweb_callbacks(task_id)
+    mode = " (só metadados)" if head_only else ""
+    sse_put(task_id, "output", {"line": f"[INFO] Baixando {target}{mode}...", "stream": "stdout"})
+    try:
+        return metaweb.analyze_url(
+            target, on_result=on_result, on_progress=on_progress, head_only=head_only, deep=deep,
+            should_stop=lambda: scheduler.is_cancelled(task_id), dest_dir=UPLOAD_DIR,
+        )
+    except metaweb.DownloadCancelled:
+        raise TaskCancelled(task_id)
+
+
+def _metaweb_worker(task_id, file_path=None, target=None, head_only=False, deep=False):
+    ok = False
     try:
         sse_put(task_id, "status", {"phase": "starting", "msg": "Iniciando análise com MetaWeb"})
-        cmd = ["python3", "tools/metaweb/metaweb.py"]
         if file_path:
-            cmd += ["--file", file_path]
-        if target:
-            cmd += ["--target", target]
-            
-        # Corrigido: o problema de path foi resolvido ao criar o script
-        for line in run_command_stream(cmd):
-            sse_put(task_id, "output", {"line": line})
-            
+            _metaweb_file(task_id, file_path, deep)
+        else:
+            _metaweb_target(task_id, target, head_only, deep)
+        if scheduler.is_cancelled(task_id):
+            raise TaskCancelled(task_id)
+
         sse_put(task_id, "status", {"phase": "finished", "msg": "MetaWeb finalizado"})
+        ok = True
+    except TaskCancelled:
+        sse_put(task_id, "status", {"phase": "cancelled", "msg": "Tarefa cancelada"})
     except Exception as e:
         sse_put(task_id, "status", {"phase": "error", "msg": str(e)})
+    finally:
+        end_task(task_id, ok)
+
+def _yara_bulk_worker(task_id, paths, sha256s=None):
+    """
+    Varre vários arquivos com as regras YARA numa pool de processos; cada
+    arquivo vira um 'result'. sha256s (caminho -> digest) poupa o hash dos
+    uploads do armazenamento por conteúdo.
+    """
+    ok = False
+    try:
+        sse_put(task_id, "status", {"phase": "starting", "msg": f"YARA em {len(paths)} arquivos"})
+        hits = scanned = cached = 0
+
+        def on_result(r):
+            nonlocal hits, scanned, cached
+            scanned += 1
+            cached += r.get("cached", False)
+            r = {**r, "path": os.path.relpath(r["path"], UPLOAD_DIR)}
+            sse_put(task_id, "progress", {"done": scanned, "total": len(paths)})
+            if r["matches"] or r["error"]:
+                hits += bool(r["matches"])
+                sse_put(task_id, "result", r)
+                suffix = " (cache)" if r.get("cached") else ""
+                for m in r["matches"]:
+                    sse_put(task_id, "output", {"line": f"[YARA] {r['path']}: {m['namespace']}:{m['rule']}{suffix}", "stream": "stdout"})
+                if r["error"]:
+                    sse_put(task_id, "output", {"line": f"[ERRO] {r['path']}: {r['error']}", "stream": "stderr"})
+
+        yara_scan.scan_many(paths, on_result=on_result, should_stop=lambda: scheduler.is_cancelled(task_id),
+                            sha256s=sha256s)
+        if scheduler.is_cancelled(task_id):
+            raise TaskCancelled(task_id)
+        sse_put(task_id, "status", {
+            "phase": "finished", "msg": f"YARA: {hits} de {scanned} arquivos com ocorrências ({cached} do cache)",
+        })
+        ok = True
+    except TaskCancelled:
+        sse_put(task_id, "status", {"phase": "cancelled", "msg": "Tarefa cancelada"})
+    except Exception as e:
+        sse_put(task_id, "status", {"phase": "error", "msg": str(e)})
+    finally:
+        end_task(task_id, ok)
+
+def _doc_triage_worker(task_id, paths, sha256s=None):
+    """
+    Triagem de documentos em lote (pool com timeout/limite de memória, cache
+    por hash); sha256s (caminho -> digest) como em _yara_bulk_worker.
+    """
+    ok = False
+    try:
+        sse_put(task_id, "status", {"phase": "starting", "msg": f"Triagem de documentos em {len(paths)} arquivos"})
+        risky = triaged = 0
+
+        def on_result(r):
+            nonlocal risky, triaged
+            triaged += 1
+            r = {**r, "path": os.path.relpath(r["path"], UPLOAD_DIR)}
+            sse_put(task_id, "result", r)
+            if r.get("error"):
+                line = f"[ERRO] {r['path']}: {r['error']}"
+            else:
+                risky += r["risk"] != "low"
+                line = f"[DOC] {r['path']}: {r['kind']}, risco {r['risk']}" + (" (cache)" if r["cached"] else "")
+            sse_put(task_id, "output", {"line": line, "stream": "stdout"})
+
+        doc_triage.triage_many(paths, on_result=on_result, should_stop=lambda: scheduler.is_cancelled(task_id),
+                               sha256s=sha256s)
+        if scheduler.is_cancelled(task_id):
+            raise TaskCancelled(task_id)
+        sse_put(task_id, "status", {
+            "phase": "finished", "msg": f"Triagem: {triaged} documentos, {risky} com risco médio ou alto",
+        })
+        ok = True
+    except TaskCancelled:
+        sse_put(task_id, "status", {"phase": "cancelled", "msg": "Tarefa cancelada"})
+    except Exception as e:
+        sse_put(task_id, "status", {"phase": "error", "msg": str(e)})
+    finally:
+        end_task(task_id, ok)
+
+URL_RE = re.compile(r"https?://[^\s\"'<>]+")
+
+
+def json_urls(value):
+    """URLs em qualquer string de uma estrutura JSON, na ordem em que aparecem."""
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, list):
+        for item in value:
+            yield from json_urls(item)
+    elif isinstance(value, str):
+        for m in URL_RE.finditer(value):
+            yield m.group(0)
+
+
+def phoneinfoga_scan(task_id, number, on_line=None):
+    """
+    Roda `phoneinfoga scan -o <json> -f json` para um número em E.164 e
+    devolve {"numero", "phoneinfoga" (o JSON do scanner), "links", "data"}.
+    O JSON fica em static/relatorios e a execução no report_store. Saída
+    != 0 levanta CommandFailed antes de qualquer coisa ser gravada.
+    """
+    cmd, how = detect_phoneinfoga()
+    if not cmd:
+        raise FileNotFoundError("PhoneInfoga executable not found.")
+    digits = number.lstrip("+")
+    os.makedirs(RELATORIOS_DIR, exist_ok=True)
+    tmp_path = os.path.join(RELATORIOS_DIR, f".tmp_phoneinfoga_{digits}_{uuid.uuid4().hex[:8]}.json")
+    cmd += ["scan", "-n", number, "-o", tmp_path, "-f", "json"]
+    try:
+        for stream, line in run_command_stream(cmd, task_id=task_id):
+            if on_line:
+                on_line(stream, line)
+        with open(tmp_path, "r", encoding="utf-8") as f:
+            dados = json.load(f)
+    finally:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+    links = list(dict.fromkeys(json_urls(dados)))
+    json_path = os.path.join(RELATORIOS_DIR, f"phoneinfoga_{digits}.json")
+    report_store.write_json_atomic(json_path, dados)
+    report_store.get_store().add("phoneinfoga", number, path=json_path, task_id=task_id, data={"links": len(links)})
+    return {"numero": number, "phoneinfoga": dados, "links": links, "data": report_store.utc_now()}
+
 
 def _phoneinfoga_worker(task_id, number):
+    """number já vem em E.164; no fim publica o relatório como evento 'result' (é o que o cache guarda)."""
+    ok = False
     try:
-        sse_put(task_id, "status", {"phase": "starting", "msg": "Rodando PhoneInfoga"})
-        
-        # Detecta o executável de forma mais robusta
-        cmd, how = detect_phoneinfoga()
-        if not cmd:
-            raise FileNotFoundError("PhoneInfoga executable not found.")
-        cmd.append("scan")
-        cmd.append("-n")
-        cmd.append(number)
-        
-        for line in run_command_stream(cmd):
-            sse_put(task_id, "output", {"line": line})
-        
+        sse_put(task_id, "status", {"phase": "starting", "msg": f"Rodando PhoneInfoga para {number}"})
+        report = phoneinfoga_scan(
+            task_id, number, on_line=lambda stream, line: sse_put(task_id, "output", {"line": line, "stream": stream})
+        )
+        sse_put(task_id, "result", report)
         sse_put(task_id, "status", {"phase": "finished", "msg": "PhoneInfoga finalizado"})
+        ok = True
+    except TaskCancelled:
+        sse_put(task_id, "status", {"phase": "cancelled", "msg": "Tarefa cancelada"})
+    except Exception as e:
+        sse_put(task_id, "status", {"phase": "error", "msg": str(e)})
+    finally:
+        end_task(task_id, ok)
+
+# -------------------
+# Bulk: listas de alvos
+# -------------------
+#
+# Um lote (bulk job) roda uma ferramenta sobre uma lista de alvos com
+# paralelismo limitado. Cada alvo concluído é gravado em bulk_items (com um
+# número de sequência por ordem de conclusão), então /bulk/<id>/results
+# streama NDJSON enquanto o lote roda e /bulk/<id>/resume retoma um lote
+# interrompido a partir dos alvos que ainda estão pendentes.
+
+BULK_DB_PATH = os.environ.get("BULK_DB_PATH", TASK_BUS_DB_PATH)
+BULK_MAX_TARGETS = int(os.environ.get("BULK_MAX_TARGETS", "5000"))
+# alvos em paralelo dentro de um lote, ex.: BULK_CONCURRENCY="sherlock=2,holehe=8"
+BULK_CONCURRENCY = env_tool_map("BULK_CONCURRENCY", {"sherlock": 2, "holehe": 4, "phoneinfoga": 4})
+
+# cabeçalhos de CSV reconhecidos como a coluna de alvos
+BULK_TARGET_COLUMNS = ("target", "alvo", "username", "usuario", "email", "e-mail", "numero", "phone", "telefone")
+
+
+class BulkStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS bulk_jobs (
+                job_id TEXT PRIMARY KEY,
+                tool TEXT NOT NULL,
+                state TEXT NOT NULL,
+                task_id TEXT,
+                total INTEGER NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                created_at REAL,
+                run_started_at REAL,
+                run_done_base INTEGER NOT NULL DEFAULT 0,
+                finished_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS bulk_items (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                target TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                seq INTEGER,
+                result TEXT,
+                elapsed_ms REAL,
+                finished_at REAL,
+                PRIMARY KEY (job_id, idx)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_bulk_items_seq ON bulk_items (job_id, seq);
+            """
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite_connect(self.path)
+        return conn
+
+    def create(self, job_id, tool, targets):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO bulk_jobs (job_id, tool, state, total, created_at) VALUES (?, ?, 'created', ?, ?)",
+                (job_id, tool, len(targets), time.time()),
+            )
+            conn.executemany(
+                "INSERT INTO bulk_items (job_id, idx, target) VALUES (?, ?, ?)",
+                ((job_id, i, t) for i, t in enumerate(targets)),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, job_id):
+        row = self._conn().execute(
+            "SELECT job_id, tool, state, task_id, total, done, failed, created_at, run_started_at, "
+            "run_done_base, finished_at FROM bulk_jobs WHERE job_id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        keys = ("job_id", "tool", "state", "task_id", "total", "done", "failed", "created_at",
+                "run_started_at", "run_done_base", "finished_at")
+        job = dict(zip(keys, row))
+        # vazão da execução atual (ou da última), em alvos por segundo
+        if job["run_started_at"]:
+            end = job["finished_at"] if job["state"] != "running" and job["finished_at"] else time.time()
+            elapsed = max(end - job["run_started_at"], 1e-6)
+            job["elapsed_secs"] = round(elapsed, 1)
+            job["targets_per_sec"] = round((job["done"] - job["run_done_base"]) / elapsed, 2)
+        return job
+
+    def pending(self, job_id):
+        return self._conn().execute(
+            "SELECT idx, target FROM bulk_items WHERE job_id = ? AND state = 'pending' ORDER BY idx", (job_id,)
+        ).fetchall()
+
+    def start_run(self, job_id, task_id):
+        self._conn().execute(
+            "UPDATE bulk_jobs SET state = 'running', task_id = ?, run_started_at = ?, run_done_base = done, "
+            "finished_at = NULL WHERE job_id = ?",
+            (task_id, time.time(), job_id),
+        )
+
+    def finish_item(self, job_id, idx, ok, result, elapsed_ms):
+        """Grava o resultado de um alvo; devolve o número de sequência dele."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            seq = conn.execute(
+                "UPDATE bulk_jobs SET done = done + 1, failed = failed + ? WHERE job_id = ? RETURNING done",
+                (0 if ok else 1, job_id),
+            ).fetchone()[0]
+            conn.execute(
+                "UPDATE bulk_items SET state = ?, seq = ?, result = ?, elapsed_ms = ?, finished_at = ? "
+                "WHERE job_id = ? AND idx = ?",
+                ("done" if ok else "error", seq, json.dumps(result, ensure_ascii=False), elapsed_ms, now,
+                 job_id, idx),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return seq
+
+    def set_state(self, job_id, state):
+        self._conn().execute(
+            "UPDATE bulk_jobs SET state = ?, finished_at = ? WHERE job_id = ?", (state, time.time(), job_id)
+        )
+
+    def results(self, job_id, after_seq=0, limit=500):
+        rows = self._conn().execute(
+            "SELECT seq, idx, target, state, result, elapsed_ms FROM bulk_items "
+            "WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (job_id, after_seq, limit),
+        ).fetchall()
+        return [
+            {"seq": seq, "idx": idx, "target": target, "ok": state == "done", "elapsed_ms": elapsed_ms,
+             "result": json.loads(result) if result else None}
+            for seq, idx, target, state, result, elapsed_ms in rows
+        ]
+
+
+bulk_store = BulkStore(BULK_DB_PATH)
+
+
+def bulk_live(job):
+    """O lote tem uma execução viva? (state "running" sozinho pode ser de um worker que caiu)"""
+    info = task_bus.get_state(job["task_id"]) if job["task_id"] else None
+    return info is not None and info["state"] in _LIVE_STATES
+
+
+def parse_bulk_targets(text):
+    """Lê uma lista (um alvo por linha) ou CSV; devolve os alvos sem repetição."""
+    rows = [r for r in csv.reader(io.StringIO(text)) if r and any(c.strip() for c in r)]
+    col = 0
+    if rows:
+        header = [c.strip().lower() for c in rows[0]]
+        named = next((i for i, c in enumerate(header) if c in BULK_TARGET_COLUMNS), None)
+        if named is not None:
+            col = named
+            rows = rows[1:]
+    targets, seen = [], set()
+    for row in rows:
+        value = row[col].strip() if col < len(row) else ""
+        if value and not value.startswith("#") and value not in seen:
+            seen.add(value)
+            targets.append(value)
+    return targets
+
+
+def _bulk_sherlock(task_id, username):
+    return sherlock_scan(task_id, username)
+
+
+def _bulk_holehe(task_id, email):
+    if not holehe_runner.available():
+        raise RuntimeError("holehe indisponível")
+    results = holehe_runner.run_emails([email], should_stop=lambda: scheduler.is_cancelled(task_id))
+    if scheduler.is_cancelled(task_id):
+        raise TaskCancelled(task_id)  # resultado parcial: o alvo fica pendente
+    return {
+        "used": [r["domain"] for r in results if r["exists"]],
+        "rate_limited": [r["domain"] for r in results if r["rateLimit"]],
+        "checked": len(results),
+    }
+
+
+def _bulk_phoneinfoga(task_id, number):
+    # mesmo cache por E.164 do /phoneinfoga: um número já consultado não roda de novo
+    report = cached_phoneinfoga(number)
+    if report is not None:
+        return {"links": report["links"], "cached": True}
+    report = phoneinfoga_scan(task_id, number)
+    result_cache.store("phoneinfoga", phoneinfoga_cache_params(number), task_id, [("result", report)])
+    return {"links": report["links"], "cached": False}
+
+
+# ferramenta -> (normalização do alvo, execução de um alvo, ferramenta do scheduler)
+BULK_TOOLS = {
+    "sherlock": (lambda t: t.lstrip("@").lower(), _bulk_sherlock, "sherlock"),
+    "holehe": (lambda t: t.lower(), _bulk_holehe, "vazamento"),
+    "phoneinfoga": (normalize_phone, _bulk_phoneinfoga, "phoneinfoga"),
+}
+
+
+def _bulk_line(tool, target, ok, result):
+    if not ok:
+        return f"[x] {target}: {result.get('error')}"
+    if tool == "sherlock":
+        return f"[{'+' if result['found'] else '-'}] {target}: {len(result['found'])} perfis"
+    if tool == "holehe":
+        return f"[{'+' if result['used'] else '-'}] {target}: {', '.join(result['used']) or 'nenhum site'}"
+    return f"[*] {target}: {len(result['links'])} links{' (cache)' if result.get('cached') else ''}"
+
+
+def _bulk_worker(task_id, job_id):
+    ok = False
+    try:
+        job = bulk_store.get(job_id)
+        tool = job["tool"]
+        _, run_one, slot_tool = BULK_TOOLS[tool]
+        items = bulk_store.pending(job_id)
+        bulk_store.start_run(job_id, task_id)
+        workers = max(1, BULK_CONCURRENCY.get(tool, 2))
+        sse_put(task_id, "status", {
+            "phase": "starting",
+            "msg": f"Lote {tool}: {len(items)} de {job['total']} alvos pendentes ({workers} em paralelo)",
+        })
+
+        def run_item(idx, target):
+            start = time.perf_counter()
+            try:
+                # cada alvo ocupa uma vaga da ferramenta, somada às execuções avulsas
+                with scheduler.hold_slot(f"{task_id}:{idx}", slot_tool, task_id):
+                    result, item_ok = run_one(task_id, target), True
+            except TaskCancelled:
+                raise
+            except Exception as e:
+                result, item_ok = {"error": str(e)}, False
+            return idx, target, item_ok, result, round((time.perf_counter() - start) * 1000, 1)
+
+        start = time.perf_counter()
+        done = job["done"]
+        pending = iter(items)
+        inflight = set()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk") as pool:
+            while True:
+                # janela limitada: a lista inteira nunca vira futures de uma vez
+                while len(inflight) < workers * 2 and not scheduler.is_cancelled(task_id):
+                    item = next(pending, None)
+                    if item is None:
+                        break
+                    inflight.add(pool.submit(run_item, *item))
+                if not inflight:
+                    break
+                finished, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    try:
+                        idx, target, item_ok, result, elapsed_ms = fut.result()
+                    except TaskCancelled:
+                        continue  # o alvo continua pendente para o resume
+                    seq = bulk_store.finish_item(job_id, idx, item_ok, result, elapsed_ms)
+                    done += 1
+                    sse_put(task_id, "item", {
+                        "seq": seq, "idx": idx, "target": target, "ok": item_ok,
+                        "elapsed_ms": elapsed_ms, "result": result,
+                    })
+                    sse_put(task_id, "output", {"line": _bulk_line(tool, target, item_ok, result), "stream": "stdout"})
+                    rate = (done - job["done"]) / max(time.perf_counter() - start, 1e-6)
+                    sse_put(task_id, "progress", {"done": done, "total": job["total"], "targets_per_sec": round(rate, 2)})
+
+        if scheduler.is_cancelled(task_id):
+            bulk_store.set_state(job_id, "paused")
+            raise TaskCancelled(task_id)
+        bulk_store.set_state(job_id, "finished")
+        elapsed = time.perf_counter() - start
+        processed = done - job["done"]
+        sse_put(task_id, "status", {
+            "phase": "finished",
+            "msg": f"Lote concluído: {processed} alvos em {elapsed:.1f}s ({processed / max(elapsed, 1e-6):.2f} alvos/s)",
+        })
+        ok = True
+    except TaskCancelled:
+        sse_put(task_id, "status", {
+            "phase": "cancelled", "msg": f"Lote interrompido; use /bulk/{job_id}/resume para continuar",
+        })
     except Exception as e:
+        bulk_store.set_state(job_id, "failed")
         sse_put(task_id, "status", {"phase": "error", "msg": str(e)})
+    finally:
+        end_task(task_id, ok)
 
 # -------------------
 # Views / pages & SSE endpoint
@@ -473,8 +2665,13 @@ def sse(tool, task_id):
         "Cache-Control": "no-cache",
         "X-Accel-Buffering": "no",
     }
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id") or 0
+    try:
+        last_event_id = max(0, int(last_event_id))
+    except ValueError:
+        last_event_id = 0
     return Response(
-        stream_with_context(sse_stream(task_id)),
+        stream_with_context(sse_stream(task_id, last_event_id=last_event_id)),
         mimetype="text/event-stream",
         headers=headers,
     )
@@ -509,20 +2706,12 @@ def sherlock_start():
     if not username:
         return jsonify({"error": "username_required"}), 400
 
-    task_id = start_task()
-
-    save_history(
-        tool="sherlock",
-        params={"username": username},
-        result={"note": "start"},
-        status="started",
-        task_id=task_id,
+    return launch_tool(
+        "sherlock", _sherlock_worker, args=(username,),
+        history_params={"username": username},
+        cache_params={"username": username.lstrip("@").lower()},
     )
 
-    th = threading.Thread(target=_sherlock_worker, args=(task_id, username), daemon=True)
-    th.start()
-    return jsonify({"task_id": task_id})
-
 
 @app.route("/vazamento/start", methods=["POST"])
 def vazamento_start():
@@ -531,8 +2720,6 @@ def vazamento_start():
     if not email and not password:
         return jsonify({"error": "email_or_password_required"}), 400
 
-    task_id = start_task()
-
     tool_name = (
         "vazamento_password"
         if password and not email
@@ -546,19 +2733,48 @@ def vazamento_start():
         sha1 = hashlib.sha1(password.encode("utf-8")).hexdigest().upper()
         snapshot_params["password_prefix"] = sha1[:5]
 
-    save_history(
-        tool=tool_name,
-        params=snapshot_params,
-        result={"note": "start"},
-        status="started",
-        task_id=task_id,
+    return launch_tool(
+        "vazamento", _vazamento_worker, args=(email, password),
+        history_tool=tool_name, history_params=snapshot_params,
+        # só a checagem de e-mail é cacheada; senha nunca entra na chave
+        cache_params=({"email": email.strip().lower()} if email and not password else None),
     )
 
-    th = threading.Thread(
-        target=_vazamento_worker, args=(task_id, email, password), daemon=True
+
+@app.route("/vazamento/batch/start", methods=["POST"])
+def vazamento_batch_start():
+    raw = get_param_any(request, "emails") or ""
+    if isinstance(raw, str):
+        raw = re.split(r"[\s,;]+", raw)
+    emails = []
+    for e in raw:
+        e = str(e).strip().lower()
+        if e and e not in emails:
+            emails.append(e)
+    if not emails:
+        return jsonify({"error": "emails_required"}), 400
+    if len(emails) > HOLEHE_BATCH_MAX:
+        return jsonify({"error": "too_many_emails", "max": HOLEHE_BATCH_MAX}), 400
+    if not holehe_runner.available():
+        return jsonify({"error": "holehe_unavailable"}), 503
+    return launch_tool(
+        "vazamento_batch", _vazamento_batch_worker, args=(emails,),
+        history_params={"emails": emails},
+        cache_params={"emails": sorted(emails)},
+    )
+
+
+@app.route("/vazamento/busca/start", methods=["POST"])
+def vazamento_busca_start():
+    email = (get_param_any(request, "email") or "").strip()
+    if not email:
+        return jsonify({"error": "email_required"}), 400
+    use_tor = str(get_param_any(request, "tor") or "1").lower() not in ("0", "false", "no", "off")
+    return launch_tool(
+        "leak_search", _leak_search_worker, args=(email, use_tor),
+        history_params={"email": email, "tor": use_tor},
+        cache_params={"email": email.lower(), "tor": use_tor},
     )
-    th.start()
-    return jsonify({"task_id": task_id})
 
 
 @app.route("/metaweb/start", methods=["POST"])
@@ -568,52 +2784,363 @@ def metaweb_start():
     if not file and not target:
         return jsonify({"error": "file_or_target_required"}), 400
 
-    file_path = None
+    # deep=1: além da camada nativa, exiftool e mediainfo (processos externos)
+    deep = request_flag(request, "deep")
     if file:
-        filename = secure_filename(file.filename)
-        unique = f"{int(time.time())}_{uuid.uuid4().hex}_{filename}"
-        file_path = os.path.join(UPLOAD_DIR, unique)
-        file.save(file_path)
-        app.logger.info("metaweb saved upload %s", file_path)
-
-    task_id = start_task()
-
-    if file_path:
-        save_history(
-            tool="metaweb_file",
-            params={"file": os.path.basename(file_path)},
-            result={"note": "start"},
-            status="started",
-            task_id=task_id,
-        )
-    else:
-        save_history(
-            tool="metaweb_target",
-            params={"target": target},
-            result={"note": "start"},
-            status="started",
-            task_id=task_id,
+        file_path, digest, size, existed = save_upload(file)
+        app.logger.info("metaweb upload %s (%d bytes, %s)", digest, size, "known" if existed else "new")
+        return launch_tool(
+            "metaweb", _metaweb_worker, kwargs={"file_path": file_path, "deep": deep},
+            history_tool="metaweb_file",
+            history_params={"file": secure_filename(file.filename or ""), "sha256": digest, "size": size, "deep": deep},
+            # mesmo conteúdo, mesmo resultado: o cache é por digest e não pelo nome
+            cache_params={"sha256": digest, "deep": deep}, cache_ttl=METAWEB_DIGEST_TTL_SECS,
         )
+    target = target.strip()
+    head_only = request_flag(request, "head_only")
+    return launch_tool(
+        "metaweb", _metaweb_worker, kwargs={"target": target, "head_only": head_only, "deep": deep},
+        history_tool="metaweb_target", history_params={"target": target, "head_only": head_only, "deep": deep},
+        cache_params={"target": target, "head_only": head_only, "deep": deep},
+    )
+
+
+@app.route("/metaweb/yara/start", methods=["POST"])
+def metaweb_yara_start():
+    """Varredura YARA dos uploads escolhidos (ver select_uploads; padrão: os recentes)."""
+    if not yara_scan.available():
+        return jsonify({"error": "yara_unavailable"}), 503
+    selected, missing = select_uploads(request)
+    error = selection_error(selected, missing)
+    if error:
+        return error
+    paths = list(selected)
+    sha256s = {p: d for p, d in selected.items() if d}
+    return launch_tool(
+        "metaweb", _yara_bulk_worker, args=(paths, sha256s),
+        history_tool="metaweb_yara", history_params={"files": len(paths)},
+        extra={"files": len(paths)},
+    )
+
+
+@app.route("/metaweb/docs/start", methods=["POST"])
+def metaweb_docs_start():
+    """Triagem dos documentos (Office, RTF, PDF, HTML) entre os uploads escolhidos (ver select_uploads)."""
+    selected, missing = select_uploads(request)
+    error = selection_error(selected, missing)
+    if error:
+        return error
+    paths = list(selected)
+    sha256s = {p: d for p, d in selected.items() if d}
+    return launch_tool(
+        "metaweb", _doc_triage_worker, args=(paths, sha256s),
+        history_tool="metaweb_docs", history_params={"files": len(paths)},
+        extra={"files": len(paths)},
+    )
+
+
+# entra na chave do cache: entradas antigas (sem o evento "result", falhas
+# guardadas como prontas, ou o formato anterior do relatório) deixam de ser encontradas
+PHONEINFOGA_CACHE_VERSION = 3
+
+
+def phoneinfoga_cache_params(numero):
+    return {"numero": numero, "v": PHONEINFOGA_CACHE_VERSION}
+
+
+def cached_phoneinfoga(numero):
+    """Relatório do PhoneInfoga (formato de phoneinfoga_scan) ainda no cache (TTL), ou None."""
+    cached = result_cache.peek("phoneinfoga", phoneinfoga_cache_params(numero))
+    if cached is None:
+        return None
+    for event, data in reversed(cached["events"]):
+        if event == "result" and isinstance(data, dict) and "phoneinfoga" in data:
+            return data
+    return None
+
 
-    th = threading.Thread(
-        target=_metaweb_worker,
-        kwargs={"task_id": task_id, "file_path": file_path, "target": (target or None)},
-        daemon=True,
+def launch_phoneinfoga(numero):
+    return launch_tool(
+        "phoneinfoga", _phoneinfoga_worker, args=(numero,),
+        history_params={"numero": numero},
+        cache_params=phoneinfoga_cache_params(numero),
     )
-    th.start()
-    return jsonify({"task_id": task_id})
+
+
+@app.route("/phoneinfoga", methods=["GET", "POST"])
+def phoneinfoga():
+    """
+    Formulário: com o relatório em cache ele sai na hora; senão a busca
+    vai para a fila (mesmo caminho de /phoneinfoga/start) e a página
+    acompanha pelo SSE até abrir o relatório.
+    """
+    if request.method == "POST":
+        numero = normalize_phone(request.form.get("numero"))
+        if not numero:
+            return render_template("phoneinfoga.html", erro="Digite um número de telefone válido (ex.: +5511999999999).")
+        report = None if request_refresh(request) else cached_phoneinfoga(numero)
+        if report is not None:
+            return render_template("relatorio_phoneinfoga.html", numero=numero, dados=report["phoneinfoga"],
+                                   links=report["links"])
+        started = launch_phoneinfoga(numero).get_json()
+        return render_template("phoneinfoga.html", numero=numero, task_id=started["task_id"])
+    return render_template("phoneinfoga.html")
+
+
+@app.route("/phoneinfoga/relatorio/<path:numero>")
+def phoneinfoga_relatorio(numero):
+    numero = normalize_phone(numero)
+    report = cached_phoneinfoga(numero) if numero else None
+    if report is None:
+        return render_template("phoneinfoga.html", erro="Nenhum resultado recente para este número; faça a busca."), 404
+    return render_template("relatorio_phoneinfoga.html", numero=numero, dados=report["phoneinfoga"],
+                           links=report["links"])
 
 
 @app.route("/phoneinfoga/start", methods=["POST"])
 def phoneinfoga_start():
-    numero = get_param_any(request, "numero")
+    numero = normalize_phone(get_param_any(request, "numero"))
     if not numero:
         return jsonify({"error": "numero_required"}), 400
-    task_id = start_task()
-    save_history(tool="phoneinfoga", params={"numero": numero}, status="started", task_id=task_id)
-    th = threading.Thread(target=_phoneinfoga_worker, args=(task_id, numero), daemon=True)
-    th.start()
-    return jsonify({"task_id": task_id})
+    return launch_phoneinfoga(numero)
+
+
+# -------------------
+# Relatórios: execuções do report_store, renderizadas sob demanda
+# -------------------
+#
+# Cada execução guarda todas as fontes/sites num blob só (report_content);
+# a página de um site é renderizada na hora e fica num LRU. Uma execução não
+# muda depois de gravada, então o ETag depende só de (id, site, template) e
+# um If-None-Match válido é respondido com 304 sem tocar no banco.
+
+REPORT_TEMPLATE = "relatorio_execucao.html"
+REPORT_RENDER_CACHE_SIZE = int(os.environ.get("REPORT_RENDER_CACHE_SIZE", "256"))
+
+
+class RenderCache:
+    """LRU de páginas já renderizadas."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+
+report_render_cache = RenderCache(REPORT_RENDER_CACHE_SIZE)
+
+
+# template -> (mtime, templates que ele referencia), relido só quando o arquivo muda
+_template_refs = {}
+
+
+def template_signature(name):
+    """Hash das mtimes do template e de tudo que ele usa (extends/include/import)."""
+    parts, seen, stack = [], set(), [name]
+    while stack:
+        current = stack.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        path = os.path.join(BASE_DIR, "templates", current)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+        cached = _template_refs.get(current)
+        if cached is None or cached[0] != mtime:
+            with open(path, encoding="utf-8") as f:
+                refs = [r for r in jinja_meta.find_referenced_templates(app.jinja_env.parse(f.read())) if r]
+            cached = _template_refs[current] = (mtime, refs)
+        parts.append(f"{current}\0{mtime}")
+        stack.extend(cached[1])
+    return hashlib.sha1("\n".join(sorted(parts)).encode()).hexdigest()
+
+
+def report_etag(report_id, site, signature=None):
+    signature = signature or template_signature(REPORT_TEMPLATE)
+    return hashlib.sha1(f"{report_id}\0{site or ''}\0{signature}".encode()).hexdigest()
+
+
+def render_report(report_id, site=None, signature=None):
+    """HTML da execução (lista de fontes) ou de um site dela; None se não existe."""
+    # a assinatura dos templates entra na chave: editar base.html invalida as páginas
+    key = (report_id, site, signature or template_signature(REPORT_TEMPLATE))
+    html = report_render_cache.get(key)
+    if html is not None:
+        return html
+    store = report_store.get_store()
+    report = store.get(report_id)
+    content = store.content(report_id) if report else None
+    if content is None:
+        return None
+    entry = None
+    if site is not None:
+        entry = next((e for e in content["sites"] if e["site"] == site), None)
+        if entry is None:
+            return None
+    html = render_template(REPORT_TEMPLATE, report=report, sites=content["sites"], entry=entry)
+    report_render_cache.put(key, html)
+    return html
+
+
+@app.route("/relatorios/<int:report_id>")
+@app.route("/relatorios/<int:report_id>/<path:site>")
+def relatorio_execucao(report_id, site=None):
+    signature = template_signature(REPORT_TEMPLATE)
+    etag = report_etag(report_id, site, signature)
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        html = render_report(report_id, site, signature)
+        if html is None:
+            return abort(404)
+        resp = make_response(html)
+    resp.set_etag(etag)
+    # revalida sempre: o ETag muda se algum dos templates mudar
+    resp.cache_control.no_cache = True
+    return resp
+
+
+# -------------------
+# Tasks: status, fila e cancelamento
+# -------------------
+
+@app.route("/tasks")
+def tasks_stats():
+    stats = scheduler.stats()
+    stats["states"] = task_bus.state_counts()
+    return jsonify(stats)
+
+
+@app.route("/tasks/<task_id>")
+def task_status(task_id):
+    info = task_bus.get_state(task_id)
+    if info is None:
+        return jsonify({"error": "task_not_found"}), 404
+    info["position"] = scheduler.position(task_id)
+    return jsonify(info)
+
+
+@app.route("/tasks/<task_id>/cancel", methods=["POST"])
+def task_cancel(task_id):
+    info = task_bus.get_state(task_id)
+    if info is None:
+        return jsonify({"error": "task_not_found"}), 404
+    if info["state"] in ("finished", "failed", "cancelled"):
+        return jsonify({"task_id": task_id, "state": info["state"], "cancelled": False}), 409
+    # marca no bus (vale para o worker que estiver rodando a tarefa) e tenta localmente
+    task_bus.request_cancel(task_id)
+    local = scheduler.cancel(task_id)
+    return jsonify({"task_id": task_id, "cancelled": True, "local": local}), 202
+
+
+# -------------------
+# Bulk: endpoints
+# -------------------
+
+@app.route("/bulk/start", methods=["POST"])
+def bulk_start():
+    tool = (get_param_any(request, "tool") or "").strip().lower()
+    if tool not in BULK_TOOLS:
+        return jsonify({"error": "invalid_tool", "tools": sorted(BULK_TOOLS)}), 400
+    file = request.files.get("file")
+    if file:
+        text = file.stream.read().decode("utf-8-sig", errors="replace")
+    else:
+        raw = get_param_any(request, "targets") or ""
+        text = "\n".join(str(t) for t in raw) if isinstance(raw, list) else str(raw)
+    normalize = BULK_TOOLS[tool][0]
+    targets = []
+    for t in parse_bulk_targets(text):
+        t = normalize(t)
+        if t and t not in targets:
+            targets.append(t)
+    if not targets:
+        return jsonify({"error": "targets_required"}), 400
+    if len(targets) > BULK_MAX_TARGETS:
+        return jsonify({"error": "too_many_targets", "max": BULK_MAX_TARGETS}), 400
+
+    job_id = str(uuid.uuid4())
+    bulk_store.create(job_id, tool, targets)
+    app.logger.info("bulk job %s: %s x %d targets", job_id, tool, len(targets))
+    return launch_tool(
+        "bulk", _bulk_worker, args=(job_id,), history_tool=f"bulk_{tool}",
+        history_params={"job_id": job_id, "targets": len(targets)},
+        extra={"job_id": job_id, "total": len(targets)},
+    )
+
+
+@app.route("/bulk/<job_id>")
+def bulk_status(job_id):
+    job = bulk_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "job_not_found"}), 404
+    return jsonify(job)
+
+
+@app.route("/bulk/<job_id>/resume", methods=["POST"])
+def bulk_resume(job_id):
+    job = bulk_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "job_not_found"}), 404
+    if job["state"] == "finished":
+        return jsonify({"error": "job_finished", "job_id": job_id}), 409
+    if bulk_live(job):
+        return jsonify({"error": "job_running", "job_id": job_id, "task_id": job["task_id"]}), 409
+    return launch_tool(
+        "bulk", _bulk_worker, args=(job_id,), history_tool=f"bulk_{job['tool']}",
+        history_params={"job_id": job_id, "resume": True},
+        extra={"job_id": job_id, "total": job["total"], "done": job["done"]},
+    )
+
+
+@app.route("/bulk/<job_id>/results")
+def bulk_results(job_id):
+    """Resultados em NDJSON, na ordem de conclusão; follow=1 acompanha o lote até o fim."""
+    job = bulk_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "job_not_found"}), 404
+    try:
+        after = max(0, int(request.args.get("after", 0)))
+    except ValueError:
+        after = 0
+    follow = str(request.args.get("follow", "")).lower() in ("1", "true", "yes", "on")
+
+    def generate(after):
+        while True:
+            rows = bulk_store.results(job_id, after_seq=after)
+            for row in rows:
+                after = row["seq"]
+                yield json.dumps(row, ensure_ascii=False) + "\n"
+            if rows:
+                continue
+            if not follow or not bulk_live(bulk_store.get(job_id)):
+                # uma última leitura cobre itens gravados logo antes do fim
+                for row in bulk_store.results(job_id, after_seq=after, limit=-1):
+                    yield json.dumps(row, ensure_ascii=False) + "\n"
+                return
+            time.sleep(TASK_BUS_POLL_SECS)
+
+    return Response(
+        stream_with_context(generate(after)),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # -------------------
@@ -642,64 +3169,210 @@ def check_admin_token():
     return True
 
 
+def history_page_args():
+    """(filtros, cursor, limit) da query string; ValueError em parâmetro inválido."""
+    filters = history_filters(request.args)
+    cursor = int(request.args.get("cursor") or 0) or None
+    limit = int(request.args.get("limit") or HISTORY_PAGE_DEFAULT)
+    return filters, cursor, max(1, min(limit, HISTORY_PAGE_MAX))
+
+
 @app.route("/admin/history")
 def admin_history_page():
     if not check_admin_token():
         return abort(401)
-    rows = fetch_history(limit=500)
-    html = [
-        "<html><head><meta charset='utf-8'><title>Histórico</title>"
-        "<style>body{background:#0b0f14;color:#cde; font-family:Inter,Segoe UI,Helvetica,Arial;} "
-        "table{width:100%;border-collapse:collapse} "
-        "th,td{padding:8px;border-bottom:1px solid #223} "
-        "th{background:#071018;text-align:left}</style></head><body>"
-    ]
-    html.append("<h2>Histórico de consultas</h2>")
-    html.append("<p>Use o token seguro no header X-Admin-Token ou ?token=SEUTOKEN</p>")
-    html.append(
-        "<table><tr><th>ID</th><th>Tool</th><th>Params</th><th>Result</th>"
-        "<th>Status</th><th>Created</th><th>Download</th></tr>"
-    )
-    for r in rows:
-        html.append("<tr>")
-        html.append(f"<td>{r['id']}</td>")
-        html.append(f"<td>{r['tool']}</td>")
-        html.append(f"<td><pre style='margin:0'>{json.dumps(r['params'], ensure_ascii=False)}</pre></td>")
-        html.append(f"<td><pre style='margin:0'>{json.dumps(r['result'], ensure_ascii=False)}</pre></td>")
-        html.append(f"<td>{r['status']}</td>")
-        html.append(f"<td>{r['created_at']}</td>")
-        html.append(
-            f"<td><a href='/admin/history/{r['id']}/download?token={request.args.get('token') or ''}'>download</a></td>"
+    try:
+        filters, cursor, limit = history_page_args()
+    except ValueError:
+        return abort(400)
+    next_cursor = history_next_cursor(filters, cursor, limit)
+    token = request.args.get("token") or ""
+
+    def generate():
+        yield (
+            "<html><head><meta charset='utf-8'><title>Histórico</title>"
+            "<style>body{background:#0b0f14;color:#cde; font-family:Inter,Segoe UI,Helvetica,Arial;} "
+            "table{width:100%;border-collapse:collapse} "
+            "th,td{padding:8px;border-bottom:1px solid #223} "
+            "th{background:#071018;text-align:left}</style></head><body>\n"
+            "<h2>Histórico de consultas</h2>\n"
+            "<p>Use o token seguro no header X-Admin-Token ou ?token=SEUTOKEN</p>\n"
         )
-        html.append("</tr>")
-    html.append("</table></body></html>")
-    return Response("\n".join(html), mimetype="text/html")
+        form = [f"<form method='get'><input type='hidden' name='token' value='{escape(token)}'/>"]
+        for name, label in (("tool", "Tool"), ("status", "Status"), ("since", "Desde"), ("until", "Até")):
+            value = escape(request.args.get(name) or "")
+            form.append(f" {label} <input name='{name}' value='{value}' size='12'/>")
+        form.append(f" <input type='hidden' name='limit' value='{limit}'/> <button type='submit'>Filtrar</button></form>\n")
+        yield "".join(form)
+        yield (
+            "<table><tr><th>ID</th><th>Tool</th><th>Params</th><th>Result</th>"
+            "<th>Status</th><th>Created</th><th>Download</th></tr>\n"
+        )
+        for hid, task_id, tool, params, result, status, created_at in iter_history(filters, cursor, limit):
+            yield (
+                f"<tr><td>{hid}</td><td>{escape(tool or '')}</td>"
+                f"<td><pre style='margin:0'>{escape(params or '{}')}</pre></td>"
+                f"<td><pre style='margin:0'>{escape(result or '{}')}</pre></td>"
+                f"<td>{escape(status or '')}</td><td>{escape(created_at or '')}</td>"
+                f"<td><a href='/admin/history/{hid}/download?{urlencode({'token': token})}'>download</a></td></tr>\n"
+            )
+        yield "</table>\n"
+        if next_cursor:
+            query = dict(request.args, cursor=next_cursor, limit=limit)
+            yield f"<p><a href='/admin/history?{escape(urlencode(query))}'>próxima página &raquo;</a></p>\n"
+        yield "</body></html>"
+
+    return Response(stream_with_context(generate()), mimetype="text/html")
 
 
 @app.route("/admin/history.json")
 def admin_history_json():
     if not check_admin_token():
         return abort(401)
-    limit = request.args.get("limit", 200)
     try:
-        limit = int(limit)
-    except Exception:
-        limit = 200
-    rows = fetch_history(limit=limit)
-    return jsonify(rows)
+        filters, cursor, limit = history_page_args()
+    except ValueError:
+        return jsonify({"error": "invalid_params"}), 400
+    next_cursor = history_next_cursor(filters, cursor, limit)
+
+    def generate():
+        yield "["
+        sep = ""
+        for row in iter_history(filters, cursor, limit):
+            yield sep + history_row_json(row)
+            sep = ",\n"
+        yield "]"
+
+    headers = {"X-Next-Cursor": str(next_cursor)} if next_cursor else {}
+    return Response(stream_with_context(generate()), mimetype="application/json", headers=headers)
+
+
+HISTORY_EXPORT_FIELDS = ("id", "task_id", "tool", "params", "result", "status", "created_at")
+
+
+@app.route("/admin/history/export")
+def admin_history_export():
+    """
+    Exporta o histórico inteiro (ou filtrado) em NDJSON ou CSV, em ordem de
+    id crescente e em memória constante. after_id=<último id recebido>
+    retoma uma exportação interrompida; gzip=1 compacta o stream.
+    """
+    if not check_admin_token():
+        return abort(401)
+    try:
+        filters = history_filters(request.args)
+    except ValueError:
+        return jsonify({"error": "invalid_params"}), 400
+    fmt = (request.args.get("format") or "ndjson").lower()
+    if fmt not in ("ndjson", "csv"):
+        return jsonify({"error": "invalid_format", "formats": ["ndjson", "csv"]}), 400
+    gz = str(request.args.get("gzip", "")).lower() in ("1", "true", "yes", "on")
+
+    def rows_text():
+        buf = io.StringIO()
+        writer = csv.writer(buf) if fmt == "csv" else None
+        if writer:
+            writer.writerow(HISTORY_EXPORT_FIELDS)
+        n = 0
+        for row in iter_history(filters, limit=None, batch=1000, ascending=True):
+            if writer:
+                writer.writerow(row)
+            else:
+                buf.write(history_row_json(row))
+                buf.write("\n")
+            n += 1
+            if n % 1000 == 0:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+
+    def generate():
+        if not gz:
+            yield from rows_text()
+            return
+        z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> formato gzip
+        for text in rows_text():
+            data = z.compress(text.encode("utf-8"))
+            if data:
+                yield data
+        yield z.flush()
+
+    ext = fmt + (".gz" if gz else "")
+    mimetype = "application/gzip" if gz else ("text/csv" if fmt == "csv" else "application/x-ndjson")
+    stamp = datetime.now(UTC).strftime("%Y%m%dT%H%M%SZ")
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=history_{stamp}.{ext}"},
+    )
+
+
+@app.route("/admin/search")
+def admin_search():
+    if not check_admin_token():
+        return abort(401)
+    q = (request.args.get("q") or "").strip()
+    if not q:
+        return jsonify({"error": "q_required"}), 400
+    if not search_enabled():
+        return jsonify({"error": "search_unavailable"}), 503
+    try:
+        limit = max(1, min(int(request.args.get("limit") or 20), 100))
+        offset = max(0, min(int(request.args.get("offset") or 0), 10000))
+    except ValueError:
+        return jsonify({"error": "invalid_params"}), 400
+    raw = str(request.args.get("raw", "")).lower() in ("1", "true", "yes", "on")
+    try:
+        results, more = search_history(
+            q, kind=request.args.get("kind") or None, tool=request.args.get("tool") or None,
+            limit=limit, offset=offset, raw=raw,
+        )
+    except sqlite3.OperationalError as e:
+        return jsonify({"error": "invalid_query", "detail": str(e)}), 400
+    return jsonify({
+        "q": q, "offset": offset, "limit": limit, "results": results,
+        "next_offset": offset + limit if more else None,
+    })
 
 
 @app.route("/admin/history/<int:hid>/download")
 def admin_history_download(hid):
     if not check_admin_token():
         return abort(401)
-    raw = fetch_history_raw(hid)
-    if raw is None:
+    output = iter_history_output(hid)
+    if output is None:
         return abort(404)
-    resp = make_response(raw)
-    resp.headers.set("Content-Type", "text/plain; charset=utf-8")
-    resp.headers.set("Content-Disposition", f"attachment; filename=history_{hid}.txt")
-    return resp
+    return Response(
+        stream_with_context(output),
+        mimetype="text/plain",
+        headers={
+            "Content-Type": "text/plain; charset=utf-8",
+            "Content-Disposition": f"attachment; filename=history_{hid}.txt",
+        },
+    )
+
+
+@app.route("/admin/reports.json")
+def admin_reports_json():
+    """Relatórios registrados (tools/report_store.py) por target, tool e since/until; before_id pagina."""
+    if not check_admin_token():
+        return abort(401)
+    args = request.args
+    try:
+        since = report_store.parse_date(args["since"]) if args.get("since") else None
+        until = report_store.parse_date(args["until"]) if args.get("until") else None
+        before_id = int(args.get("before_id") or 0) or None
+        limit = max(1, min(int(args.get("limit") or HISTORY_PAGE_DEFAULT), HISTORY_PAGE_MAX))
+    except ValueError:
+        return jsonify({"error": "invalid_params"}), 400
+    records = report_store.get_store().query(
+        target=(args.get("target") or "").strip() or None,
+        tool=(args.get("tool") or "").strip() or None,
+        since=since, until=until, limit=limit, before_id=before_id,
+    )
+    headers = {"X-Next-Before-Id": str(records[-1]["id"])} if len(records) == limit else {}
+    return jsonify(records), 200, headers
 
 
 # -------------------
@@ -78,23 +78,29 @@ document.addEventListener("DOMContentLoaded", () => {
       setProgress(`pg-${tool}`, progress);
     }
 
-    es.addEventListener("log", (evt) => {
+    // linhas de saída ("log" e "output"); vazamento usa a formatação colorida
+    const appendLine = (tool === "vazamento") ? appendVazamento : (text) => appendOut(tool, text);
+
+    function onLine(evt) {
       const raw = evt.data;
       if (!raw) return;
       try {
         const d = JSON.parse(raw);
         if (Object.prototype.hasOwnProperty.call(d, "line")) {
           if (d.line !== null && d.line !== undefined && d.line !== "") {
-            appendOut(tool, d.line);
+            appendLine(d.line);
           }
         } else {
-          appendOut(tool, JSON.stringify(d));
+          appendLine(JSON.stringify(d));
         }
       } catch (e) {
-        appendOut(tool, raw);
+        appendLine(raw);
       }
       advanceProgress(1);
-    });
+    }
+
+    es.addEventListener("log", onLine);
+    es.addEventListener("output", onLine);
 
     es.addEventListener("status", (evt) => {
       const raw = evt.data;
@@ -109,12 +115,36 @@ document.addEventListener("DOMContentLoaded", () => {
       advanceProgress(2);
     });
 
+    es.addEventListener("queue", (evt) => {
+      try {
+        const d = JSON.parse(evt.data);
+        appendOut(tool, `[FILA] posição ${d.position} (${d.running}/${d.limit} em execução)`);
+      } catch (e) {}
+    });
+
+    es.addEventListener("progress", (evt) => {
+      try {
+        const d = JSON.parse(evt.data);
+        const done = d.done ?? d.checked;
+        if (!progressEl || !d.total || done === undefined) return;
+        progress = Math.max(progress, Math.min(95, Math.round(done * 100 / d.total)));
+        setProgress(`pg-${tool}`, progress);
+      } catch (e) {}
+    });
+
     es.addEventListener("result", (evt) => {
       const raw = evt.data;
       if (!raw) return;
       try {
         const d = JSON.parse(raw);
-        appendOut(tool, "[RESULT] " + JSON.stringify(d));
+        if (d.extractor) {
+          // MetaWeb: os dados já chegam como linhas na saída; aqui só o resumo
+          appendOut(tool, `[RESULT] ${d.extractor}: ${d.status} (${d.elapsed_ms} ms)`);
+        } else if (d.relatorio) {
+          appendOut(tool, "[RELATÓRIO] " + window.location.origin + d.relatorio);
+        } else {
+          appendOut(tool, "[RESULT] " + JSON.stringify(d));
+        }
       } catch (e) {
         appendOut(tool, "[RESULT] " + raw);
       }
@@ -139,6 +169,12 @@ document.addEventListener("DOMContentLoaded", () => {
 
     es.addEventListener("error", (evt) => {
       const raw = (evt && evt.data) ? evt.data : null;
+      if (!raw && es.readyState === EventSource.CONNECTING) {
+        // queda de conexão: o navegador reconecta com Last-Event-ID e o
+        // servidor continua do último evento recebido
+        appendOut(tool, "[STATUS] conexão perdida, reconectando...");
+        return;
+      }
       if (!raw) {
         appendOut(tool, "[ERROR] connection or streaming error (no data)");
       } else {
@@ -208,25 +244,58 @@ document.addEventListener("DOMContentLoaded", () => {
       const out = document.getElementById("out-vazamento");
       if (out) out.innerHTML = ""; // limpa saída
 
-      const es = startSSE("vazamento", data.task_id);
+      startSSE("vazamento", data.task_id);
+    });
+  }
 
-      // Substitui logs do vazamento para usar appendVazamento
-      es.addEventListener("log", (evt) => {
-        const raw = evt.data;
-        if (!raw) return;
-        try {
-          const d = JSON.parse(raw);
-          if (Object.prototype.hasOwnProperty.call(d, "line")) {
-            if (d.line !== null && d.line !== undefined && d.line !== "") {
-              appendVazamento(d.line);
-            }
-          } else {
-            appendVazamento(JSON.stringify(d));
-          }
-        } catch (err) {
-          appendVazamento(raw);
-        }
+  // ==============================
+  // Vazamento: busca em fontes abertas (buscadores, pastes, Tor, APIs)
+  // ==============================
+  const buscaBtn = document.getElementById("vazamento-busca");
+  if (buscaBtn) {
+    buscaBtn.addEventListener("click", async (e) => {
+      e.preventDefault();
+      const emailEl = document.getElementById("vazamento-email");
+      const email = emailEl ? emailEl.value.trim() : "";
+      if (!email) return alert("Informe o e-mail.");
+
+      setProgress("pg-vazamento", 5);
+      const res = await fetch("/vazamento/busca/start", {
+        method: "POST",
+        headers: { "Content-Type": "application/x-www-form-urlencoded" },
+        body: new URLSearchParams({ email })
+      });
+      const data = await res.json();
+
+      const out = document.getElementById("out-vazamento");
+      if (out) out.innerHTML = "";
+      startSSE("vazamento", data.task_id);
+    });
+  }
+
+  // ==============================
+  // Vazamento: lote de e-mails (Holehe em processo)
+  // ==============================
+  const batchForm = document.getElementById("vazamento-batch-form");
+  if (batchForm) {
+    batchForm.addEventListener("submit", async (e) => {
+      e.preventDefault();
+      const emailsEl = document.getElementById("vazamento-emails");
+      const emails = emailsEl ? emailsEl.value.trim() : "";
+      if (!emails) return alert("Informe ao menos um e-mail.");
+
+      setProgress("pg-vazamento", 5);
+      const res = await fetch("/vazamento/batch/start", {
+        method: "POST",
+        headers: { "Content-Type": "application/x-www-form-urlencoded" },
+        body: new URLSearchParams({ emails })
       });
+      const data = await res.json();
+      if (!res.ok) return alert(data.error || "Falha ao iniciar o lote.");
+
+      const out = document.getElementById("out-vazamento");
+      if (out) out.innerHTML = "";
+      startSSE("vazamento", data.task_id);
     });
   }
 
@@ -242,6 +311,8 @@ document.addEventListener("DOMContentLoaded", () => {
       setProgress("pg-metaweb", 5);
       const fd = new FormData();
       fd.append("file", input.files[0]);
+      const deep = document.getElementById("metaweb-deep");
+      if (deep && deep.checked) fd.append("deep", "1");
       const res = await fetch("/metaweb/start", { method: "POST", body: fd });
       const data = await res.json();
       startSSE("metaweb", data.task_id);
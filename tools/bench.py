@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+"""
+Benchmarks do painel. Cada subcomando mede um caminho "antes x depois":
+
+    python3 tools/bench.py sherlock --sites 300
+    python3 tools/bench.py history --threads 8 --rows 500
+    python3 tools/bench.py exiftool --files 200 imagem.jpg
+    python3 tools/bench.py hashing --sizes 1,64,512
+    python3 tools/bench.py yara --files 40 --size 8
+    python3 tools/bench.py download --size 64
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import random
+import sqlite3
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+
+# -------------------
+# Sherlock: motor nativo x CLI
+# -------------------
+
+class StubSiteHandler(BaseHTTPRequestHandler):
+    """Imita respostas de sites: /found/... existe, /missing/... não."""
+
+    protocol_version = "HTTP/1.1"
+    delay = 0.0
+
+    def _reply(self, body=True):
+        if self.delay:
+            time.sleep(self.delay)
+        path = self.path
+        if path.startswith("/found/"):
+            status, text = 200, "<html>perfil de usuário</html>"
+        elif path.startswith("/msg/"):
+            status, text = 200, "<html>Sorry, user not found</html>"
+        elif path.startswith("/redirect/"):
+            self.send_response(302)
+            self.send_header("Location", "/")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        else:
+            status, text = 404, "<html>not found</html>"
+        payload = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if body:
+            self.wfile.write(payload)
+
+    def do_GET(self):
+        self._reply()
+
+    def do_HEAD(self):
+        self._reply(body=False)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # o backlog padrão (5) derruba conexões sob concorrência e distorce a medida
+    request_queue_size = 1024
+
+
+def _serve_stub(delay, hosts, port_queue):
+    StubSiteHandler.delay = delay
+    # um servidor por endereço de loopback (127.0.0.1, .2, ...) na mesma
+    # porta, para os "sites" ficarem em hosts diferentes como na vida real
+    first = StubServer(("127.0.0.1", 0), StubSiteHandler)
+    port = first.server_address[1]
+    servers = [first] + [StubServer((f"127.0.0.{i}", port), StubSiteHandler) for i in range(2, hosts + 1)]
+    for server in servers[1:]:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    port_queue.put(port)
+    first.serve_forever()
+
+
+def start_stub_server(delay, hosts=1):
+    """Sobe o stub em outro processo, para não disputar o GIL com o que é medido."""
+    port_queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_serve_stub, args=(delay, hosts, port_queue), daemon=True)
+    proc.start()
+    return proc, port_queue.get(timeout=10)
+
+
+def stub_site_data(port, n, hosts=1):
+    """Manifesto sintético no formato do data.json do Sherlock."""
+    sites = {}
+    for i in range(n):
+        base_url = f"http://127.0.0.{i % hosts + 1}:{port}"
+        kind = i % 4
+        if kind == 0:
+            site = {"url": f"{base_url}/found/{i}/{{}}", "errorType": "status_code"}
+        elif kind == 1:
+            site = {"url": f"{base_url}/missing/{i}/{{}}", "errorType": "status_code"}
+        elif kind == 2:
+            site = {"url": f"{base_url}/msg/{i}/{{}}", "errorType": "message", "errorMsg": "user not found"}
+        else:
+            site = {"url": f"{base_url}/redirect/{i}/{{}}", "errorType": "response_url"}
+        site["urlMain"] = base_url
+        site["username_claimed"] = "bench"
+        sites[f"Site{i:04d}"] = site
+    return sites
+
+
+def bench_sherlock(args):
+    from tools import sherlock_engine
+
+    server, port = start_stub_server(args.delay, args.hosts)
+
+    tmpdir = tempfile.mkdtemp(prefix="bench_sherlock_")
+    data_path = os.path.join(tmpdir, "data.json")
+    with open(data_path, "w", encoding="utf-8") as f:
+        json.dump(stub_site_data(port, args.sites, args.hosts), f)
+
+    try:
+        start = time.perf_counter()
+        results = sherlock_engine.run_username(
+            "bench", data_path=data_path, concurrency=args.concurrency,
+            timeout=args.timeout, host_interval=args.host_interval,
+        )
+        elapsed = time.perf_counter() - start
+        found = sum(1 for r in results if r["status"] == "found")
+        print(f"native: {len(results)} sites em {elapsed:.2f}s -> {len(results) / elapsed:.1f} sites/s ({found} found)")
+
+        exe = shutil.which("sherlock")
+        if not exe:
+            print("cli:    sherlock não encontrado no PATH, pulando")
+            return
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [exe, "bench", "--json", data_path, "--print-found", "--no-color",
+             "--timeout", str(args.timeout), "--folderoutput", tmpdir],
+            capture_output=True, text=True, cwd=tmpdir,
+        )
+        elapsed = time.perf_counter() - start
+        found = sum(1 for line in proc.stdout.splitlines() if line.startswith("[+]"))
+        print(f"cli:    {args.sites} sites em {elapsed:.2f}s -> {args.sites / elapsed:.1f} sites/s ({found} found)")
+    finally:
+        server.terminate()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+# -------------------
+# Histórico: conexão por chamada x writer em lote
+# -------------------
+
+def _legacy_record(db_path, i):
+    # o caminho antigo: CREATE TABLE + connect + insert + commit a cada chamada
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS history (id INTEGER PRIMARY KEY AUTOINCREMENT, task_id TEXT, tool TEXT, "
+        "params TEXT, result TEXT, raw_output TEXT, status TEXT, created_at TEXT)"
+    )
+    conn.execute(
+        "INSERT INTO history (task_id, tool, params, result, raw_output, status, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (f"task-{i}", "bench", "{}", "{}", "", "started", time.strftime("%Y-%m-%dT%H:%M:%S")),
+    )
+    conn.commit()
+    conn.close()
+
+
+def _run_threads(threads, rows, fn):
+    def work(t):
+        for i in range(rows):
+            fn(t * rows + i)
+    pool = [threading.Thread(target=work, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for th in pool:
+        th.start()
+    for th in pool:
+        th.join()
+    return start
+
+
+def bench_history(args):
+    tmpdir = tempfile.mkdtemp(prefix="bench_history_")
+    os.environ["PAINEL_DB_PATH"] = os.path.join(tmpdir, "painel.db")
+    os.environ.setdefault("TASK_BUS_DB_PATH", os.path.join(tmpdir, "tasks.db"))
+    total = args.threads * args.rows
+    try:
+        legacy_path = os.path.join(tmpdir, "legacy.db")
+        start = _run_threads(args.threads, args.rows, lambda i: _legacy_record(legacy_path, i))
+        elapsed = time.perf_counter() - start
+        print(f"legacy: {total} inserts em {elapsed:.2f}s -> {total / elapsed:.0f} inserts/s")
+
+        import painel_unificado as painel
+        painel.app.logger.setLevel("WARNING")
+        painel.init_db()
+        start = _run_threads(
+            args.threads, args.rows,
+            lambda i: painel.record_history(f"task-{i}", "bench", {}, {}, "", status="started"),
+        )
+        painel.history_writer.flush(timeout=None)
+        elapsed = time.perf_counter() - start
+        count = painel.db_conn().execute("SELECT COUNT(*) FROM history").fetchone()[0]
+        print(f"writer: {count} inserts em {elapsed:.2f}s -> {count / elapsed:.0f} inserts/s")
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+# -------------------
+# MetaWeb: exiftool por arquivo x pool -stay_open
+# -------------------
+
+def bench_exiftool(args):
+    from tools.metaweb.exiftool_pool import ExifToolPool
+
+    exe = shutil.which("exiftool")
+    if not exe:
+        print("exiftool não encontrado no PATH")
+        return
+    tmpdir = tempfile.mkdtemp(prefix="bench_exiftool_")
+    try:
+        ext = os.path.splitext(args.sample)[1]
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(tmpdir, f"f{i:05d}{ext}")
+            shutil.copyfile(args.sample, path)
+            paths.append(path)
+
+        n = min(args.files, args.spawn_files)
+        start = time.perf_counter()
+        for path in paths[:n]:
+            subprocess.run([exe, "-j", "-G", path], capture_output=True)
+        elapsed = time.perf_counter() - start
+        print(f"spawn:  {n} arquivos em {elapsed:.2f}s -> {elapsed / n * 1000:.1f} ms/arquivo")
+
+        pool = ExifToolPool(size=args.pool_size)
+        pool.metadata(paths[0])  # aquece um processo
+        start = time.perf_counter()
+        for path in paths:
+            pool.metadata(path)
+        elapsed = time.perf_counter() - start
+        print(f"pool:   {len(paths)} arquivos em {elapsed:.2f}s -> {elapsed / len(paths) * 1000:.1f} ms/arquivo")
+
+        start = time.perf_counter()
+        pool.metadata_batch(paths)
+        elapsed = time.perf_counter() - start
+        print(f"lotes:  {len(paths)} arquivos em {elapsed:.2f}s -> {elapsed / len(paths) * 1000:.1f} ms/arquivo")
+        pool.close()
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+# -------------------
+# Hashes: blocos de 8 KB, um digest por vez x passada única com mmap
+# -------------------
+
+def _legacy_hashes(path):
+    # o que metaweb.py fazia: md5/sha1/sha256 em blocos de 8 KB
+    import hashlib
+    hashes = {"md5": hashlib.md5(), "sha1": hashlib.sha1(), "sha256": hashlib.sha256()}
+    with open(path, "rb") as f:
+        while chunk := f.read(8192):
+            for h in hashes.values():
+                h.update(chunk)
+    return {k: v.hexdigest() for k, v in hashes.items()}
+
+
+def bench_hashing(args):
+    from tools.metaweb import hashing
+
+    tmpdir = tempfile.mkdtemp(prefix="bench_hashing_", dir=args.dir)
+    try:
+        for mb in (int(s) for s in args.sizes.split(",")):
+            path = os.path.join(tmpdir, f"{mb}mb.bin")
+            with open(path, "wb") as f:
+                block = os.urandom(1024 * 1024)
+                for _ in range(mb):
+                    f.write(block)
+            modes = [
+                ("8 KB", lambda: _legacy_hashes(path)),
+                ("mmap", lambda: hashing.hash_file(path, threaded=False)),
+                ("mmap+threads", lambda: hashing.hash_file(path, threaded=True)),
+            ]
+            expected = None
+            for label, fn in modes:
+                fn()  # aquece o cache de páginas
+                best = None
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    result = fn()
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                digests = {k: result[k] for k in ("md5", "sha1", "sha256")}
+                expected = expected or digests
+                assert digests == expected, f"digests diferentes em {label}"
+                print(f"{mb:>6} MB  {label:<13} {best:.3f}s -> {mb / best:8.1f} MB/s")
+            os.unlink(path)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+# -------------------
+# YARA: um processo x pool de processos
+# -------------------
+
+def bench_yara(args):
+    from tools.metaweb import yara_scan
+
+    if not yara_scan.available():
+        print("yara-python ou regras não encontrados")
+        return
+    tmpdir = tempfile.mkdtemp(prefix="bench_yara_", dir=args.dir)
+    try:
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(tmpdir, f"f{i:05d}.bin")
+            with open(path, "wb") as f:
+                f.write(os.urandom(args.size * 1024 * 1024))
+            paths.append(path)
+        total_mb = args.files * args.size
+
+        start = time.perf_counter()
+        yara_scan.get_cache().get()
+        print(f"regras: {(time.perf_counter() - start) * 1000:.1f} ms (compilação ou carga do cache)")
+
+        rules, _ = yara_scan.get_cache().get()
+        start = time.perf_counter()
+        for path in paths:
+            yara_scan.match(path, rules=rules)
+        elapsed = time.perf_counter() - start
+        print(f"1 processo:   {total_mb} MB em {elapsed:.2f}s -> {total_mb / elapsed:8.1f} MB/s")
+
+        workers = args.workers or os.cpu_count() or 1
+        start = time.perf_counter()
+        yara_scan.scan_many(paths, workers=workers)
+        elapsed = time.perf_counter() - start
+        print(f"pool ({workers:>2}):    {total_mb} MB em {elapsed:.2f}s -> {total_mb / elapsed:8.1f} MB/s")
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+# -------------------
+# MetaWeb: download direto para disco contra um servidor local
+# -------------------
+
+def stub_payload(n):
+    """Corpo determinístico de n bytes (o mesmo em toda requisição)."""
+    return random.Random(n).randbytes(n)
+
+
+class StubDownloadHandler(BaseHTTPRequestHandler):
+    """
+    /file/<n>: n bytes com Content-Length, respeitando Range;
+    /chunked/<n>: sem Content-Length (Transfer-Encoding: chunked);
+    /norange/<n>: ignora Range e sempre manda o corpo inteiro com 200.
+    """
+
+    protocol_version = "HTTP/1.1"
+    chunk = 64 * 1024
+
+    def _reply(self, body=True):
+        kind, _, n = self.path.strip("/").partition("/")
+        if kind not in ("file", "chunked", "norange") or not n.isdigit():
+            self.send_error(404)
+            return
+        payload = stub_payload(int(n))
+        status, start, end = 200, 0, len(payload)
+        rng = self.headers.get("Range", "")
+        if kind == "file" and rng.startswith("bytes="):
+            first, _, last = rng[6:].partition("-")
+            start, end = int(first), min(int(last) + 1 if last else len(payload), len(payload))
+            status = 206
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(payload)}")
+        if kind == "chunked":
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(end - start))
+        self.end_headers()
+        if not body:
+            return
+        for i in range(start, end, self.chunk):
+            block = payload[i:min(i + self.chunk, end)]
+            if kind == "chunked":
+                self.wfile.write(f"{len(block):x}\r\n".encode() + block + b"\r\n")
+            else:
+                self.wfile.write(block)
+        if kind == "chunked":
+            self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        try:
+            self._reply()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # o cliente desistiu no limite: esperado nos casos de corte
+
+    def do_HEAD(self):
+        self._reply(body=False)
+
+    def log_message(self, *args):
+        pass
+
+
+def _download_cases(base, n, head):
+    """(nome, url, kwargs de download(), resultado esperado)."""
+    return [
+        ("inteiro", f"{base}/file/{n}", {}, {"bytes": n, "complete": True, "status": 200}),
+        ("sem Content-Length", f"{base}/chunked/{n}", {}, {"bytes": n, "complete": True, "status": 200}),
+        ("acima do limite (Content-Length)", f"{base}/file/{n}", {"max_bytes": n - 1}, "too_large"),
+        ("acima do limite (contando)", f"{base}/chunked/{n}", {"max_bytes": n - 1}, "too_large"),
+        ("head_only com Range", f"{base}/file/{n}", {"head_only": True, "head_bytes": head},
+         {"bytes": head, "complete": False, "status": 206, "content_length": n}),
+        ("head_only, Range ignorado", f"{base}/norange/{n}", {"head_only": True, "head_bytes": head},
+         {"bytes": head, "complete": False, "status": 200, "content_length": n}),
+        ("head_only, arquivo menor que o limite", f"{base}/norange/{head // 2}",
+         {"head_only": True, "head_bytes": head}, {"bytes": head // 2, "complete": True, "status": 200}),
+    ]
+
+
+def _check_download(metaweb, url, kwargs, expected, tmpdir):
+    """Roda um caso; devolve (tempo, lista de problemas)."""
+    problems = []
+    start = time.perf_counter()
+    try:
+        info = metaweb.download(url, dest_dir=tmpdir, **kwargs)
+    except metaweb.DownloadTooLarge:
+        info = "too_large"
+    elapsed = time.perf_counter() - start
+    leftovers = glob.glob(os.path.join(tmpdir, ".metaweb_*"))
+    if expected == "too_large":
+        if info != "too_large":
+            problems.append(f"esperava DownloadTooLarge, veio {info}")
+        if leftovers:
+            problems.append(f"temporário não removido: {leftovers}")
+        for path in leftovers:
+            os.unlink(path)
+        return elapsed, problems
+    if info == "too_large":
+        return elapsed, ["DownloadTooLarge inesperado"]
+    try:
+        served = stub_payload(int(url.rsplit("/", 1)[1]))[:info["bytes"]]
+        with open(info["path"], "rb") as f:
+            if f.read() != served:
+                problems.append("conteúdo gravado difere do servido")
+        got = {"bytes": info["bytes"], "complete": info["complete"], "status": info["http_status"],
+               "content_length": info["content_length"]}
+        for key, value in expected.items():
+            if got[key] != value:
+                problems.append(f"{key}={got[key]!r}, esperava {value!r}")
+        if info["complete"]:
+            want = {name: hashlib.new(name, served).hexdigest() for name in ("md5", "sha1", "sha256")}
+            if {name: info.get("hashes", {}).get(name) for name in want} != want:
+                problems.append("hashes não batem com os bytes servidos")
+        elif "hashes" in info:
+            problems.append("hashes de um arquivo incompleto")
+    finally:
+        os.unlink(info["path"])
+    return elapsed, problems
+
+
+def bench_download(args):
+    from tools.metaweb import metaweb
+
+    server = StubServer(("127.0.0.1", 0), StubDownloadHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    tmpdir = tempfile.mkdtemp(prefix="bench_download_", dir=args.dir)
+    n = args.size * 1024 * 1024
+    failed = 0
+    try:
+        for name, url, kwargs, expected in _download_cases(base, n, args.head_kb * 1024):
+            elapsed, problems = _check_download(metaweb, url, kwargs, expected, tmpdir)
+            failed += bool(problems)
+            rate = f"{n / 1e6 / elapsed:8.1f} MB/s" if expected != "too_large" and expected["bytes"] == n else ""
+            print(f"{'ok' if not problems else 'FALHOU':<7}{name:<40}{elapsed:.3f}s {rate}")
+            for problem in problems:
+                print(f"       - {problem}")
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    if failed:
+        sys.exit(f"{failed} caso(s) falharam")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do painel")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("sherlock", help="motor nativo x CLI contra um servidor stub local")
+    p.add_argument("--sites", type=int, default=300)
+    p.add_argument("--concurrency", type=int, default=40)
+    p.add_argument("--timeout", type=float, default=10)
+    p.add_argument("--delay", type=float, default=0.05, help="latência simulada por resposta (s)")
+    p.add_argument("--hosts", type=int, default=50, help="quantos hosts de loopback distintos")
+    p.add_argument("--host-interval", type=float, default=0.0, help="intervalo mínimo por host (s)")
+    p.set_defaults(func=bench_sherlock)
+
+    p = sub.add_parser("history", help="gravação do histórico: conexão por chamada x writer em lote")
+    p.add_argument("--threads", type=int, default=8, help="tarefas gravando ao mesmo tempo")
+    p.add_argument("--rows", type=int, default=500, help="registros por thread")
+    p.set_defaults(func=bench_history)
+
+    p = sub.add_parser("exiftool", help="metadados: um exiftool por arquivo x pool -stay_open")
+    p.add_argument("sample", help="arquivo de exemplo (copiado --files vezes)")
+    p.add_argument("--files", type=int, default=200)
+    p.add_argument("--spawn-files", type=int, default=50, help="quantos medir no modo um-processo-por-arquivo")
+    p.add_argument("--pool-size", type=int, default=2)
+    p.set_defaults(func=bench_exiftool)
+
+    p = sub.add_parser("hashing", help="md5/sha1/sha256: blocos de 8 KB x passada única com mmap")
+    p.add_argument("--sizes", default="1,64,512", help="tamanhos dos arquivos de teste (MB)")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--dir", default=None, help="onde criar os arquivos (padrão: diretório temporário)")
+    p.set_defaults(func=bench_hashing)
+
+    p = sub.add_parser("yara", help="varredura YARA: um processo x pool de processos (MB/s)")
+    p.add_argument("--files", type=int, default=40)
+    p.add_argument("--size", type=int, default=8, help="tamanho de cada arquivo (MB)")
+    p.add_argument("--workers", type=int, default=None, help="processos da pool (padrão: núcleos)")
+    p.add_argument("--dir", default=None, help="onde criar os arquivos (padrão: diretório temporário)")
+    p.set_defaults(func=bench_yara)
+
+    p = sub.add_parser("download", help="download do MetaWeb contra um servidor local (limites, Range, hashes)")
+    p.add_argument("--size", type=int, default=16, help="tamanho do arquivo servido (MB)")
+    p.add_argument("--head-kb", type=int, default=256, help="head_bytes do modo só-metadados (KB)")
+    p.add_argument("--dir", default=None, help="onde gravar os downloads (padrão: diretório temporário)")
+    p.set_defaults(func=bench_download)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,11 +8,15 @@ if [[ -z "$EMAIL" ]]; then
   exit 1
 fi
 
-mkdir -p leak_check_results static/relatorios
-RELATORIO_JSON="leak_check_results/ultimo_relatorio.json"
+mkdir -p leak_check_results
 DATA="$(LC_ALL=C date +"%Y-%m-%d_%H-%M-%S")"
-PASTA="static/relatorios/$DATA"
-mkdir -p "$PASTA"
+# um JSON por execução (antes: leak_check_results/ultimo_relatorio.json, sobrescrito a cada busca)
+ALVO_ARQ="$(printf '%s' "$EMAIL" | tr -c 'A-Za-z0-9_.@+-' '_' | cut -c1-100)"
+RELATORIO_JSON="leak_check_results/email_leak_${ALVO_ARQ}_${DATA}.json"
+# fragmentos por fonte num diretório temporário; no fim viram um registro só
+# (compactado) em report_store, em vez de um .html por fonte em static/relatorios
+PASTA="$(mktemp -d)"
+trap 'rm -rf "$PASTA"' EXIT
 
 UA="Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
 
@@ -92,35 +96,45 @@ BREACH_RES=$(curl -s --header 'Accept-Encoding: identity' "https://breachdirecto
 echo "<h2>BreachDirectory</h2><pre>$BREACH_RES</pre>" > "$PASTA/BreachDirectory.html"
 
 # ================= GERAR JSON =================
-cat <<EOF > "$RELATORIO_JSON"
+# grava num temporário e troca com mv: quem lê nunca vê o arquivo pela metade
+RELATORIO_TMP="$(mktemp leak_check_results/.tmp_XXXXXX)"
+cat <<EOF > "$RELATORIO_TMP"
 {
   "email": "$EMAIL",
   "data": "$DATA",
   "resultados": {
-    "google": "Google.html",
-    "bing": "Bing.html",
-    "duckduckgo": "DuckDuckGo.html",
-    "yahoo": "Yahoo.html",
-    "ask": "Ask.html",
-    "yandex": "Yandex.html",
-    "ahmia": "Ahmia.html",
-    "onionland": "OnionLand.html",
-    "onionsearch": "OnionSearch.html",
-    "torch": "Torch.html",
-    "darksearch": "DarkSearch.html",
-    "phobos": "Phobos.html",
-    "pastebin": "Pastebin.html",
-    "github": "GitHub.html",
-    "gitlab": "GitLab.html",
-    "reddit": "Reddit.html",
-    "twitter": "Twitter.html",
-    "facebook": "Facebook.html",
-    "haveibeenpwned": "HaveIBeenPwned.html",
-    "leakcheck": "LeakCheck.html",
-    "breachdirectory": "BreachDirectory.html"
+    "google": "Google",
+    "bing": "Bing",
+    "duckduckgo": "DuckDuckGo",
+    "yahoo": "Yahoo",
+    "ask": "Ask",
+    "yandex": "Yandex",
+    "ahmia": "Ahmia",
+    "onionland": "OnionLand",
+    "onionsearch": "OnionSearch",
+    "torch": "Torch",
+    "darksearch": "DarkSearch",
+    "phobos": "Phobos",
+    "pastebin": "Pastebin",
+    "github": "GitHub",
+    "gitlab": "GitLab",
+    "reddit": "Reddit",
+    "twitter": "Twitter",
+    "facebook": "Facebook",
+    "haveibeenpwned": "HaveIBeenPwned",
+    "leakcheck": "LeakCheck",
+    "breachdirectory": "BreachDirectory"
   }
 }
 EOF
+mv -f "$RELATORIO_TMP" "$RELATORIO_JSON"
+
+# registra a execução (com o conteúdo de todas as fontes) no índice de relatórios (runs/reports.db)
+if REPORT_ID=$("${PYTHON:-python3}" "$(dirname "$0")/report_store.py" import-dir \
+    --tool email_leak --target "$EMAIL" --path "$RELATORIO_JSON" "$PASTA"); then
+  echo "[✅] Relatório por fonte no painel: /relatorios/$REPORT_ID"
+else
+  echo "[!] Não foi possível registrar o relatório em report_store"
+fi
 
 echo "[✅] Relatório gerado em: $RELATORIO_JSON"
-echo "[✅] Arquivos HTML por fonte em: $PASTA"
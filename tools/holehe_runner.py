@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Checagem de e-mails com os módulos do Holehe, sem abrir o CLI.
+
+Os módulos (holehe.modules.*) são importados uma vez por processo e
+chamados direto: cada um é uma corrotina module(email, client, out). Todas
+as consultas compartilham o mesmo pool de conexões (um transporte httpx
+que vive num event loop próprio), com limite global de módulos em voo, e
+cada módulo tem o tempo medido, para dar para ver quais dominam a latência.
+
+Cada e-mail recebe um AsyncClient próprio sobre o transporte comum: as
+conexões são reaproveitadas, mas cookies e tokens de um e-mail não vazam
+para o próximo.
+"""
+
+import asyncio
+import os
+import queue
+import threading
+import time
+
+try:
+    import httpx
+except ImportError:  # dependência opcional: sem httpx o painel usa o CLI
+    httpx = None
+
+DEFAULT_CONCURRENCY = int(os.environ.get("HOLEHE_CONCURRENCY", "30"))
+DEFAULT_TIMEOUT = float(os.environ.get("HOLEHE_TIMEOUT", "10"))
+# quantos e-mails de um lote rodam ao mesmo tempo
+DEFAULT_EMAIL_CONCURRENCY = int(os.environ.get("HOLEHE_EMAIL_CONCURRENCY", "4"))
+
+_modules = None
+_modules_lock = threading.Lock()
+
+
+def available():
+    if httpx is None:
+        return False
+    try:
+        import holehe.core  # noqa: F401
+    except Exception:
+        return False
+    return True
+
+
+def load_modules():
+    """Importa (uma vez) os módulos do Holehe; devolve [(nome, função)]."""
+    global _modules
+    with _modules_lock:
+        if _modules is None:
+            from holehe.core import get_functions, import_submodules
+            funcs = get_functions(import_submodules("holehe.modules"))
+            _modules = sorted(((f.__name__, f) for f in funcs), key=lambda item: item[0])
+    return _modules
+
+
+def format_line(r):
+    """Mesma convenção do CLI: [+] usado, [-] não usado, [x] rate limit/erro."""
+    if r["rateLimit"]:
+        line = f"[x] {r['domain']}"
+        if r.get("error"):
+            line += f" ({r['error']})"
+        return line
+    if not r["exists"]:
+        return f"[-] {r['domain']}"
+    extras = [str(r[k]) for k in ("emailrecovery", "phoneNumber", "others") if r.get(k)]
+    return f"[+] {r['domain']}" + (" / " + " / ".join(extras) if extras else "")
+
+
+async def run_module(name, module, email, client, sem):
+    out = []
+    error = None
+    async with sem:
+        start = time.perf_counter()
+        try:
+            await module(email, client, out)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+    result = out[0] if out else {"name": name, "domain": name, "rateLimit": True, "exists": False}
+    result = {
+        "email": email,
+        "name": result.get("name", name),
+        "domain": result.get("domain", name),
+        "method": result.get("method"),
+        "exists": bool(result.get("exists")),
+        "rateLimit": bool(result.get("rateLimit")) or error is not None,
+        "emailrecovery": result.get("emailrecovery"),
+        "phoneNumber": result.get("phoneNumber"),
+        "others": result.get("others"),
+        "elapsed_ms": elapsed_ms,
+    }
+    if error:
+        result["error"] = error
+    return result
+
+
+class HoleheEngine:
+    """Event loop dedicado com o transporte httpx compartilhado entre consultas."""
+
+    def __init__(self, max_connections=100):
+        self.max_connections = max_connections
+        self.loop = None
+        self._transport = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name="holehe-engine", daemon=True).start()
+
+    def client(self, timeout):
+        if self._transport is None:
+            n = self.max_connections
+            self._transport = httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(max_connections=n, max_keepalive_connections=n, keepalive_expiry=30),
+            )
+        # não fechar o cliente: aclose() fecharia o transporte de todo mundo
+        return httpx.AsyncClient(transport=self._transport, timeout=timeout)
+
+
+_engine = None
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        _engine = HoleheEngine(int(os.environ.get("HOLEHE_MAX_CONNECTIONS", "100")))
+    return _engine
+
+
+async def check_emails(emails, on_result=None, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT,
+                       email_concurrency=DEFAULT_EMAIL_CONCURRENCY, should_stop=None, engine=None):
+    """
+    Roda todos os módulos para cada e-mail; chama on_result(result) a cada
+    módulo concluído e devolve a lista de resultados.
+    """
+    engine = engine or get_engine()
+    modules = load_modules()
+    sem = asyncio.Semaphore(concurrency)
+    email_sem = asyncio.Semaphore(email_concurrency)
+    results = []
+
+    async def one_email(email):
+        async with email_sem:
+            client = engine.client(timeout)
+            tasks = [asyncio.ensure_future(run_module(n, m, email, client, sem)) for n, m in modules]
+            try:
+                for fut in asyncio.as_completed(tasks):
+                    result = await fut
+                    results.append(result)
+                    if on_result:
+                        on_result(result)
+            finally:
+                for t in tasks:
+                    t.cancel()
+
+    tasks = [asyncio.ensure_future(one_email(e)) for e in emails]
+    try:
+        while True:
+            pending = [t for t in tasks if not t.done()]
+            if not pending or (should_stop and should_stop()):
+                break
+            await asyncio.wait(pending, timeout=0.2)
+    finally:
+        for t in tasks:
+            t.cancel()
+    for t in tasks:
+        if t.done() and not t.cancelled() and t.exception():
+            raise t.exception()
+    return results
+
+
+def timing_summary(results, top=10):
+    """Agrega o tempo por módulo (média, máximo), do mais lento ao mais rápido."""
+    per_module = {}
+    for r in results:
+        stats = per_module.setdefault(r["name"], {"module": r["name"], "runs": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["runs"] += 1
+        stats["total_ms"] += r["elapsed_ms"]
+        stats["max_ms"] = max(stats["max_ms"], r["elapsed_ms"])
+    rows = []
+    for stats in per_module.values():
+        stats["avg_ms"] = round(stats["total_ms"] / stats["runs"], 1)
+        stats["total_ms"] = round(stats["total_ms"], 1)
+        rows.append(stats)
+    rows.sort(key=lambda s: s["avg_ms"], reverse=True)
+    return rows[:top] if top else rows
+
+
+def run_emails(emails, on_result=None, should_stop=None, engine=None, **kwargs):
+    """
+    Versão síncrona: roda no loop compartilhado do engine, com on_result e
+    should_stop chamados na thread de quem chamou.
+    """
+    if httpx is None:
+        raise RuntimeError("httpx não instalado")
+    engine = engine or get_engine()
+    load_modules()
+    inbox = queue.Queue()
+    stop = threading.Event()
+    engine._ensure_loop()
+    future = asyncio.run_coroutine_threadsafe(
+        check_emails(list(emails), on_result=inbox.put, should_stop=stop.is_set, engine=engine, **kwargs),
+        engine.loop,
+    )
+    while not (future.done() and inbox.empty()):
+        try:
+            result = inbox.get(timeout=0.2)
+        except queue.Empty:
+            if should_stop and should_stop():
+                stop.set()
+            continue
+        if on_result:
+            on_result(result)
+        if should_stop and should_stop():
+            stop.set()
+    return future.result()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Holehe em processo (um ou vários e-mails)")
+    parser.add_argument("emails", nargs="+")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--only-used", action="store_true")
+    parser.add_argument("--timing", action="store_true", help="mostra os módulos mais lentos")
+    args = parser.parse_args()
+
+    def show(r):
+        if r["exists"] or not args.only_used:
+            prefix = f"{r['email']} " if len(args.emails) > 1 else ""
+            print(prefix + format_line(r), flush=True)
+
+    start = time.perf_counter()
+    results = run_emails(args.emails, on_result=show, timeout=args.timeout, concurrency=args.concurrency)
+    elapsed = time.perf_counter() - start
+    used = sum(1 for r in results if r["exists"])
+    print(f"[*] {used} sites usados em {len(results)} checagens ({elapsed:.1f}s)")
+    if args.timing:
+        for s in timing_summary(results):
+            print(f"    {s['module']:<20} média {s['avg_ms']:>8.1f} ms  máx {s['max_ms']:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
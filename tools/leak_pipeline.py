@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Busca de um e-mail em buscadores, pastes, redes sociais e APIs de vazamento.
+
+Versão em Python do email_leak_checker_full.sh: as fontes são consultadas
+ao mesmo tempo (com limite de paralelismo, e um orçamento separado para as
+fontes via Tor), os links são extraídos enquanto a resposta ainda está
+chegando (a leitura para nos primeiros MAX_LINKS links) e os resumos de
+cada link são buscados em paralelo. Cada fonte concluída é entregue num
+callback, em vez de virar um .html no fim.
+"""
+
+import asyncio
+import os
+import re
+import time
+from urllib.parse import quote
+
+try:
+    import httpx
+except ImportError:  # dependência opcional
+    httpx = None
+
+USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/124.0.0.0 Safari/537.36"
+)
+TOR_PROXY = os.environ.get("TOR_PROXY", "socks5://127.0.0.1:9050")
+
+MAX_LINKS = 15
+SUMMARY_CHARS = 200
+SUMMARY_BYTES = 64 * 1024
+
+SURFACE_CONCURRENCY = int(os.environ.get("LEAK_SURFACE_CONCURRENCY", "6"))
+TOR_CONCURRENCY = int(os.environ.get("LEAK_TOR_CONCURRENCY", "2"))
+LINK_CONCURRENCY = int(os.environ.get("LEAK_LINK_CONCURRENCY", "10"))
+TOR_LINK_CONCURRENCY = int(os.environ.get("LEAK_TOR_LINK_CONCURRENCY", "3"))
+
+# (nome, url com {q}, via Tor?) -- mesma lista do script shell
+SOURCES = [
+    # Surface
+    ("Google", "https://www.google.com/search?q={q}", False),
+    ("Bing", "https://www.bing.com/search?q={q}", False),
+    ("DuckDuckGo", "https://duckduckgo.com/html/?q={q}", False),
+    ("Yahoo", "https://search.yahoo.com/search?p={q}", False),
+    ("Ask", "https://www.ask.com/web?q={q}", False),
+    ("Yandex", "https://yandex.com/search/?text={q}", False),
+    # Deep/Dark (via Tor)
+    ("Ahmia", "https://ahmia.fi/search/?q={q}", True),
+    ("OnionLand", "https://onionlandsearchengine.com/search?q={q}", True),
+    ("OnionSearch", "https://onionsearchengine.com/search?q={q}", True),
+    ("Torch", "http://xmh57jrzrnw6insl.onion/cgi-bin/omega/omega?P={q}", True),
+    ("DarkSearch", "https://darksearch.io/search?q={q}", True),
+    ("Phobos", "http://phobos4czs77u.onion/?query={q}", True),
+    # Pastebin & similares
+    ("Pastebin", "https://pastebin.com/search?q={q}", False),
+    ("GitHub", "https://github.com/search?q={q}&type=code", False),
+    ("GitLab", "https://gitlab.com/search?search={q}&nav_source=navbar", False),
+    # Redes sociais
+    ("Reddit", "https://www.reddit.com/search/?q={q}", False),
+    ("Twitter", "https://twitter.com/search?q={q}&src=typed_query", False),
+    ("Facebook", "https://www.facebook.com/search/top?q={q}", False),
+]
+
+# APIs de vazamento: (nome, url, headers, variável da chave); só rodam com a chave no ambiente
+API_SOURCES = [
+    ("HaveIBeenPwned", "https://haveibeenpwned.com/api/v3/breachedaccount/{q}",
+     {"hibp-api-key": "{HIBP_API_KEY}"}, "HIBP_API_KEY"),
+    ("LeakCheck", "https://leakcheck.io/api?key={LEAKCHECK_API_KEY}&check={q}", {}, "LEAKCHECK_API_KEY"),
+    ("BreachDirectory", "https://breachdirectory.org/api/?func=auto&term={q}&key={BREACHDIRECTORY_API_KEY}",
+     {}, "BREACHDIRECTORY_API_KEY"),
+]
+
+LINK_RE = re.compile(r"https?://[^\"]+")
+TAG_RE = re.compile(r"<[^>]*>")
+
+
+def extract_links(buffer, seen, out, limit=MAX_LINKS):
+    """
+    Procura links no buffer; devolve o pedaço final que ainda pode conter
+    um link incompleto (tudo depois da última aspa).
+    """
+    cut = buffer.rfind('"')
+    if cut < 0:
+        return buffer[-4096:]
+    for m in LINK_RE.finditer(buffer, 0, cut):
+        link = m.group(0)
+        if link not in seen:
+            seen.add(link)
+            out.append(link)
+            if len(out) >= limit:
+                break
+    return buffer[max(cut, len(buffer) - 8192):]
+
+
+def summarize(html):
+    # equivalente a: sed 's/<[^>]*>//g' | head -n 3 | tr -d '\n' | cut -c1-200
+    lines = TAG_RE.sub("", html).split("\n")[:3]
+    return "".join(lines)[:SUMMARY_CHARS]
+
+
+async def fetch_links(client, url, timeout):
+    """Lê a página de resultados em streaming até achar MAX_LINKS links."""
+    seen, links, tail = set(), [], ""
+    async with client.stream("GET", url, timeout=timeout) as r:
+        async for chunk in r.aiter_text():
+            tail = extract_links(tail + chunk, seen, links)
+            if len(links) >= MAX_LINKS:
+                break
+        else:
+            extract_links(tail + '"', seen, links)
+    return links
+
+
+async def fetch_summary(client, link, timeout, sem):
+    async with sem:
+        try:
+            data = b""
+            async with client.stream("GET", link, timeout=timeout) as r:
+                async for chunk in r.aiter_bytes():
+                    data += chunk
+                    if len(data) >= SUMMARY_BYTES:
+                        break
+            return summarize(data.decode("utf-8", errors="replace"))
+        except Exception:
+            return ""
+
+
+async def search_source(client, name, url, tor, sem, link_sem):
+    timeout, link_timeout = (20, 10) if tor else (15, 8)
+    result = {"fonte": name, "tor": tor, "url": url, "links": [], "error": None}
+    start = time.perf_counter()
+    async with sem:
+        try:
+            links = await fetch_links(client, url, timeout)
+        except Exception as e:
+            links = []
+            result["error"] = f"{type(e).__name__}: {e}"
+    summaries = await asyncio.gather(*(fetch_summary(client, l, link_timeout, link_sem) for l in links))
+    result["links"] = [{"link": l, "resumo": s} for l, s in zip(links, summaries)]
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+async def search_api(client, name, url, headers, sem):
+    result = {"fonte": name, "tor": False, "api": True, "url": url.split("?")[0], "links": [], "error": None}
+    start = time.perf_counter()
+    async with sem:
+        try:
+            r = await client.get(url, headers=headers, timeout=15)
+            result["http_status"] = r.status_code
+            result["resposta"] = r.text[:SUMMARY_BYTES]
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+async def search_email(email, on_source=None, use_tor=True, should_stop=None):
+    """Consulta todas as fontes; chama on_source(result) conforme cada uma termina."""
+    q = quote(email)
+    headers = {"User-Agent": USER_AGENT}
+    surface = httpx.AsyncClient(headers=headers, follow_redirects=True)
+    tor_client = None
+    if use_tor:
+        try:
+            tor_client = httpx.AsyncClient(headers=headers, follow_redirects=True, proxy=TOR_PROXY)
+        except Exception:
+            # sem suporte a SOCKS (pacote socksio) as fontes Tor ficam de fora
+            tor_client = None
+
+    surface_sem, tor_sem = asyncio.Semaphore(SURFACE_CONCURRENCY), asyncio.Semaphore(TOR_CONCURRENCY)
+    link_sem, tor_link_sem = asyncio.Semaphore(LINK_CONCURRENCY), asyncio.Semaphore(TOR_LINK_CONCURRENCY)
+
+    jobs = []
+    for name, template, tor in SOURCES:
+        if tor and tor_client is None:
+            continue
+        client, sem, lsem = (tor_client, tor_sem, tor_link_sem) if tor else (surface, surface_sem, link_sem)
+        jobs.append(search_source(client, name, template.format(q=q), tor, sem, lsem))
+    for name, template, api_headers, key_env in API_SOURCES:
+        key = os.environ.get(key_env)
+        if not key:
+            continue
+        keys = {key_env: key}
+        url = template.format(q=q, **keys)
+        hdrs = {k: v.format(**keys) for k, v in api_headers.items()}
+        jobs.append(search_api(surface, name, url, hdrs, surface_sem))
+
+    tasks = [asyncio.ensure_future(j) for j in jobs]
+    results = []
+    try:
+        for fut in asyncio.as_completed(tasks):
+            result = await fut
+            results.append(result)
+            if on_source:
+                on_source(result)
+            if should_stop and should_stop():
+                break
+    finally:
+        for t in tasks:
+            t.cancel()
+        await surface.aclose()
+        if tor_client is not None:
+            await tor_client.aclose()
+    return results
+
+
+def run_search(email, on_source=None, use_tor=True, should_stop=None):
+    if httpx is None:
+        raise RuntimeError("httpx não instalado")
+    return asyncio.run(search_email(email, on_source=on_source, use_tor=use_tor, should_stop=should_stop))
+
+
+def main():
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description="Busca de e-mail em fontes abertas e APIs de vazamento")
+    parser.add_argument("email")
+    parser.add_argument("--no-tor", action="store_true", help="pula as fontes .onion/Tor")
+    args = parser.parse_args()
+
+    def show(r):
+        print(json.dumps(r, ensure_ascii=False), flush=True)
+
+    run_search(args.email, on_source=show, use_tor=not args.no_tor)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+"""
+Triagem de documentos (Office, RTF, PDF, HTML) para o MetaWeb.
+
+Usa as bibliotecas direto, sem abrir os CLIs: olevba/oleid para Office,
+rtfobj para RTF, pdfid para PDF e o html.parser da stdlib para HTML. O
+resultado são achados estruturados: macros, ações automáticas,
+JavaScript, objetos embutidos e links externos, mais um nível de risco.
+
+Parsers de documento maliciosos podem travar ou explodir a memória, então
+cada arquivo roda numa pool de processos limitada (DOC_TRIAGE_WORKERS), com
+alarme de DOC_TRIAGE_TIMEOUT segundos e limite de memória (RLIMIT_AS) em
+cada processo. Se o alarme não chega a disparar (parser preso em código C),
+o processo pai mata a pool quando o prazo do arquivo vence e cria outra.
+Os achados ficam em disco por SHA-256
+(runs/doc_triage/<sha256[:2]>/<sha256>.json): o mesmo arquivo não é
+analisado duas vezes.
+"""
+
+import json
+import multiprocessing
+import os
+import re
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from html.parser import HTMLParser
+
+try:
+    from tools.metaweb import hashing
+except ImportError:  # rodando como script: tools/metaweb está no sys.path
+    import hashing
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CACHE_DIR = os.environ.get("DOC_TRIAGE_CACHE", os.path.join(BASE_DIR, "runs", "doc_triage"))
+WORKERS = int(os.environ.get("DOC_TRIAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+TIMEOUT = int(os.environ.get("DOC_TRIAGE_TIMEOUT", "60"))
+MAX_MEMORY_MB = int(os.environ.get("DOC_TRIAGE_MAX_MEMORY_MB", "512"))
+# folga do prazo no processo pai além do alarme de dentro do processo
+KILL_GRACE = 10
+HTML_MAX_BYTES = 8 * 1024 * 1024
+# muda quando o formato dos achados muda: entradas antigas do cache são ignoradas
+VERSION = 1
+
+OFFICE_EXTENSIONS = {
+    ".doc", ".docx", ".docm", ".dot", ".dotm", ".xls", ".xlsx", ".xlsm", ".xlsb", ".xlt", ".xltm",
+    ".ppt", ".pptx", ".pptm", ".pps", ".ppsm",
+}
+PDF_AUTO_ACTIONS = ("/OpenAction", "/AA", "/Launch")
+PDF_EMBEDDED = ("/EmbeddedFile", "/RichMedia", "/XFA", "/AcroForm", "/JBIG2Decode", "/ObjStm", "/Encrypt")
+# atributos on* que contam como handler de evento (o resto é lixo de parsing)
+HTML_EVENTS = {
+    "onload", "onerror", "onclick", "ondblclick", "onmouseover", "onmouseout", "onmousedown", "onmouseup",
+    "onmousemove", "onfocus", "onblur", "onsubmit", "onchange", "oninput", "onkeydown", "onkeyup",
+    "onkeypress", "onbeforeunload", "onunload", "onpageshow", "onhashchange", "onscroll", "onresize",
+    "onanimationstart", "onanimationend", "ontoggle", "onpointerover", "onpointerdown", "onwheel",
+    "oncopy", "onpaste", "oncontextmenu", "onbegin",
+}
+HTML_SUSPICIOUS_JS = re.compile(r"\b(eval|atob|unescape|document\.write|fromCharCode|WScript|ActiveXObject)\b")
+
+
+def detect_kind(path):
+    """'office', 'rtf', 'pdf', 'html' ou None, pela assinatura (e extensão, para OOXML/HTML)."""
+    with open(path, "rb") as f:
+        head = f.read(2048)
+    ext = os.path.splitext(path)[1].lower()
+    if head.startswith(b"%PDF") or b"%PDF-" in head[:1024]:
+        return "pdf"
+    if head.startswith(b"\xd0\xcf\x11\xe0"):
+        return "office"
+    if head.startswith(b"PK\x03\x04") and (ext in OFFICE_EXTENSIONS or b"[Content_Types].xml" in head):
+        return "office"
+    if head.startswith(b"{\\rt"):
+        return "rtf"
+    lowered = head.lower()
+    if ext in (".html", ".htm", ".xhtml", ".hta") or b"<html" in lowered or b"<!doctype html" in lowered:
+        return "html"
+    return None
+
+
+def _empty_findings():
+    return {
+        "macros": False,
+        "auto_actions": [],
+        "suspicious": [],
+        "javascript": False,
+        "embedded_objects": [],
+        "external_links": [],
+    }
+
+
+# -------------------
+# Analisadores (rodam dentro dos processos da pool)
+# -------------------
+
+def _triage_office(path):
+    from oletools import oleid
+    from oletools.olevba import VBA_Parser
+
+    findings = _empty_findings()
+    indicators = {}
+    try:
+        for ind in oleid.OleID(path).check():
+            if ind.value not in (None, False, "", 0) or ind.risk in ("HIGH", "Medium", "MEDIUM"):
+                indicators[ind.id] = {"name": ind.name, "value": str(ind.value), "risk": str(ind.risk)}
+            if ind.id == "ext_rels" and ind.value:
+                findings["external_links"].append(str(ind.value))
+            if ind.id in ("ObjectPool", "flash") and ind.value:
+                findings["embedded_objects"].append({"type": ind.name, "value": str(ind.value)})
+    except Exception as e:
+        indicators["error"] = {"name": "oleid", "value": f"{type(e).__name__}: {e}", "risk": "unknown"}
+
+    parser = VBA_Parser(path)
+    try:
+        findings["macros"] = bool(parser.detect_vba_macros() or parser.detect_xlm_macros())
+        if findings["macros"]:
+            findings["modules"] = [name for _, _, name, _ in parser.extract_macros()][:100]
+            for kind, keyword, description in parser.analyze_macros():
+                item = {"keyword": keyword, "description": description}
+                if kind == "AutoExec":
+                    findings["auto_actions"].append(item)
+                elif kind in ("Suspicious", "IOC"):
+                    findings["suspicious"].append({"type": kind, **item})
+                    if kind == "IOC" and keyword.lower().startswith(("http://", "https://")):
+                        findings["external_links"].append(keyword)
+            if parser.detect_vba_stomping():
+                findings["suspicious"].append({"type": "Stomping", "keyword": "VBA stomping",
+                                               "description": "p-code difere do código-fonte VBA"})
+    finally:
+        parser.close()
+    return findings, indicators
+
+
+def _triage_rtf(path):
+    from oletools import rtfobj
+
+    findings = _empty_findings()
+    with open(path, "rb") as f:
+        parser = rtfobj.RtfObjParser(f.read())
+    parser.parse()
+    for obj in parser.objects:
+        item = {"offset": obj.start, "size": len(obj.rawdata or b"")}
+        if obj.is_ole:
+            item["class_name"] = (obj.class_name or b"").decode("latin-1", errors="replace")
+            if obj.clsid_desc:
+                item["clsid"] = obj.clsid_desc
+        if obj.is_package:
+            item["filename"] = obj.filename
+        findings["embedded_objects"].append(item)
+        # Equation Editor é o alvo clássico de exploits em RTF
+        if "equation" in item.get("class_name", "").lower():
+            findings["suspicious"].append({"type": "Exploit", "keyword": item["class_name"],
+                                           "description": "objeto Equation Editor (CVE-2017-11882 e afins)"})
+    return findings, {"objects": len(parser.objects)}
+
+
+def _triage_pdf(path):
+    from pdfid import pdfid
+
+    findings = _empty_findings()
+    xml = pdfid.PDFiD(path, allNames=False, extraData=False, disarm=False, force=False)
+    report = json.loads(pdfid.PDFiD2JSON(xml, False))[0]["pdfid"]
+    counts = {k["name"]: k["count"] for k in report.get("keywords", {}).get("keyword", [])}
+    findings["javascript"] = bool(counts.get("/JS") or counts.get("/JavaScript"))
+    findings["auto_actions"] = [{"keyword": k, "count": counts[k]} for k in PDF_AUTO_ACTIONS if counts.get(k)]
+    findings["embedded_objects"] = [{"type": k, "count": counts[k]} for k in PDF_EMBEDDED if counts.get(k)]
+    if findings["javascript"] and findings["auto_actions"]:
+        findings["suspicious"].append({"type": "Suspicious", "keyword": "JavaScript + ação automática",
+                                       "description": "JavaScript executado ao abrir o documento"})
+    return findings, {"header": report.get("header"), "pages": counts.get("/Page", 0), "keywords": counts}
+
+
+class _HtmlScanner(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.scripts = 0
+        self.external_scripts = []
+        self.event_handlers = set()
+        self.iframes = []
+        self.forms = []
+        self.refresh = None
+        self.links = set()
+        self.js_text = []
+        self._in_script = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {k.lower(): (v or "") for k, v in attrs}
+        self.event_handlers.update(name for name in attrs if name in HTML_EVENTS)
+        if tag == "script":
+            self.scripts += 1
+            self._in_script = True
+            if attrs.get("src"):
+                self.external_scripts.append(attrs["src"])
+        elif tag in ("iframe", "frame", "embed", "object"):
+            self.iframes.append({"tag": tag, "src": attrs.get("src") or attrs.get("data") or ""})
+        elif tag == "form":
+            self.forms.append(attrs.get("action", ""))
+        elif tag == "meta" and attrs.get("http-equiv", "").lower() == "refresh":
+            self.refresh = attrs.get("content")
+        for key in ("href", "src", "action"):
+            value = attrs.get(key, "")
+            if value.startswith(("http://", "https://", "//")):
+                self.links.add(value)
+            elif value.lower().startswith("javascript:"):
+                self.js_text.append(value)
+
+    def handle_endtag(self, tag):
+        if tag == "script":
+            self._in_script = False
+
+    def handle_data(self, data):
+        if self._in_script:
+            self.js_text.append(data)
+
+
+def _triage_html(path):
+    findings = _empty_findings()
+    with open(path, "rb") as f:
+        text = f.read(HTML_MAX_BYTES).decode("utf-8", errors="replace")
+    scanner = _HtmlScanner()
+    scanner.feed(text)
+    scanner.close()
+    findings["javascript"] = bool(scanner.scripts or scanner.event_handlers or scanner.js_text)
+    findings["embedded_objects"] = scanner.iframes
+    findings["external_links"] = sorted(scanner.links)[:200]
+    if scanner.refresh:
+        findings["auto_actions"].append({"keyword": "meta refresh", "description": scanner.refresh})
+    for handler in ("onload", "onerror", "onmouseover"):
+        if handler in scanner.event_handlers:
+            findings["auto_actions"].append({"keyword": handler, "description": "handler executado sem clique"})
+    for word in sorted(set(HTML_SUSPICIOUS_JS.findall("\n".join(scanner.js_text)))):
+        findings["suspicious"].append({"type": "Suspicious", "keyword": word, "description": "ofuscação/execução em script"})
+    for action in scanner.forms:
+        if action.startswith(("http://", "https://", "//")):
+            findings["suspicious"].append({"type": "IOC", "keyword": action, "description": "formulário envia para fora"})
+    indicators = {
+        "scripts": scanner.scripts,
+        "external_scripts": scanner.external_scripts[:50],
+        "event_handlers": sorted(scanner.event_handlers),
+        "forms": len(scanner.forms),
+    }
+    return findings, indicators
+
+
+ANALYZERS = {"office": _triage_office, "rtf": _triage_rtf, "pdf": _triage_pdf, "html": _triage_html}
+
+
+def risk_level(findings):
+    if findings["macros"] and findings["auto_actions"]:
+        return "high"
+    if any(s["type"] in ("Exploit", "Stomping") for s in findings["suspicious"]):
+        return "high"
+    if findings["javascript"] and findings["auto_actions"]:
+        return "high"
+    if findings["macros"] or findings["suspicious"] or findings["embedded_objects"]:
+        return "medium"
+    return "low"
+
+
+def analyze_document(path, kind=None):
+    """Triagem de um arquivo no processo atual (sem pool, sem cache)."""
+    kind = kind or detect_kind(path)
+    if kind is None:
+        return {"kind": None}
+    findings, indicators = ANALYZERS[kind](path)
+    return {"kind": kind, "risk": risk_level(findings), "findings": findings, "indicators": indicators}
+
+
+# -------------------
+# Pool: timeout e limite de memória por processo
+# -------------------
+
+def _alarm(signum, frame):
+    raise TimeoutError(f"triagem passou de {TIMEOUT}s")
+
+
+def _init_worker(max_memory_mb):
+    try:
+        import resource
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+        # o limite é de espaço de endereçamento: o que o processo já mapeou + a folga
+        limit = current + max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, OSError, ValueError):
+        pass  # sem /proc ou sem resource (não-Linux): só o timeout protege
+    signal.signal(signal.SIGALRM, _alarm)
+
+
+def _worker(path, kind, timeout):
+    start = time.perf_counter()
+    signal.alarm(timeout)
+    try:
+        result = analyze_document(path, kind)
+    except MemoryError:
+        result = {"kind": kind, "error": f"limite de memória ({MAX_MEMORY_MB} MB) excedido"}
+    except Exception as e:
+        result = {"kind": kind, "error": f"{type(e).__name__}: {e}"}
+    finally:
+        signal.alarm(0)
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _mp_context():
+    # forkserver (ou spawn): fork() do worker web, que tem várias threads, pode herdar locks presos
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=_mp_context(),
+                                        initializer=_init_worker, initargs=(MAX_MEMORY_MB,))
+    return _pool
+
+
+def _reset_pool(broken):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _kill_pool(pool):
+    """Mata os processos da pool (shutdown sozinho espera o parser travado) e a descarta."""
+    for proc in list((getattr(pool, "_processes", None) or {}).values()):
+        try:
+            proc.kill()
+        except (OSError, ValueError):
+            pass
+    _reset_pool(pool)
+
+
+def _cache_path(sha256):
+    return os.path.join(CACHE_DIR, sha256[:2], sha256 + ".json")
+
+
+def cache_get(sha256):
+    try:
+        with open(_cache_path(sha256), encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if data.get("version") == VERSION else None
+
+
+def cache_put(sha256, result):
+    path = _cache_path(sha256)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({**result, "version": VERSION}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _submit(path, kind):
+    pool = get_pool()
+    try:
+        return pool, pool.submit(_worker, path, kind, TIMEOUT)
+    except (BrokenProcessPool, RuntimeError):
+        _reset_pool(pool)
+        pool = get_pool()
+        return pool, pool.submit(_worker, path, kind, TIMEOUT)
+
+
+def _collect(pool, fut, kind):
+    """Resultado de um future já concluído; None se a pool morreu e vale tentar de novo."""
+    try:
+        return fut.result()
+    except (BrokenProcessPool, CancelledError):
+        # processo morto (OOM killer, crash do parser, pool morta por prazo vencido):
+        # a pool é recriada
+        _reset_pool(pool)
+        return None
+
+
+def triage_many(paths, on_result=None, should_stop=None, sha256s=None):
+    """
+    Triagem de vários arquivos na pool; arquivos que não são documentos são
+    pulados e achados já em cache saem sem reanálise. on_result(result)
+    é chamado na ordem de conclusão; cada result traz path e sha256.
+
+    Cada arquivo tem prazo de DOC_TRIAGE_TIMEOUT + KILL_GRACE segundos a partir
+    de quando começa a rodar; vencido o prazo, a pool é morta. Arquivos que
+    perderam o processo por causa de outro são reenviados uma vez.
+    """
+    sha256s = sha256s or {}
+    results = []
+    pending = {}  # future -> (pool, path, sha256, kind, tentativas)
+    deadlines = {}
+
+    def done(result):
+        results.append(result)
+        if on_result:
+            on_result(result)
+
+    def submit(path, sha256, kind, attempts=0):
+        pool, fut = _submit(path, kind)
+        pending[fut] = (pool, path, sha256, kind, attempts)
+
+    for path in paths:
+        if should_stop and should_stop():
+            break
+        try:
+            kind = detect_kind(path)
+        except OSError as e:
+            done({"path": path, "kind": None, "error": str(e)})
+            continue
+        if kind is None:
+            continue
+        sha256 = sha256s.get(path) or hashing.hash_file(path, ("sha256",))["sha256"]
+        cached = cache_get(sha256)
+        if cached is not None:
+            cached.pop("version", None)
+            done({**cached, "path": path, "sha256": sha256, "cached": True})
+            continue
+        submit(path, sha256, kind)
+
+    while pending:
+        now = time.monotonic()
+        for fut in pending:
+            if fut not in deadlines and fut.running():
+                deadlines[fut] = now + TIMEOUT + KILL_GRACE
+        # acorda no prazo mais próximo, e ao menos a cada segundo para ver quem começou a rodar
+        timeout = min([1.0] + [max(0.0, d - now) for d in deadlines.values()])
+        finished, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+        for fut in finished:
+            pool, path, sha256, kind, attempts = pending.pop(fut)
+            deadlines.pop(fut, None)
+            result = _collect(pool, fut, kind)
+            if result is None:
+                if attempts == 0:
+                    submit(path, sha256, kind, attempts + 1)
+                    continue
+                result = {"kind": kind, "error": "processo de triagem morreu"}
+            if "error" not in result:
+                cache_put(sha256, result)
+            done({**result, "path": path, "sha256": sha256, "cached": False})
+
+        now = time.monotonic()
+        expired = [fut for fut, d in deadlines.items() if d <= now and not fut.done()]
+        for fut in expired:
+            pool, path, sha256, kind, _ = pending.pop(fut)
+            deadlines.pop(fut)
+            _kill_pool(pool)
+            done({"kind": kind, "error": f"sem resposta em {TIMEOUT}s", "path": path, "sha256": sha256,
+                  "cached": False})
+
+        if should_stop and should_stop():
+            for fut in pending:
+                fut.cancel()
+            break
+    return results
+
+
+def triage(path, sha256=None):
+    """Um arquivo (pool + cache); {'kind': None} se não for documento."""
+    results = triage_many([path], sha256s={path: sha256} if sha256 else None)
+    return results[0] if results else {"kind": None, "path": path}
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Triagem de documentos (Office, RTF, PDF, HTML)")
+    parser.add_argument("paths", nargs="+", help="arquivos ou diretórios")
+    args = parser.parse_args()
+
+    files = []
+    for p in args.paths:
+        if os.path.isdir(p):
+            for root, _, names in os.walk(p):
+                files += [os.path.join(root, n) for n in names]
+        else:
+            files.append(p)
+
+    start = time.perf_counter()
+    results = triage_many(files, on_result=lambda r: print(json.dumps(r, ensure_ascii=False), flush=True))
+    print(f"[*] {len(results)} documentos em {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
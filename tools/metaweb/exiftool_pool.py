@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Pool de processos `exiftool -stay_open True -@ -`.
+
+Abrir o exiftool custa a partida do Perl e o carregamento dos módulos a
+cada arquivo; no modo stay_open o mesmo processo atende pedido após pedido
+pela entrada padrão. Cada pedido vai com -execute<n> e a resposta (JSON,
+-j -G) termina na linha {ready<n>}. Processos que morrem ou estouram o
+timeout são descartados e recriados no próximo pedido.
+"""
+
+import atexit
+import json
+import os
+import queue
+import selectors
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_POOL_SIZE = int(os.environ.get("EXIFTOOL_POOL_SIZE", "2"))
+DEFAULT_TIMEOUT = float(os.environ.get("EXIFTOOL_TIMEOUT", "30"))
+# quantos arquivos vão num único -execute em metadata_many
+DEFAULT_BATCH = int(os.environ.get("EXIFTOOL_BATCH", "32"))
+
+# argumentos de todos os pedidos: JSON, tags com o grupo, nomes de arquivo em UTF-8
+COMMON_ARGS = ("-j", "-G", "-charset", "filename=utf8")
+
+
+class ExifToolError(Exception):
+    pass
+
+
+class ExifToolTimeout(ExifToolError):
+    pass
+
+
+class ExifToolProcess:
+    """Um exiftool em modo stay_open; não é thread-safe (o pool serializa o uso)."""
+
+    def __init__(self, exe):
+        self.exe = exe
+        self._n = 0
+        self.proc = subprocess.Popen(
+            [exe, "-stay_open", "True", "-@", "-", "-common_args", *COMMON_ARGS],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._buf = b""
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def execute(self, args, timeout=DEFAULT_TIMEOUT):
+        """Roda um pedido e devolve a saída (bytes) até a marca {ready<n>}."""
+        for arg in args:
+            if "\n" in arg or "\r" in arg:
+                raise ExifToolError("argumento com quebra de linha")
+        self._n += 1
+        marker = f"{{ready{self._n}}}".encode()
+        payload = "".join(a + "\n" for a in args) + f"-execute{self._n}\n"
+        try:
+            self.proc.stdin.write(payload.encode("utf-8"))
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise ExifToolError(f"exiftool fechou a entrada: {e}")
+
+        fd = self.proc.stdout.fileno()
+        deadline = time.monotonic() + timeout
+        with selectors.DefaultSelector() as sel:
+            sel.register(fd, selectors.EVENT_READ)
+            while True:
+                end = self._buf.find(marker)
+                if end >= 0:
+                    out, self._buf = self._buf[:end], self._buf[end + len(marker):].lstrip(b"\r\n")
+                    return out
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ExifToolTimeout(f"timeout de {timeout}s no exiftool")
+                if not sel.select(remaining):
+                    continue
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    raise ExifToolError("exiftool terminou inesperadamente")
+                self._buf += chunk
+
+    def close(self, timeout=2):
+        if self.alive():
+            try:
+                self.proc.stdin.write(b"-stay_open\nFalse\n")
+                self.proc.stdin.flush()
+                self.proc.wait(timeout=timeout)
+            except Exception:
+                pass
+        self.kill()
+
+    def kill(self):
+        if self.alive():
+            self.proc.kill()
+        try:
+            self.proc.wait(timeout=2)
+        except Exception:
+            pass
+
+
+class ExifToolPool:
+    def __init__(self, size=DEFAULT_POOL_SIZE, exe=None, timeout=DEFAULT_TIMEOUT):
+        self.size = max(1, size)
+        self.exe = exe or shutil.which("exiftool")
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._idle = queue.LifoQueue()
+        self.restarts = 0
+
+    def available(self):
+        return bool(self.exe)
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            proc = self._idle.get_nowait()
+            if proc.alive():
+                return proc
+            self.restarts += 1
+        except queue.Empty:
+            pass
+        try:
+            return ExifToolProcess(self.exe)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, proc, broken=False):
+        if broken or not proc.alive():
+            # processo travado ou morto: descarta; o próximo pedido abre outro
+            proc.kill()
+            self.restarts += 1
+        else:
+            self._idle.put(proc)
+        self._slots.release()
+
+    def execute(self, args, retries=1):
+        if not self.exe:
+            raise ExifToolError("exiftool não encontrado")
+        for attempt in range(retries + 1):
+            proc = self._acquire()
+            try:
+                out = proc.execute(args, timeout=self.timeout)
+            except ExifToolError as e:
+                self._release(proc, broken=True)
+                # processo morto pode ter sido um ocioso que caiu: tenta de novo;
+                # timeout é o arquivo, outro processo travaria igual
+                if attempt >= retries or isinstance(e, ExifToolTimeout):
+                    raise
+                continue
+            self._release(proc)
+            return out
+
+    def metadata_many(self, paths, extra_args=()):
+        """Metadados (dict por arquivo, na ordem de paths) num único pedido."""
+        if not paths:
+            return []
+        out = self.execute([*extra_args, *paths])
+        try:
+            items = json.loads(out.decode("utf-8", errors="replace") or "[]")
+        except ValueError:
+            raise ExifToolError("resposta inválida do exiftool")
+        by_name = {item.get("SourceFile"): item for item in items}
+        return [by_name.get(p, {"SourceFile": p, "Error": "sem resposta do exiftool"}) for p in paths]
+
+    def metadata(self, path, extra_args=()):
+        return self.metadata_many([path], extra_args)[0]
+
+    def metadata_batch(self, paths, batch=DEFAULT_BATCH, extra_args=()):
+        """
+        Muitos arquivos: divide em lotes de `batch` e distribui pelos
+        processos do pool em paralelo. Devolve os dicts na ordem de paths.
+        """
+        def work(chunk):
+            try:
+                return self.metadata_many(chunk, extra_args)
+            except ExifToolError as e:
+                return [{"SourceFile": p, "Error": str(e)} for p in chunk]
+
+        chunks = [paths[i:i + batch] for i in range(0, len(paths), batch)]
+        with ThreadPoolExecutor(max_workers=self.size) as pool:
+            return [item for chunk in pool.map(work, chunks) for item in chunk]
+
+    def close(self):
+        while True:
+            try:
+                proc = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            proc.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExifToolPool()
+            atexit.register(_pool.close)
+    return _pool
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Metadados via pool de exiftool -stay_open")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--size", type=int, default=DEFAULT_POOL_SIZE)
+    args = parser.parse_args()
+
+    pool = ExifToolPool(size=args.size)
+    if not pool.available():
+        raise SystemExit("exiftool não encontrado")
+    start = time.perf_counter()
+    for item in pool.metadata_batch(args.files):
+        print(json.dumps(item, ensure_ascii=False))
+    print(f"[*] {len(args.files)} arquivos em {time.perf_counter() - start:.2f}s", flush=True)
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
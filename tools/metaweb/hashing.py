@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Hashes de arquivos: todos os digests numa única passada.
+
+O arquivo é mapeado em memória (mmap) e percorrido em blocos grandes; cada
+bloco alimenta todos os digests pedidos antes de seguir para o próximo, então
+o disco é lido uma vez só. O hashlib solta o GIL em blocos grandes, e acima
+de THREAD_THRESHOLD cada digest roda numa thread própria sobre o mesmo bloco
+(md5, sha1 e sha256 ao mesmo tempo em vez de um depois do outro).
+"""
+
+import hashlib
+import mmap
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_ALGORITHMS = ("md5", "sha1", "sha256")
+CHUNK_SIZE = int(os.environ.get("HASH_CHUNK_BYTES", str(4 * 1024 * 1024)))
+# a partir deste tamanho os digests rodam em paralelo, um por thread
+THREAD_THRESHOLD = int(os.environ.get("HASH_THREAD_THRESHOLD", str(64 * 1024 * 1024)))
+# intervalo entre avisos de progresso (bytes)
+PROGRESS_BYTES = int(os.environ.get("HASH_PROGRESS_BYTES", str(256 * 1024 * 1024)))
+
+
+class MultiHasher:
+    """Vários digests alimentados pelos mesmos blocos."""
+
+    def __init__(self, algorithms=DEFAULT_ALGORITHMS, executor=None):
+        self.hashers = {name: hashlib.new(name) for name in algorithms}
+        self.size = 0
+        self._executor = executor
+
+    def update(self, data):
+        if self._executor is not None and len(self.hashers) > 1:
+            list(self._executor.map(lambda h: h.update(data), self.hashers.values()))
+        else:
+            for h in self.hashers.values():
+                h.update(data)
+        self.size += len(data)
+
+    def hexdigests(self):
+        return {"size": self.size, **{name: h.hexdigest() for name, h in self.hashers.items()}}
+
+
+def _blocks(f, size, chunk_size):
+    """Blocos do arquivo: fatias de um mmap ou, se não der para mapear, read()."""
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+    except (OSError, ValueError):
+        mm = None
+    if mm is None:
+        while chunk := f.read(chunk_size):
+            yield chunk
+        return
+    with mm, memoryview(mm) as view:
+        if hasattr(mm, "madvise"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        for offset in range(0, len(mm), chunk_size):
+            block = view[offset:offset + chunk_size]
+            try:
+                yield block
+            finally:
+                block.release()
+
+
+def hash_file(path, algorithms=DEFAULT_ALGORITHMS, on_progress=None, chunk_size=CHUNK_SIZE,
+              threaded=None):
+    """
+    Devolve {"size": n, "<algoritmo>": hexdigest, ...}. on_progress(feitos,
+    total) é chamado a cada PROGRESS_BYTES e no fim, só para arquivos maiores
+    que PROGRESS_BYTES. threaded=None decide pelo tamanho do arquivo.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if threaded is None:
+            threaded = size >= THREAD_THRESHOLD and len(algorithms) > 1
+        executor = ThreadPoolExecutor(max_workers=len(algorithms), thread_name_prefix="hash") if threaded else None
+        try:
+            hasher = MultiHasher(algorithms, executor)
+            report = on_progress if on_progress and size > PROGRESS_BYTES else None
+            next_report = PROGRESS_BYTES
+            for block in _blocks(f, size, chunk_size):
+                hasher.update(block)
+                if report and hasher.size >= next_report:
+                    report(hasher.size, size)
+                    next_report += PROGRESS_BYTES
+            if report:
+                report(hasher.size, size)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+    return hasher.hexdigests()
+
+
+def main():
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description="md5/sha1/sha256 numa passada")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--algorithms", default=",".join(DEFAULT_ALGORITHMS))
+    args = parser.parse_args()
+    algorithms = tuple(a.strip() for a in args.algorithms.split(",") if a.strip())
+    for path in args.files:
+        start = time.perf_counter()
+        result = hash_file(path, algorithms)
+        result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        print(json.dumps({"file": path, **result}))
+
+
+if __name__ == "__main__":
+    main()
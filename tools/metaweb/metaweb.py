@@ -1,72 +1,515 @@
 #!/usr/bin/env python3
+"""
+MetaWeb - análise de metadados de arquivos.
+
+Pode ser usado como script (--file/--target, saída em linhas prefixadas)
+ou como biblioteca: analyze(path, on_result) roda os extratores ao mesmo
+tempo numa pool de threads e entrega um resultado JSON por extrator, com
+tempo, assim que cada um termina.
+
+A camada padrão fica no processo: hashes, tipo pelo conteúdo (libmagic),
+metadados pelo hachoir (dimensões, GPS, câmera, datas, codecs), regras
+YARA (yara_scan) e triagem de documentos (doc_triage). exiftool e
+mediainfo abrem processos externos e só rodam na varredura profunda
+(deep=True / --deep).
+"""
 import argparse
+import json
+import mimetypes
 import os
-import sys
+import shutil
 import subprocess
-import hashlib
-import mimetypes
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import magic
+except ImportError:  # dependência opcional: sem python-magic o MIME vem da extensão
+    magic = None
+
+try:
+    from hachoir.core import config as hachoir_config
+    from hachoir.metadata import extractMetadata
+    from hachoir.parser import createParser
+    hachoir_config.quiet = True
+except ImportError:  # dependência opcional
+    createParser = None
+
+try:
+    from tools.metaweb import doc_triage, exiftool_pool, hashing, yara_scan
+except ImportError:  # rodando como script: tools/metaweb está no sys.path
+    import doc_triage
+    import exiftool_pool
+    import hashing
+    import yara_scan
+
+MEDIAINFO_TIMEOUT = float(os.environ.get("MEDIAINFO_TIMEOUT", "60"))
+MAGIC_BYTES = 8192
+# --target: limite do download e quanto baixar no modo só-metadados
+DOWNLOAD_MAX_BYTES = int(os.environ.get("METAWEB_MAX_DOWNLOAD_BYTES", str(200 * 1024 * 1024)))
+HEAD_BYTES = int(os.environ.get("METAWEB_HEAD_BYTES", str(256 * 1024)))
+DOWNLOAD_TIMEOUT = float(os.environ.get("METAWEB_DOWNLOAD_TIMEOUT", "30"))
+DOWNLOAD_CHUNK = 1024 * 1024
+DOWNLOAD_PROGRESS_BYTES = 8 * 1024 * 1024
+# threads compartilhadas entre análises (cada análise usa uma por extrator)
+METAWEB_WORKERS = int(os.environ.get("METAWEB_WORKERS", "8"))
+
+
+class ExtractorUnavailable(Exception):
+    """A ferramenta externa do extrator não está instalada."""
+
+
+class DownloadError(Exception):
+    pass
+
+
+class DownloadTooLarge(DownloadError):
+    pass
+
+
+class DownloadCancelled(DownloadError):
+    pass
 
-def file_hashes(path):
-    hashes = {"md5": hashlib.md5(), "sha1": hashlib.sha1(), "sha256": hashlib.sha256()}
+
+def file_hashes(path, on_progress=None):
+    hashes = hashing.hash_file(path, ("md5", "sha1", "sha256"), on_progress=on_progress)
+    hashes.pop("size")
+    return hashes
+
+
+# -------------------
+# Extratores: (path, on_progress) -> dict (JSON)
+# -------------------
+
+def extract_hashes(path, on_progress=None):
+    return hashing.hash_file(path, ("md5", "sha1", "sha256"), on_progress=on_progress)
+
+
+def extract_mime(path, on_progress=None):
+    """Tipo pelo conteúdo (libmagic nos primeiros bytes); a extensão fica como referência."""
+    by_ext, encoding = mimetypes.guess_type(path)
+    if magic is None:
+        return {"mime": by_ext, "encoding": encoding, "source": "extension"}
     with open(path, "rb") as f:
-        while chunk := f.read(8192):
-            for h in hashes.values():
-                h.update(chunk)
-    return {k: v.hexdigest() for k, v in hashes.items()}
+        head = f.read(MAGIC_BYTES)
+    mime = magic.from_buffer(head, mime=True)
+    data = {"mime": mime, "description": magic.from_buffer(head), "extension_mime": by_ext, "source": "magic"}
+    # .jpg que na verdade é outra coisa vale um aviso na triagem
+    data["extension_mismatch"] = bool(by_ext and mime and by_ext != mime and not mime.startswith("application/octet"))
+    return data
+
+
+def _plain(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "total_seconds"):
+        return value.total_seconds()
+    return str(value)
+
+
+def _hachoir_items(meta):
+    items = {}
+    for item in meta:
+        values = [_plain(v.value) for v in item.values]
+        if values:
+            items[item.key] = values[0] if len(values) == 1 else values
+    return items
+
+
+def extract_native(path, on_progress=None):
+    """
+    Metadados em Python (hachoir), sem processo externo: dimensões, GPS,
+    câmera, datas e codecs, com os campos principais reunidos em 'summary'.
+    """
+    if createParser is None:
+        raise ExtractorUnavailable("hachoir não instalado")
+    parser = createParser(path)
+    if parser is None:
+        return {"parsed": False, "metadata": {}, "streams": [], "summary": {}}
+    with parser:
+        meta = extractMetadata(parser)
+    if meta is None:
+        return {"parsed": False, "metadata": {}, "streams": [], "summary": {}}
+    items = _hachoir_items(meta)
+    streams = []
+    if hasattr(meta, "iterGroups"):  # vídeo/áudio: um grupo por trilha
+        for group in meta.iterGroups():
+            streams.append({"name": group.header, **_hachoir_items(group)})
+    summary = {}
+    for field, keys in NATIVE_SUMMARY.items():
+        found = {k: items[k] for k in keys if k in items}
+        if found:
+            summary[field] = found
+    codecs = [s["compression"] for s in streams if "compression" in s]
+    if codecs:
+        summary["codecs"] = codecs
+    return {"parsed": True, "metadata": items, "streams": streams, "summary": summary}
+
+
+def extract_yara(path, on_progress=None):
+    """Regras YARA (cache de regras compiladas, varredura por mmap)."""
+    try:
+        rules, _ = yara_scan.get_cache().get()
+    except yara_scan.YaraUnavailable as e:
+        raise ExtractorUnavailable(str(e))
+    return {"matches": yara_scan.match(path, rules=rules)}
+
+
+def extract_document(path, on_progress=None):
+    """Triagem de Office/RTF/PDF/HTML (pool com timeout e cache por hash); outros tipos passam direto."""
+    if doc_triage.detect_kind(path) is None:
+        return {"kind": None}
+    result = doc_triage.triage(path)
+    if result.get("error"):
+        raise RuntimeError(result["error"])
+    return result
+
+
+def extract_exif(path, on_progress=None):
+    pool = exiftool_pool.get_pool()
+    if not pool.available():
+        raise ExtractorUnavailable("exiftool não encontrado")
+    tags = pool.metadata(path)
+    tags.pop("SourceFile", None)
+    return {"tags": tags}
+
+
+def extract_mediainfo(path, on_progress=None):
+    exe = shutil.which("mediainfo")
+    if not exe:
+        raise ExtractorUnavailable("mediainfo não encontrado")
+    proc = subprocess.run(
+        [exe, "--Output=JSON", path], capture_output=True, text=True, timeout=MEDIAINFO_TIMEOUT,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip() or f"mediainfo saiu com código {proc.returncode}")
+    try:
+        media = json.loads(proc.stdout).get("media") or {}
+        return {"tracks": media.get("track") or []}
+    except ValueError:
+        # versões antigas sem saída JSON
+        return {"text": proc.stdout}
+
+
+EXTRACTORS = {
+    "hashes": extract_hashes,
+    "mime": extract_mime,
+    "native": extract_native,
+    "yara": extract_yara,
+    "document": extract_document,
+    "exif": extract_exif,
+    "mediainfo": extract_mediainfo,
+}
+# exiftool/mediainfo abrem processos externos: só na varredura profunda
+FAST_EXTRACTORS = ("hashes", "mime", "native", "yara", "document")
+DEEP_EXTRACTORS = ("exif", "mediainfo")
+
+# campos do hachoir reunidos no resumo do extrator native
+NATIVE_SUMMARY = {
+    "dimensions": ("width", "height", "image_orientation"),
+    "camera": ("camera_manufacturer", "camera_model", "camera_exposure", "camera_aperture", "iso_speed_ratings"),
+    "gps": ("latitude", "longitude", "altitude"),
+    "dates": ("creation_date", "date_time_original", "date_time_digitized", "last_modification"),
+    "media": ("duration", "frame_rate", "compression", "sample_rate", "nb_channel", "bit_rate"),
+    "software": ("producer",),
+}
+
+
+def run_extractor(name, path, on_progress=None):
+    """
+    Roda um extrator e devolve o resultado tipado, com tempo e status.
+    on_progress(extrator, feitos, total) só é chamado por extratores longos
+    (hashes de arquivos grandes), na thread do extrator.
+    """
+    result = {"extractor": name, "status": "ok", "elapsed_ms": None, "data": None, "error": None}
+    progress = (lambda done, total: on_progress(name, done, total)) if on_progress else None
+    start = time.perf_counter()
+    try:
+        result["data"] = EXTRACTORS[name](path, on_progress=progress)
+    except ExtractorUnavailable as e:
+        result["status"], result["error"] = "unavailable", str(e)
+    except Exception as e:
+        result["status"], result["error"] = "error", f"{type(e).__name__}: {e}"
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=METAWEB_WORKERS, thread_name_prefix="metaweb")
+    return _executor
+
+
+def extractor_names(deep=False):
+    return list(FAST_EXTRACTORS + DEEP_EXTRACTORS) if deep else list(FAST_EXTRACTORS)
+
+
+def analyze(path, on_result=None, extractors=None, executor=None, on_progress=None, deep=False):
+    """
+    Roda os extratores em paralelo; on_result(result) é chamado na thread
+    de quem chamou, na ordem em que eles terminam. Sem extractors, roda a
+    camada nativa e, com deep=True, também exiftool e mediainfo.
+    """
+    names = list(extractors or extractor_names(deep))
+    executor = executor or get_executor()
+    start = time.perf_counter()
+    futures = [executor.submit(run_extractor, name, path, on_progress) for name in names]
+    results = {}
+    for fut in as_completed(futures):
+        result = fut.result()
+        results[result["extractor"]] = result
+        if on_result:
+            on_result(result)
+    return {
+        "file": {"name": os.path.basename(path), "size": os.path.getsize(path)},
+        "results": results,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+def format_lines(result):
+    """Linhas no formato antigo do script ([HASH], [MIME], [EXIF], [MEDIAINFO])."""
+    name, data = result["extractor"], result["data"]
+    label = name.upper()
+    if result["status"] == "unavailable":
+        return [f"[WARN] {result['error']}, pulando {label}."]
+    if result["status"] == "error":
+        return [f"[ERRO] {label}: {result['error']}"]
+    if name == "download":
+        lines = [f"[DOWNLOAD] {data['bytes']} bytes (HTTP {data['http_status']}, {data['content_type'] or '?'})"]
+        if not data["complete"]:
+            total = data["content_length"]
+            lines.append(f"[DOWNLOAD] só o início do arquivo (total: {total if total is not None else '?'} bytes); sem hashes")
+        return lines
+    if name == "hashes":
+        return [f"[HASH] {k}: {data[k]}" for k in ("md5", "sha1", "sha256") if k in data]
+    if name == "mime":
+        line = f"[MIME] {data['mime'] or 'desconhecido'}"
+        if data.get("description"):
+            line += f" ({data['description']})"
+        lines = [line]
+        if data.get("extension_mismatch"):
+            lines.append(f"[WARN] extensão indica {data['extension_mime']}, conteúdo é {data['mime']}")
+        return lines
+    if name == "yara":
+        if not data["matches"]:
+            return ["[YARA] nenhuma regra casou"]
+        return [
+            f"[YARA] {m['namespace']}:{m['rule']}"
+            + (f" - {m['meta']['description']}" if m["meta"].get("description") else "")
+            + (f" [{m['meta']['severity']}]" if m["meta"].get("severity") else "")
+            for m in data["matches"]
+        ]
+    if name == "document":
+        if not data["kind"]:
+            return []
+        f = data["findings"]
+        lines = [f"[DOC] {data['kind']}: risco {data['risk']}" + (" (cache)" if data.get("cached") else "")]
+        if f["macros"]:
+            lines.append(f"[DOC] macros: {', '.join(f.get('modules', [])) or 'sim'}")
+        if f["javascript"]:
+            lines.append("[DOC] contém JavaScript")
+        lines += [f"[DOC] ação automática: {a['keyword']}" for a in f["auto_actions"]]
+        lines += [f"[DOC] {s['type']}: {s['keyword']} - {s['description']}" for s in f["suspicious"]]
+        lines += [f"[DOC] objeto embutido: {json.dumps(o, ensure_ascii=False)}" for o in f["embedded_objects"]]
+        lines += [f"[DOC] link externo: {l}" for l in f["external_links"][:20]]
+        return lines
+    if name == "native":
+        lines = [f"[META] {k}: {v}" for k, v in data["metadata"].items()]
+        for stream in data["streams"]:
+            lines += [f"[META] {stream['name']} {k}: {v}" for k, v in stream.items() if k != "name"]
+        if "gps" in data["summary"]:
+            gps = data["summary"]["gps"]
+            lines.append(f"[GPS] {gps.get('latitude')}, {gps.get('longitude')}")
+        return lines
+    if name == "exif":
+        return [f"[EXIF] {k}: {v}" for k, v in data["tags"].items()]
+    if name == "mediainfo":
+        if "text" in data:
+            return [f"[MEDIAINFO] {line.strip()}" for line in data["text"].splitlines() if line.strip()]
+        lines = []
+        for track in data["tracks"]:
+            kind = track.get("@type", "?")
+            lines += [f"[MEDIAINFO] {kind} {k}: {v}" for k, v in track.items() if not k.startswith("@")]
+        return lines
+    return [f"[{label}] {json.dumps(data, ensure_ascii=False)}"]
+
+
+# -------------------
+# --target: download em streaming, com limite
+# -------------------
+
+def _target_suffix(url):
+    from urllib.parse import urlsplit
+    ext = os.path.splitext(urlsplit(url).path)[1]
+    return ext if 0 < len(ext) <= 10 and ext[1:].isalnum() else ""
+
+
+def download(url, dest_dir=None, max_bytes=DOWNLOAD_MAX_BYTES, head_only=False, head_bytes=HEAD_BYTES,
+             on_progress=None, should_stop=None, timeout=DOWNLOAD_TIMEOUT):
+    """
+    Baixa url direto para um arquivo temporário, calculando os hashes
+    enquanto os bytes chegam; nada fica inteiro em memória. Passar de
+    max_bytes (pelo Content-Length ou contando) levanta DownloadTooLarge.
+
+    head_only=True é o modo só-metadados: um HEAD para tamanho e tipo e um
+    GET com Range dos primeiros head_bytes, o que basta para tipo e EXIF.
+    Servidores que ignoram o Range respondem 200; a leitura para no limite.
+
+    Devolve dict com path, bytes, complete, http_status, content_type,
+    content_length e, se o arquivo veio inteiro, hashes.
+    """
+    import requests
+
+    info = {"url": url, "content_type": None, "content_length": None}
+    headers = {}
+    limit = max_bytes
+    if head_only:
+        try:
+            h = requests.head(url, allow_redirects=True, timeout=timeout)
+            if h.ok:
+                info["content_type"] = h.headers.get("Content-Type")
+                info["content_length"] = int(h.headers["Content-Length"]) if "Content-Length" in h.headers else None
+        except (requests.RequestException, ValueError):
+            pass  # sem HEAD: o GET com Range ainda traz o tipo
+        headers["Range"] = f"bytes=0-{head_bytes - 1}"
+        limit = head_bytes
+
+    try:
+        with requests.get(url, headers=headers, stream=True, timeout=timeout) as r:
+            if r.status_code not in (200, 206):
+                raise DownloadError(f"Falha no download: HTTP {r.status_code}")
+            info["content_type"] = r.headers.get("Content-Type") or info["content_type"]
+            length = r.headers.get("Content-Length")
+            length = int(length) if length and length.isdigit() else None
+            if r.status_code == 206:
+                total = r.headers.get("Content-Range", "").rpartition("/")[2]
+                if total.isdigit():
+                    info["content_length"] = int(total)
+            elif length is not None:
+                info["content_length"] = length
+            if not head_only and length is not None and length > max_bytes:
+                raise DownloadTooLarge(f"arquivo de {length} bytes passa do limite de {max_bytes}")
+
+            hasher = hashing.MultiHasher(("md5", "sha1", "sha256"))
+            fd, path = tempfile.mkstemp(prefix=".metaweb_", suffix=_target_suffix(url), dir=dest_dir)
+            truncated = False
+            next_report = DOWNLOAD_PROGRESS_BYTES
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    for chunk in r.iter_content(DOWNLOAD_CHUNK):
+                        if should_stop and should_stop():
+                            raise DownloadCancelled(url)
+                        if hasher.size + len(chunk) > limit:
+                            if not head_only:
+                                raise DownloadTooLarge(f"download passou do limite de {max_bytes} bytes")
+                            chunk = chunk[:limit - hasher.size]
+                            truncated = True
+                        out.write(chunk)
+                        hasher.update(chunk)
+                        if on_progress and hasher.size >= next_report:
+                            on_progress(hasher.size, info["content_length"])
+                            next_report += DOWNLOAD_PROGRESS_BYTES
+                        if truncated:
+                            break
+            except BaseException:
+                os.unlink(path)
+                raise
+    except requests.RequestException as e:
+        raise DownloadError(f"Falha no download: {e}") from e
+
+    size = hasher.size
+    complete = not truncated and (r.status_code == 200 or info["content_length"] == size)
+    info.update(path=path, bytes=size, complete=complete, http_status=r.status_code)
+    if complete:
+        info["hashes"] = hasher.hexdigests()
+    return info
+
 
-def run_tool(cmd, label):
+def analyze_url(url, on_result=None, on_progress=None, should_stop=None, head_only=False,
+                max_bytes=DOWNLOAD_MAX_BYTES, dest_dir=None, deep=False):
+    """
+    Baixa e analisa; os hashes saem do próprio download (sem reler o
+    arquivo). Resultados no mesmo formato de analyze(), mais um 'download'.
+    """
+    start = time.perf_counter()
+    progress = (lambda done, total: on_progress("download", done, total)) if on_progress else None
+    info = download(url, dest_dir=dest_dir, max_bytes=max_bytes, head_only=head_only,
+                    on_progress=progress, should_stop=should_stop)
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+    path = info.pop("path")
     try:
-        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        for line in proc.stdout:
-            print(f"[{label}] {line.strip()}")
-        for line in proc.stderr:
-            print(f"[{label} ERR] {line.strip()}")
-        proc.wait()
-    except FileNotFoundError:
-        print(f"[WARN] {cmd[0]} não encontrado, pulando {label}.")
+        hashes = info.pop("hashes", None)
+        results = {"download": {"extractor": "download", "status": "ok", "elapsed_ms": elapsed_ms,
+                                "data": info, "error": None}}
+        if hashes:
+            results["hashes"] = {"extractor": "hashes", "status": "ok", "elapsed_ms": elapsed_ms,
+                                 "data": hashes, "error": None}
+        if on_result:
+            for result in results.values():
+                on_result(result)
+        report = analyze(path, on_result=on_result, on_progress=on_progress,
+                         extractors=[name for name in extractor_names(deep) if name != "hashes"])
+        report["file"] = {"url": url, "size": info["bytes"]}
+        report["results"] = {**results, **report["results"]}
+        report["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return report
+    finally:
+        os.unlink(path)
 
-def analyze_file(path):
-    print(f"[INFO] Analisando arquivo: {path}")
-    print(f"[INFO] Tamanho: {os.path.getsize(path)} bytes")
 
-    # Hashes
-    hashes = file_hashes(path)
-    for k, v in hashes.items():
-        print(f"[HASH] {k}: {v}")
+def _printer(as_json):
+    def show(result):
+        if as_json:
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+        else:
+            for line in format_lines(result):
+                print(line, flush=True)
+    return show
 
-    mime, _ = mimetypes.guess_type(path)
-    print(f"[MIME] {mime or 'desconhecido'}")
 
-    # ExifTool (metadados avançados)
-    run_tool(["exiftool", path], "EXIF")
+def analyze_file(path, as_json=False, deep=False):
+    if not as_json:
+        print(f"[INFO] Analisando arquivo: {path}")
+        print(f"[INFO] Tamanho: {os.path.getsize(path)} bytes")
+    return analyze(path, on_result=_printer(as_json), deep=deep)
 
-    # MediaInfo (áudio/vídeo)
-    run_tool(["mediainfo", path], "MEDIAINFO")
 
 def main():
     parser = argparse.ArgumentParser(description="MetaWeb - análise de metadados")
     parser.add_argument("--file", help="Arquivo local para análise")
     parser.add_argument("--target", help="URL para download e análise temporária")
+    parser.add_argument("--json", action="store_true", help="um resultado JSON por extrator (NDJSON)")
+    parser.add_argument("--deep", action="store_true", help="varredura profunda: também exiftool e mediainfo")
+    parser.add_argument("--max-bytes", type=int, default=DOWNLOAD_MAX_BYTES, help="limite do download (--target)")
+    parser.add_argument("--head-only", action="store_true",
+                        help="só metadados: baixa apenas o início do arquivo (HEAD + Range)")
     args = parser.parse_args()
 
     if args.file:
         if not os.path.exists(args.file):
             print(f"[ERRO] Arquivo não encontrado: {args.file}")
             sys.exit(1)
-        analyze_file(args.file)
+        analyze_file(args.file, as_json=args.json, deep=args.deep)
     elif args.target:
-        import requests, tempfile
-        print(f"[INFO] Baixando {args.target}...")
-        r = requests.get(args.target, timeout=30)
-        if r.status_code != 200:
-            print(f"[ERRO] Falha no download: HTTP {r.status_code}")
+        print(f"[INFO] Baixando {args.target}...", flush=True)
+        try:
+            analyze_url(args.target, on_result=_printer(args.json), head_only=args.head_only,
+                        max_bytes=args.max_bytes, deep=args.deep)
+        except DownloadError as e:
+            print(f"[ERRO] {e}")
             sys.exit(1)
-        tmp = tempfile.NamedTemporaryFile(delete=False)
-        tmp.write(r.content)
-        tmp.close()
-        print(f"[INFO] Arquivo baixado em {tmp.name}")
-        analyze_file(tmp.name)
-        os.unlink(tmp.name)
     else:
         print("[ERRO] Forneça --file ou --target")
         sys.exit(1)
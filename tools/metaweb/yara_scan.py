@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Varredura YARA dos arquivos do MetaWeb.
+
+As regras (*.yar/*.yara do diretório METAWEB_YARA_RULES, um namespace por
+arquivo) são compiladas uma vez e guardadas em memória e em disco
+(runs/yara/<assinatura>.yarc); qualquer mudança de nome, tamanho ou mtime
+dos arquivos de regras muda a assinatura e força uma nova compilação. Cada
+arquivo é varrido por mmap, sem ler o conteúdo para a memória do Python.
+
+Lotes grandes vão para uma pool de processos do tamanho dos núcleos, reusada
+entre chamadas enquanto as regras não mudam: cada processo carrega as regras
+já compiladas do disco (yara.load) em vez de compilar de novo. Os processos
+nascem de um forkserver, não de fork() do worker (que tem várias threads).
+
+Os resultados ficam em disco por SHA-256 do arquivo e assinatura das regras
+(runs/yara/results/<assinatura>/<sha256[:2]>/<sha256>.json): o mesmo conteúdo
+não é varrido de novo enquanto as regras não mudam.
+"""
+
+import glob
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import yara
+except ImportError:  # dependência opcional
+    yara = None
+
+try:
+    from tools.metaweb import hashing
+except ImportError:  # rodando como script: tools/metaweb está no sys.path
+    import hashing
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RULES_DIR = os.environ.get("METAWEB_YARA_RULES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules"))
+COMPILED_DIR = os.environ.get("METAWEB_YARA_CACHE", os.path.join(BASE_DIR, "runs", "yara"))
+RESULTS_DIR = os.path.join(COMPILED_DIR, "results")
+SCAN_TIMEOUT = int(os.environ.get("METAWEB_YARA_TIMEOUT", "60"))
+# bytes de cada string casada devolvidos no resultado
+MATCH_PREVIEW = 64
+RULE_EXTENSIONS = (".yar", ".yara")
+
+
+class YaraUnavailable(Exception):
+    pass
+
+
+class RuleCache:
+    """Regras compiladas, recompiladas só quando os arquivos de regras mudam."""
+
+    def __init__(self, rules_dir=RULES_DIR, compiled_dir=COMPILED_DIR):
+        self.rules_dir = rules_dir
+        self.compiled_dir = compiled_dir
+        self._rules = None
+        self._signature = None
+        self._compiled_path = None
+        self._lock = threading.Lock()
+
+    def rule_files(self):
+        files = []
+        for ext in RULE_EXTENSIONS:
+            files += glob.glob(os.path.join(self.rules_dir, "*" + ext))
+        return sorted(files)
+
+    def signature(self):
+        h = hashlib.sha256()
+        for path in self.rule_files():
+            st = os.stat(path)
+            h.update(f"{path}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+        return h.hexdigest()
+
+    def get(self):
+        """(regras, caminho do .yarc); compila ou carrega se a assinatura mudou."""
+        if yara is None:
+            raise YaraUnavailable("yara-python não instalado")
+        sig = self.signature()
+        with self._lock:
+            if self._rules is None or sig != self._signature:
+                self._rules, self._compiled_path = self._load_or_compile(sig)
+                self._signature = sig
+            return self._rules, self._compiled_path
+
+    def _load_or_compile(self, sig):
+        files = self.rule_files()
+        if not files:
+            raise YaraUnavailable(f"nenhuma regra YARA em {self.rules_dir}")
+        compiled_path = os.path.join(self.compiled_dir, sig[:32] + ".yarc")
+        if os.path.exists(compiled_path):
+            try:
+                return yara.load(compiled_path), compiled_path
+            except yara.Error:
+                pass  # arquivo corrompido ou de outra versão do libyara: recompila
+        namespaces = {os.path.splitext(os.path.basename(p))[0]: p for p in files}
+        rules = yara.compile(filepaths=namespaces)
+        os.makedirs(self.compiled_dir, exist_ok=True)
+        tmp = f"{compiled_path}.{os.getpid()}.tmp"
+        rules.save(tmp)
+        os.replace(tmp, compiled_path)
+        for old in glob.glob(os.path.join(self.compiled_dir, "*.yarc")):
+            if old != compiled_path:
+                try:
+                    os.unlink(old)
+                except OSError:
+                    pass
+                # resultados das regras antigas não servem mais
+                shutil.rmtree(os.path.join(RESULTS_DIR, rules_key(old)), ignore_errors=True)
+        return rules, compiled_path
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RuleCache()
+    return _cache
+
+
+def available():
+    if yara is None:
+        return False
+    try:
+        return bool(get_cache().rule_files())
+    except OSError:
+        return False
+
+
+def _match_json(m):
+    strings = []
+    for s in m.strings:
+        for inst in getattr(s, "instances", None) or []:
+            strings.append({
+                "identifier": s.identifier,
+                "offset": inst.offset,
+                "data": inst.matched_data[:MATCH_PREVIEW].decode("latin-1"),
+            })
+    return {
+        "rule": m.rule,
+        "namespace": m.namespace,
+        "tags": list(m.tags),
+        "meta": dict(m.meta),
+        "strings": strings,
+    }
+
+
+def match(filepath, rules=None, timeout=SCAN_TIMEOUT):
+    """Varre um arquivo (via mmap) e devolve a lista de regras casadas."""
+    if rules is None:
+        rules, _ = get_cache().get()
+    with open(filepath, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return [_match_json(m) for m in rules.match(data=b"", timeout=timeout)]
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return [_match_json(m) for m in rules.match(data=mm, timeout=timeout)]
+
+
+# -------------------
+# Lotes: pool de processos
+# -------------------
+
+_worker_rules = None
+
+
+def _init_worker(compiled_path):
+    global _worker_rules
+    _worker_rules = yara.load(compiled_path)
+
+
+def _scan_one(path):
+    start = time.perf_counter()
+    result = {"path": path, "matches": [], "error": None}
+    try:
+        result["size"] = os.path.getsize(path)
+        result["matches"] = match(path, rules=_worker_rules)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def mp_context():
+    """forkserver (ou spawn): fork() de um processo com threads pode herdar locks presos."""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(compiled_path, workers):
+    """Pool reusada; é recriada quando as regras compiladas ou o tamanho mudam."""
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is None or _pool_key != (compiled_path, workers):
+            if _pool is not None:
+                _pool.shutdown(wait=False)  # lotes em andamento terminam com as regras antigas
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp_context(),
+                                        initializer=_init_worker, initargs=(compiled_path,))
+            _pool_key = (compiled_path, workers)
+        return _pool
+
+
+def _reset_pool(broken):
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is broken:
+            _pool, _pool_key = None, None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def rules_key(compiled_path):
+    """Identifica o conjunto de regras (o .yarc já é nomeado pela assinatura)."""
+    return os.path.splitext(os.path.basename(compiled_path))[0]
+
+
+def _result_path(key, sha256):
+    return os.path.join(RESULTS_DIR, key, sha256[:2], sha256 + ".json")
+
+
+def cache_get(key, sha256):
+    try:
+        with open(_result_path(key, sha256), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def cache_put(key, sha256, result):
+    path = _result_path(key, sha256)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"matches": result["matches"], "size": result.get("size", 0)}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def scan_many(paths, on_result=None, workers=None, should_stop=None, sha256s=None):
+    """
+    Varre muitos arquivos numa pool de processos (padrão: um por núcleo);
+    on_result(result) é chamado na ordem em que terminam. Conteúdo já varrido
+    com as mesmas regras sai do cache (cached=True); sha256s (caminho ->
+    digest) evita recalcular o hash de arquivos cujo digest já se conhece.
+    """
+    _, compiled_path = get_cache().get()
+    key = rules_key(compiled_path)
+    sha256s = dict(sha256s or {})
+    results = []
+
+    def done(result):
+        results.append(result)
+        if on_result:
+            on_result(result)
+
+    pending = []
+    for path in paths:
+        if should_stop and should_stop():
+            return results
+        try:
+            sha256s[path] = sha256s.get(path) or hashing.hash_file(path, ("sha256",))["sha256"]
+        except OSError as e:
+            done({"path": path, "matches": [], "error": f"{type(e).__name__}: {e}", "cached": False})
+            continue
+        cached = cache_get(key, sha256s[path])
+        if cached is None:
+            pending.append(path)
+        else:
+            done({**cached, "path": path, "sha256": sha256s[path], "error": None,
+                  "elapsed_ms": 0.0, "cached": True})
+    if not pending:
+        return results
+
+    workers = workers or os.cpu_count() or 1
+    pool = get_pool(compiled_path, workers)
+    try:
+        futures = {pool.submit(_scan_one, p): p for p in pending}
+    except (BrokenProcessPool, RuntimeError):
+        _reset_pool(pool)
+        pool = get_pool(compiled_path, workers)
+        futures = {pool.submit(_scan_one, p): p for p in pending}
+    try:
+        for fut in as_completed(futures):
+            try:
+                result = fut.result()
+            except BrokenProcessPool:
+                # processo morto no meio da varredura: a pool é recriada na próxima chamada
+                _reset_pool(pool)
+                result = {"path": futures[fut], "matches": [], "error": "processo de varredura morreu"}
+            result.update(sha256=sha256s[futures[fut]], cached=False)
+            if not result["error"]:
+                cache_put(key, result["sha256"], result)
+            done(result)
+            if should_stop and should_stop():
+                break
+    finally:
+        for fut in futures:
+            fut.cancel()
+    return results
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Varredura YARA (regras do MetaWeb)")
+    parser.add_argument("paths", nargs="+", help="arquivos ou diretórios")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--all", action="store_true", help="mostra também arquivos sem ocorrências")
+    args = parser.parse_args()
+
+    files = []
+    for p in args.paths:
+        if os.path.isdir(p):
+            for root, _, names in os.walk(p):
+                files += [os.path.join(root, n) for n in names]
+        else:
+            files.append(p)
+
+    def show(r):
+        if r["matches"] or r["error"] or args.all:
+            print(json.dumps(r, ensure_ascii=False), flush=True)
+
+    start = time.perf_counter()
+    results = scan_many(files, on_result=show, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    total = sum(r.get("size", 0) for r in results)
+    hits = sum(1 for r in results if r["matches"])
+    print(f"[*] {len(results)} arquivos, {hits} com ocorrências, "
+          f"{total / 1e6:.1f} MB em {elapsed:.2f}s ({total / 1e6 / max(elapsed, 1e-9):.1f} MB/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Registro dos relatórios gerados pelas ferramentas.
+
+Cada execução vira uma linha nova (append-only) numa tabela SQLite em WAL,
+indexada por alvo, ferramenta e data; nada é relido nem regravado inteiro a
+cada consulta, e vários processos (painel, sherlock_runner.py, o script de
+vazamento) podem gravar ao mesmo tempo. O relatório em si continua num
+arquivo próprio por execução, escrito de forma atômica (write_json_atomic).
+
+O conteúdo de uma execução (todas as fontes/sites, com links e textos) fica
+num único blob zlib em report_content, em vez de um .html por site; o painel
+renderiza as páginas de cada site sob demanda (/relatorios/<id>/<site>).
+
+Uso pela linha de comando (scripts shell):
+    python3 tools/report_store.py add --tool email_leak --target x@y.com --path leak_check_results/...json
+    python3 tools/report_store.py import-dir --tool email_leak --target x@y.com /tmp/fragmentos
+    python3 tools/report_store.py query --target x@y.com
+    python3 tools/report_store.py import-historico static/relatorios/historico.json
+    python3 tools/report_store.py import-legacy static/relatorios [--delete]
+"""
+
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import zlib
+from html import unescape
+from datetime import datetime, UTC
+from urllib.parse import unquote_plus
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.environ.get("REPORTS_DB_PATH", os.path.join(BASE_DIR, "runs", "reports.db"))
+# relatórios por execução dos scripts (um arquivo por alvo e data)
+RUNS_REPORT_DIR = os.path.join(BASE_DIR, "leak_check_results")
+QUERY_LIMIT_MAX = 1000
+# diretórios antigos de static/relatorios: um por execução, nome = data/hora
+LEGACY_DIR_RE = re.compile(r"^\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tool TEXT NOT NULL,
+    target TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    path TEXT,
+    task_id TEXT,
+    data TEXT
+);
+-- consultas por alvo/ferramenta paginadas por id (keyset), como o histórico do painel
+CREATE INDEX IF NOT EXISTS idx_reports_target ON reports (target, id);
+CREATE INDEX IF NOT EXISTS idx_reports_tool ON reports (tool, id);
+CREATE INDEX IF NOT EXISTS idx_reports_created ON reports (created_at);
+CREATE INDEX IF NOT EXISTS idx_reports_path ON reports (path);
+-- conteúdo da execução: {"sites": [{site, titulo, links: [{link, resumo}], texto}]} em JSON + zlib
+CREATE TABLE IF NOT EXISTS report_content (
+    report_id INTEGER PRIMARY KEY,
+    raw_bytes INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+"""
+
+FIELDS = ("id", "tool", "target", "created_at", "path", "task_id", "data")
+
+
+def utc_now():
+    """Data ISO em UTC sem fuso (comparável como texto nas consultas)."""
+    return datetime.now(UTC).replace(tzinfo=None).isoformat(timespec="seconds")
+
+
+def local_to_utc(ts):
+    """datetime sem fuso (horário local da máquina) ou com fuso -> formato de created_at."""
+    return ts.astimezone(UTC).replace(tzinfo=None).isoformat(timespec="seconds")
+
+
+def parse_date(value):
+    """Data ISO da query string -> formato de created_at. ValueError se inválida."""
+    ts = datetime.fromisoformat(value)
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(UTC).replace(tzinfo=None)
+    return ts.isoformat(timespec="seconds")
+
+
+def write_json_atomic(path, data):
+    """Grava num temporário do mesmo diretório e troca com os.replace: quem lê nunca vê meio arquivo."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".tmp_", dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def run_report_path(tool, target, stamp=None, directory=RUNS_REPORT_DIR):
+    """leak_check_results/<tool>_<alvo>_<data>.json: um arquivo por execução, sem sobrescrever o anterior."""
+    stamp = stamp or datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    safe = re.sub(r"[^\w.@+-]", "_", str(target))[:100]
+    return os.path.join(directory, f"{tool}_{safe}_{stamp}.json")
+
+
+class ReportStore:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, tool, target, path=None, data=None, task_id=None, created_at=None, content=None):
+        """Acrescenta um registro (e o conteúdo, se houver, na mesma transação) e devolve o id."""
+        if path and os.path.isabs(path):
+            path = os.path.relpath(path, BASE_DIR)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = conn.execute(
+                "INSERT INTO reports (tool, target, created_at, path, task_id, data) VALUES (?, ?, ?, ?, ?, ?)",
+                (tool, str(target), created_at or utc_now(), path, task_id,
+                 json.dumps(data, ensure_ascii=False) if data is not None else None),
+            )
+            if content is not None:
+                raw = json.dumps(content, ensure_ascii=False).encode("utf-8")
+                conn.execute(
+                    "INSERT INTO report_content (report_id, raw_bytes, data) VALUES (?, ?, ?)",
+                    (cur.lastrowid, len(raw), zlib.compress(raw, 6)),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cur.lastrowid
+
+    def get(self, report_id):
+        row = self._conn().execute(
+            f"SELECT {', '.join(FIELDS)} FROM reports WHERE id = ?", (report_id,)
+        ).fetchone()
+        return self._row(row) if row else None
+
+    def content(self, report_id):
+        """Conteúdo da execução (dict) ou None se ela não guardou conteúdo."""
+        row = self._conn().execute("SELECT data FROM report_content WHERE report_id = ?", (report_id,)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def query(self, target=None, tool=None, since=None, until=None, limit=100, before_id=None):
+        """Registros mais novos primeiro (por id); since/until no formato de created_at, before_id pagina."""
+        clauses, params = [], []
+        for column, value in (("target", target), ("tool", tool)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until:
+            clauses.append("created_at <= ?")
+            params.append(until)
+        if before_id:
+            clauses.append("id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._conn().execute(
+            f"SELECT {', '.join(FIELDS)} FROM reports {where} ORDER BY id DESC LIMIT ?",
+            (*params, max(1, min(int(limit), QUERY_LIMIT_MAX))),
+        ).fetchall()
+        return [self._row(r) for r in rows]
+
+    def latest(self, tool, target):
+        rows = self.query(target=target, tool=tool, limit=1)
+        return rows[0] if rows else None
+
+    @staticmethod
+    def _row(row):
+        record = dict(zip(FIELDS, row))
+        if record["data"]:
+            record["data"] = json.loads(record["data"])
+        return record
+
+    def import_historico(self, historico_file):
+        """Importa o antigo static/relatorios/historico.json (lista de {tipo, alvo, arquivo, data})."""
+        with open(historico_file, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for e in entries:
+                try:
+                    # o painel antigo gravava datetime.now() (horário local, "%Y-%m-%d %H:%M:%S")
+                    created_at = local_to_utc(datetime.fromisoformat(e.get("data") or ""))
+                except ValueError:
+                    created_at = utc_now()
+                conn.execute(
+                    "INSERT INTO reports (tool, target, created_at, path) VALUES (?, ?, ?, ?)",
+                    (e.get("tipo") or "desconhecido", str(e.get("alvo") or ""), created_at, e.get("arquivo")),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(entries)
+
+    def import_dir(self, directory, tool=None, target=None, path=None, created_at=None):
+        """Junta os fragmentos .html/.txt de um diretório numa execução; devolve o id."""
+        found_tool, found_target, content = parse_run_dir(directory)
+        return self.add(
+            tool or found_tool, target or found_target or "", path=path, created_at=created_at,
+            data={"sites": len(content["sites"])}, content=content,
+        )
+
+    def import_legacy(self, root, delete=False, on_dir=None):
+        """
+        Importa os diretórios antigos (root/<data>/<site>.html) como execuções.
+        Diretórios já importados (mesmo path) são pulados; com delete=True o
+        diretório é removido depois de gravado, a não ser que a ferramenta ou
+        o alvo não tenham sido identificados. Devolve quantos importou.
+        """
+        imported = 0
+        for name in sorted(os.listdir(root)):
+            directory = os.path.join(root, name)
+            if not LEGACY_DIR_RE.match(name) or not os.path.isdir(directory):
+                continue
+            rel = os.path.relpath(os.path.abspath(directory), BASE_DIR)
+            row = self._conn().execute("SELECT tool, target FROM reports WHERE path = ?", (rel,)).fetchone()
+            if row is None:
+                tool, target, content = parse_run_dir(directory)
+                # o nome é o horário local de quem gerou o diretório; created_at é UTC
+                created_at = local_to_utc(datetime.strptime(name, "%Y-%m-%d_%H-%M-%S"))
+                report_id = self.add(
+                    tool, target or "", path=rel, created_at=created_at,
+                    data={"sites": len(content["sites"])}, content=content,
+                )
+                imported += 1
+                if on_dir:
+                    on_dir(rel, report_id)
+                row = (tool, target)
+            if delete and row[0] != "desconhecido" and row[1]:
+                shutil.rmtree(directory)
+        return imported
+
+
+# -------------------
+# Fragmentos HTML antigos (sherlock_runner.py / email_leak_checker_full.sh)
+# -------------------
+
+H2_RE = re.compile(r"<h2>(.*?)</h2>", re.S)
+PRE_RE = re.compile(r"<pre>(.*?)</pre>", re.S)
+# um <p> por link; o resumo pode ter quebras de linha
+LINK_RE = re.compile(r"<p><b>[^<]*</b> ?<a href='([^']*)'[^>]*>.*?</a>(?:<br><b>Resumo:</b>(.*?))?</p>", re.S)
+TAG_RE = re.compile(r"<[^>]+>")
+# "Resultado(s) para <user> em <site>" (sherlock) / "Resultados [(Tor)|simulados] para <email> em <fonte>";
+# as duas ferramentas usaram as duas formas, então quem decide é o alvo
+HEADING_RE = re.compile(r"^Resultados?\b[^<]*? para (\S+)")
+# páginas de busca salvas cruas: o e-mail buscado está no parâmetro q= dos links
+QUERY_RE = re.compile(r"[?&;]q=([^&\"'\s<>]+)")
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# fontes do email_leak_checker (buscadores), para execuções sem alvo identificável
+EMAIL_LEAK_SOURCES = {
+    "google", "bing", "duckduckgo", "yahoo", "ask", "yandex", "ahmia", "onionland", "onionsearch", "torch",
+    "darksearch", "phobos", "metager", "qwant", "pastebin", "haveibeenpwned", "leakcheck", "breachdirectory",
+}
+
+
+def site_entry(site, titulo="", links=(), texto=""):
+    return {"site": site, "titulo": titulo, "links": list(links), "texto": texto}
+
+
+def parse_fragment(site, text):
+    """Um .html por site -> entrada de site; o que não é link vira texto."""
+    m = H2_RE.search(text)
+    titulo = unescape(TAG_RE.sub("", m.group(1))).strip() if m else site
+    pres = [p.strip() for p in PRE_RE.findall(text)]
+    rest = PRE_RE.sub("", H2_RE.sub("", text, count=1))
+    links = [
+        {"link": unescape(href), "resumo": unescape(TAG_RE.sub("", resumo or "")).strip()}
+        for href, resumo in LINK_RE.findall(rest)
+    ]
+    other = (unescape(TAG_RE.sub("", line)).strip() for line in LINK_RE.sub("", rest).splitlines())
+    texto = "\n".join(pres + [o for o in other if o])
+    return site_entry(site, titulo, links, texto)
+
+
+def parse_run_dir(directory):
+    """
+    (ferramenta, alvo, conteúdo) de um diretório de fragmentos. O alvo vem dos
+    títulos ou, nas páginas de busca cruas, do e-mail buscado; a ferramenta,
+    do alvo: e-mail -> email_leak, usuário (ou Sherlock_raw.txt) -> sherlock.
+    """
+    sites, targets, queried = [], {}, {}
+    sherlock_raw = False
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        site, ext = os.path.splitext(name)
+        if not os.path.isfile(path) or ext not in (".html", ".txt"):
+            continue
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        if ext == ".txt":
+            # Sherlock_raw.txt: saída bruta do sherlock
+            entry = site_entry(site, site, texto=text)
+            sherlock_raw = True
+        else:
+            entry = parse_fragment(site, text)
+            hm = HEADING_RE.match(entry["titulo"])
+            if hm:
+                targets[hm.group(1)] = targets.get(hm.group(1), 0) + 1
+            else:
+                for q in QUERY_RE.findall(text):
+                    for email in EMAIL_RE.findall(unquote_plus(unescape(q))):
+                        email = email.lower()
+                        queried[email] = queried.get(email, 0) + 1
+        sites.append(entry)
+    votes = targets or queried
+    target = max(votes, key=votes.get) if votes else None
+    if sherlock_raw or (target and "@" not in target):
+        tool = "sherlock"
+    elif target or (sites and all(e["site"].lower() in EMAIL_LEAK_SOURCES for e in sites)):
+        tool = "email_leak"
+    else:
+        tool = "desconhecido"
+    return tool, target, {"sites": sites}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ReportStore()
+    return _store
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Registro dos relatórios das ferramentas")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_add = sub.add_parser("add", help="registra um relatório")
+    p_add.add_argument("--tool", required=True)
+    p_add.add_argument("--target", required=True)
+    p_add.add_argument("--path")
+    p_add.add_argument("--data", help="metadados em JSON")
+    p_query = sub.add_parser("query", help="lista relatórios (JSON por linha)")
+    p_query.add_argument("--target")
+    p_query.add_argument("--tool")
+    p_query.add_argument("--since")
+    p_query.add_argument("--until")
+    p_query.add_argument("--limit", type=int, default=100)
+    p_dir = sub.add_parser("import-dir", help="registra uma execução a partir de fragmentos .html/.txt")
+    p_dir.add_argument("directory")
+    p_dir.add_argument("--tool")
+    p_dir.add_argument("--target")
+    p_dir.add_argument("--path", help="relatório JSON da execução")
+    p_import = sub.add_parser("import-historico", help="importa um historico.json antigo")
+    p_import.add_argument("file")
+    p_legacy = sub.add_parser("import-legacy", help="importa os diretórios antigos de static/relatorios")
+    p_legacy.add_argument("root", nargs="?", default=os.path.join(BASE_DIR, "static", "relatorios"))
+    p_legacy.add_argument("--delete", action="store_true", help="remove cada diretório depois de importado")
+    args = parser.parse_args()
+
+    store = get_store()
+    if args.cmd == "add":
+        data = json.loads(args.data) if args.data else None
+        print(store.add(args.tool, args.target, path=args.path, data=data))
+    elif args.cmd == "query":
+        since = parse_date(args.since) if args.since else None
+        until = parse_date(args.until) if args.until else None
+        for record in store.query(args.target, args.tool, since, until, args.limit):
+            print(json.dumps(record, ensure_ascii=False))
+    elif args.cmd == "import-dir":
+        print(store.import_dir(args.directory, tool=args.tool, target=args.target, path=args.path))
+    elif args.cmd == "import-historico":
+        print(f"[*] {store.import_historico(args.file)} registros importados")
+    else:
+        count = store.import_legacy(args.root, delete=args.delete,
+                                    on_dir=lambda rel, rid: print(f"[+] {rel} -> /relatorios/{rid}"))
+        print(f"[*] {count} execuções importadas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Motor assíncrono de busca de usernames, compatível com o data.json do Sherlock.
+
+Em vez de abrir o CLI do Sherlock a cada consulta, o painel chama
+run_username() dentro do próprio processo: o manifesto de sites é lido uma
+vez, as requisições saem de clientes httpx compartilhados entre consultas
+(ver ProbeEngine) com limite global de concorrência, intervalo mínimo por
+host e timeout por site, e cada resultado é entregue num callback assim
+que chega.
+
+As regras de detecção (errorType message/status_code/response_url,
+regexCheck, urlProbe, request_method, headers, WAF) seguem as do Sherlock.
+"""
+
+import asyncio
+import atexit
+import json
+import os
+import queue
+import re
+import ssl
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+try:
+    import httpx
+except ImportError:  # dependência opcional: sem httpx o painel usa o CLI
+    httpx = None
+
+try:
+    import certifi
+except ImportError:
+    certifi = None
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64; rv:129.0) Gecko/20100101 Firefox/129.0"
+
+# assinaturas de páginas de bloqueio (mesmas que o Sherlock usa)
+WAF_HIT_MSGS = (
+    '.loading-spinner{visibility:hidden}body.no-js .challenge-running{display:none}',
+    '<span id="challenge-error-text">',
+    "AwsWafIntegration.forceRefreshToken",
+    '{return l.onPageView}}),Object.defineProperty(r,"perimeterxIdentifiers",{enumerable:',
+)
+
+DEFAULT_CONCURRENCY = int(os.environ.get("SHERLOCK_CONCURRENCY", "40"))
+DEFAULT_TIMEOUT = float(os.environ.get("SHERLOCK_TIMEOUT", "15"))
+# intervalo mínimo entre duas requisições ao mesmo host (segundos)
+DEFAULT_HOST_INTERVAL = float(os.environ.get("SHERLOCK_HOST_INTERVAL", "0.25"))
+# clientes por origem mantidos abertos (LRU); os excedentes ociosos são fechados
+MAX_CLIENTS = int(os.environ.get("SHERLOCK_MAX_CLIENTS", "128"))
+
+_site_cache = {}
+
+
+def find_site_data():
+    """Procura o data.json: SHERLOCK_DATA_PATH, pacote instalado ou tools/sherlock."""
+    env_path = os.environ.get("SHERLOCK_DATA_PATH")
+    if env_path:
+        return env_path if os.path.isfile(env_path) else None
+    try:
+        import importlib.resources as resources
+        path = resources.files("sherlock_project") / "resources" / "data.json"
+        if path.is_file():
+            return str(path)
+    except Exception:
+        pass
+    local = os.path.join(BASE_DIR, "tools", "sherlock", "sherlock_project", "resources", "data.json")
+    return local if os.path.isfile(local) else None
+
+
+def load_sites(path=None, include_nsfw=False):
+    """Carrega (e guarda em memória) o manifesto de sites."""
+    path = path or find_site_data()
+    if not path:
+        raise FileNotFoundError("data.json do Sherlock não encontrado")
+    mtime = os.path.getmtime(path)
+    cached = _site_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        sites = {k: v for k, v in data.items() if isinstance(v, dict) and "url" in v}
+        _site_cache[path] = cached = (mtime, sites)
+    sites = cached[1]
+    if not include_nsfw:
+        sites = {k: v for k, v in sites.items() if not v.get("isNSFW")}
+    return sites
+
+
+def interpolate(value, username):
+    if isinstance(value, str):
+        return value.replace("{}", username)
+    if isinstance(value, dict):
+        return {k: interpolate(v, username) for k, v in value.items()}
+    if isinstance(value, list):
+        return [interpolate(v, username) for v in value]
+    return value
+
+
+def classify(site, status_code, text):
+    """Aplica as regras do manifesto; devolve "found", "not_found" ou "waf"."""
+    if any(msg in text for msg in WAF_HIT_MSGS):
+        return "waf"
+    error_type = site.get("errorType")
+    if isinstance(error_type, str):
+        error_type = [error_type]
+    status = None
+    if "message" in error_type:
+        errors = site.get("errorMsg") or []
+        if isinstance(errors, str):
+            errors = [errors]
+        status = "not_found" if any(e in text for e in errors) else "found"
+    if "status_code" in error_type and status != "not_found":
+        codes = site.get("errorCode")
+        if isinstance(codes, int):
+            codes = [codes]
+        if codes is not None and status_code in codes:
+            status = "not_found"
+        elif status_code >= 300 or status_code < 200:
+            status = "not_found"
+        else:
+            status = "found"
+    if "response_url" in error_type and status != "not_found":
+        status = "found" if 200 <= status_code < 300 else "not_found"
+    return status or "error"
+
+
+class HostRateLimiter:
+    """Garante um intervalo mínimo entre requisições ao mesmo host."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next = {}
+        self._locks = {}
+
+    async def wait(self, host):
+        if self.interval <= 0:
+            return
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            delay = self._next.get(host, 0) - now
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next[host] = max(now, self._next.get(host, 0)) + self.interval
+
+
+async def probe_site(engine, name, site, username, sem, limiter, timeout):
+    url = interpolate(site["url"], username.replace(" ", "%20"))
+    result = {"site": name, "url": url, "status": None, "http_status": None, "elapsed_ms": None}
+
+    regex = site.get("regexCheck")
+    if regex and re.search(regex, username) is None:
+        result["status"] = "illegal"
+        return result
+
+    probe = interpolate(site["urlProbe"], username) if site.get("urlProbe") else url
+    error_type = site.get("errorType")
+    method = site.get("request_method") or ("HEAD" if error_type == "status_code" else "GET")
+    payload = interpolate(site["request_payload"], username) if site.get("request_payload") else None
+    headers = {"User-Agent": USER_AGENT}
+    headers.update(site.get("headers") or {})
+
+    async with sem:
+        await limiter.wait(urlparse(probe).hostname or "")
+        start = time.perf_counter()
+        try:
+            r = await engine.request(
+                method, probe, headers=headers, json=payload, timeout=timeout,
+                follow_redirects=(error_type != "response_url"),
+            )
+            text = r.text if method != "HEAD" else ""
+            result["http_status"] = r.status_code
+            result["status"] = classify(site, r.status_code, text)
+        except Exception as e:
+            result["status"] = "error"
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+class ProbeEngine:
+    """
+    Event loop dedicado (thread própria) com clientes HTTP por origem.
+
+    Os clientes sobrevivem entre execuções, então conexões keep-alive e
+    sessões TLS são reaproveitadas de uma consulta para a outra. Um cliente
+    por origem mantém cada pool pequeno (o pool do httpcore varre todas as
+    conexões a cada requisição, o que fica quadrático num pool único). No
+    máximo max_clients ficam abertos: os menos usados recentemente, se não
+    tiverem requisição em andamento, são fechados (aclose) no próprio loop.
+    """
+
+    def __init__(self, per_host_connections=2, max_clients=MAX_CLIENTS):
+        self.per_host_connections = per_host_connections
+        self.max_clients = max_clients
+        self.loop = None
+        self._clients = OrderedDict()  # origem -> cliente; só é tocado dentro do loop
+        self._busy = {}  # origem -> requisições em andamento
+        self._lock = threading.Lock()
+        self._ssl = None
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name="sherlock-engine", daemon=True).start()
+
+    @staticmethod
+    def _origin(url):
+        parsed = urlparse(url)
+        return parsed.scheme, parsed.hostname, parsed.port
+
+    def client_for(self, url):
+        key = self._origin(url)
+        client = self._clients.get(key)
+        if client is None:
+            if self._ssl is None:
+                self._ssl = ssl.create_default_context(cafile=certifi.where() if certifi else None)
+            n = self.per_host_connections
+            client = self._clients[key] = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=n, max_keepalive_connections=n, keepalive_expiry=30),
+                verify=self._ssl,
+            )
+            self._evict()
+        else:
+            self._clients.move_to_end(key)
+        return client
+
+    def _evict(self):
+        excess = len(self._clients) - self.max_clients
+        for key in list(self._clients)[:-1]:  # o último é o que acabou de ser criado
+            if excess <= 0:
+                break
+            if self._busy.get(key):
+                continue
+            asyncio.ensure_future(self._clients.pop(key).aclose())
+            excess -= 1
+
+    async def request(self, method, url, **kwargs):
+        key = self._origin(url)
+        client = self.client_for(url)
+        self._busy[key] = self._busy.get(key, 0) + 1
+        try:
+            return await client.request(method, url, **kwargs)
+        finally:
+            self._busy[key] -= 1
+            if not self._busy[key]:
+                del self._busy[key]
+
+    async def _aclose_all(self):
+        clients = list(self._clients.values())
+        self._clients.clear()
+        await asyncio.gather(*(c.aclose() for c in clients), return_exceptions=True)
+
+    def close(self, timeout=5):
+        """Fecha todos os clientes e para o loop (fim do processo)."""
+        with self._lock:
+            loop, self.loop = self.loop, None
+        if loop is None or not loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._aclose_all(), loop).result(timeout)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+
+
+_engine = None
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        _engine = ProbeEngine(int(os.environ.get("SHERLOCK_HOST_CONNECTIONS", "2")))
+        atexit.register(_engine.close)
+    return _engine
+
+
+async def probe_username(username, sites, on_result=None, concurrency=DEFAULT_CONCURRENCY,
+                         timeout=DEFAULT_TIMEOUT, host_interval=DEFAULT_HOST_INTERVAL,
+                         should_stop=None, engine=None):
+    """
+    Testa `username` em todos os `sites`; chama on_result(result) a cada
+    site concluído e devolve a lista de resultados. should_stop() permite
+    interromper no meio (cancelamento).
+    """
+    engine = engine or get_engine()
+    sem = asyncio.Semaphore(concurrency)
+    limiter = HostRateLimiter(host_interval)
+    results = []
+    tasks = [
+        asyncio.ensure_future(probe_site(engine, name, site, username, sem, limiter, timeout))
+        for name, site in sites.items()
+    ]
+    pending = set(tasks)
+    try:
+        while pending:
+            # acorda periodicamente para ver should_stop mesmo com todos os sites em timeout lento
+            done, pending = await asyncio.wait(pending, timeout=0.2, return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                result = fut.result()
+                results.append(result)
+                if on_result:
+                    on_result(result)
+            if should_stop and should_stop():
+                break
+    finally:
+        for t in tasks:
+            t.cancel()
+    return results
+
+
+def run_username(username, on_result=None, include_nsfw=False, data_path=None, engine=None,
+                 should_stop=None, **kwargs):
+    """
+    Versão síncrona: a busca roda no loop compartilhado do engine, mas
+    on_result e should_stop são chamados na thread de quem chamou (assim um
+    callback lento, como gravar no SQLite, não trava o loop).
+    """
+    if httpx is None:
+        raise RuntimeError("httpx não instalado")
+    engine = engine or get_engine()
+    sites = load_sites(data_path, include_nsfw=include_nsfw)
+    inbox = queue.Queue()
+    stop = threading.Event()
+    engine._ensure_loop()
+    future = asyncio.run_coroutine_threadsafe(
+        probe_username(username, sites, on_result=inbox.put, should_stop=stop.is_set, engine=engine, **kwargs),
+        engine.loop,
+    )
+    while not (future.done() and inbox.empty()):
+        try:
+            result = inbox.get(timeout=0.2)
+        except queue.Empty:
+            if should_stop and should_stop():
+                stop.set()
+            continue
+        if on_result:
+            on_result(result)
+        if should_stop and should_stop():
+            stop.set()
+    return future.result()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Busca de username (motor nativo, dados do Sherlock)")
+    parser.add_argument("username")
+    parser.add_argument("--json", dest="data_path", help="data.json alternativo")
+    parser.add_argument("--nsfw", action="store_true")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--print-all", action="store_true")
+    args = parser.parse_args()
+
+    def show(r):
+        if r["status"] == "found":
+            print(f"[+] {r['site']}: {r['url']}", flush=True)
+        elif args.print_all:
+            print(f"[-] {r['site']}: {r['status']}", flush=True)
+
+    start = time.perf_counter()
+    results = run_username(
+        args.username, on_result=show, include_nsfw=args.nsfw, data_path=args.data_path,
+        timeout=args.timeout, concurrency=args.concurrency,
+    )
+    elapsed = time.perf_counter() - start
+    found = sum(1 for r in results if r["status"] == "found")
+    print(f"[*] {found} encontrados em {len(results)} sites ({elapsed:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
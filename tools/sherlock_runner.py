@@ -4,6 +4,11 @@ import os
 import json
 from datetime import datetime
 
+try:
+    from tools import report_store
+except ImportError:  # executado como script: python tools/sherlock_runner.py
+    import report_store
+
 
 def run_sherlock(username, include_nsfw=False):
     base_dir = os.path.abspath(os.path.dirname(__file__))  # corrige path base
@@ -14,8 +19,9 @@ def run_sherlock(username, include_nsfw=False):
     os.makedirs(results_dir, exist_ok=True)
     os.makedirs(json_dir, exist_ok=True)
 
-    # arquivo de saída JSON
-    rel_json = os.path.join(json_dir, "ultimo_relatorio_sherlock.json")
+    # arquivo de saída JSON: um por execução (o registro em report_store aponta para ele)
+    data_str = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    rel_json = report_store.run_report_path("sherlock", username, data_str, json_dir)
 
     # monta comando
     py = sys.executable or "python3"
@@ -31,6 +37,7 @@ def run_sherlock(username, include_nsfw=False):
         if os.path.exists(rel_json):
             with open(rel_json, "r", encoding="utf-8") as f:
                 data = json.load(f)
+            report_store.get_store().add("sherlock", username, path=rel_json)
             return data
         else:
             return {"error": "JSON de resultados não foi gerado."}
@@ -40,12 +47,7 @@ def run_sherlock(username, include_nsfw=False):
     except Exception as e:
         return {"error": str(e)}
 
-    # Nome da pasta com data/hora
-    data_str = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    pasta = os.path.join(results_dir, data_str)
-    os.makedirs(pasta, exist_ok=True)
-
-    relatorio_json = os.path.join(json_dir, "ultimo_relatorio_sherlock.json")
+    relatorio_json = rel_json
 
     # Caminho para o sherlock.py
     sherlock_path = os.path.join(
@@ -63,6 +65,7 @@ def run_sherlock(username, include_nsfw=False):
     stdout, stderr = process.communicate()
 
     resultados = {}
+    sites = []
     for line in stdout.splitlines():
         if "http" in line:
             try:
@@ -72,39 +75,35 @@ def run_sherlock(username, include_nsfw=False):
                 link = line.split(":", 1)[1].strip()
 
                 if link.startswith("http"):
-                    html_path = f"{site_name}.html"
-                    with open(
-                        os.path.join(pasta, html_path), "w", encoding="utf-8"
-                    ) as f:
-                        f.write(f"<h2>Resultado para {username} em {site_name}</h2>")
-                        f.write(
-                            f"<p><b>Perfil encontrado:</b> "
-                            f"<a href='{link}' target='_blank'>{link}</a></p>"
-                        )
-                    resultados[site_name] = {
-                        # 🔹 removida a barra inicial para evitar erro [object Object]
-                        "arquivo": f"static/relatorios/{data_str}/{html_path}",
-                        "link": str(link)
-                    }
+                    sites.append(report_store.site_entry(
+                        site_name, f"Resultado para {username} em {site_name}", [{"link": link, "resumo": ""}]
+                    ))
+                    resultados[site_name] = {"link": str(link)}
             except Exception:
                 continue
+    sites.append(report_store.site_entry("Sherlock_raw", "Sherlock_raw", texto=stdout))
+
+    # um registro por execução com todos os sites (páginas renderizadas pelo painel em /relatorios/<id>/<site>)
+    report_id = report_store.get_store().add(
+        "sherlock", username, path=relatorio_json, data={"found": len(resultados)}, content={"sites": sites}
+    )
+    for site_name, item in resultados.items():
+        item["pagina"] = f"/relatorios/{report_id}/{site_name}"
 
     # Salva o JSON de índice
-    with open(relatorio_json, "w", encoding="utf-8") as f:
-        json.dump(
-            {
-                "username": username,
-                "data": data_str,
-                "resultados": resultados,
-                "stdout": stdout,
-                "stderr": stderr,
-            },
-            f,
-            indent=2,
-            ensure_ascii=False
-        )
-
-    return stdout, stderr, relatorio_json, pasta
+    report_store.write_json_atomic(
+        relatorio_json,
+        {
+            "username": username,
+            "data": data_str,
+            "relatorio": f"/relatorios/{report_id}",
+            "resultados": resultados,
+            "stdout": stdout,
+            "stderr": stderr,
+        },
+    )
+
+    return stdout, stderr, relatorio_json, f"/relatorios/{report_id}"
 
 
 if __name__ == "__main__":